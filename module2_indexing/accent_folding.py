@@ -0,0 +1,32 @@
+"""
+MODULE 2: GẤP DẤU TIẾNG VIỆT (ACCENT FOLDING)
+Mục tiêu: Tìm được "phở bò" khi người dùng gõ không dấu "pho bo"
+
+Khi build index, mỗi term có dấu được ghi vào bảng gấp dấu:
+    dạng bỏ dấu -> danh sách term có dấu tương ứng (ví dụ "pho" -> ["phố", "phở"])
+Khi truy vấn, cụm âm tiết không dấu tra bảng này trực tiếp theo key, không quét từ điển.
+Term không có dấu (dạng bỏ dấu trùng chính nó) không cần ghi vào bảng.
+"""
+
+import unicodedata
+
+
+# 'đ' không tách được bằng NFD nên thay trực tiếp
+_LETTER_FOLDS = str.maketrans({'đ': 'd', 'Đ': 'D'})
+
+
+def fold_accents(text):
+    """
+    Bỏ dấu thanh và dấu phụ: "phở bò" -> "pho bo", "đường" -> "duong"
+    """
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFD', text.translate(_LETTER_FOLDS))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def has_accents(text):
+    """
+    True nếu text có ít nhất một ký tự mang dấu
+    """
+    return fold_accents(text) != text
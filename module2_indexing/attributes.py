@@ -0,0 +1,202 @@
+"""
+MODULE 2: THUỘC TÍNH SỐ CỦA CÔNG THỨC (THỜI GIAN, KHẨU PHẦN)
+Mục tiêu: Lọc theo khoảng ("nấu <= 30 phút", "từ 4 người") và đếm facet
+trên toàn bộ tập kết quả mà không phải đọc từng công thức
+
+Lúc index, chuỗi tự do do crawler lấy về được đổi thành số nguyên:
+    prep_time, cook_time: số phút   ("Chuẩn bị: 15 phút" -> 15, "1 giờ 30 phút" -> 90)
+    servings:             số người  ("4 người" -> 4, "Khẩu phần: 6" -> 6)
+và lưu thành cột theo ordinal (array('I'), MISSING khi không đọc được).
+
+Lọc / đếm facet dùng bitmap (xem bitmap.py): mỗi giá trị khác nhau của một cột có bitmap
+các ordinal mang giá trị đó; lọc khoảng = OR các bitmap trong khoảng, đếm facet =
+số phần tử của (tập kết quả AND bitmap nhóm), đều chạy trên bitset theo khối 65536 tài liệu.
+"""
+
+import re
+import bisect
+from array import array
+
+from bitmap import Bitmap
+
+
+# Các thuộc tính số theo thứ tự cột
+ATTRIBUTES = ('prep_time', 'cook_time', 'servings')
+
+# Giá trị của cột khi công thức không có / không đọc được thuộc tính
+MISSING = 0xFFFFFFFF
+
+# Nhóm facet: (nhỏ nhất, lớn nhất, nhãn), None = không chặn
+FACET_BUCKETS = {
+    'prep_time': ((None, 15, '≤ 15 phút'), (16, 30, '16-30 phút'), (31, 60, '31-60 phút'), (61, None, '> 60 phút')),
+    'cook_time': ((None, 15, '≤ 15 phút'), (16, 30, '16-30 phút'), (31, 60, '31-60 phút'), (61, None, '> 60 phút')),
+    'servings': ((None, 2, '1-2 người'), (3, 4, '3-4 người'), (5, 6, '5-6 người'), (7, None, '≥ 7 người')),
+}
+UNKNOWN_BUCKET = 'không rõ'
+
+# Từ khóa đứng trước giá trị trong chuỗi gộp ("Chuẩn bị: 15 phút | Thực hiện: 30 phút")
+_KEYWORDS = {
+    'prep_time': ('chuẩn bị', 'sơ chế'),
+    'cook_time': ('thực hiện', 'chế biến', 'nấu'),
+    'servings': ('khẩu phần',),
+}
+
+_NUMBER = r'(\d+(?:[.,]\d+)?)'
+# Khoảng "30-45" lấy cận trên
+_RANGE = re.compile(_NUMBER + r'\s*(?:-|–|đến)\s*(?=\d)')
+_DURATION = re.compile(_NUMBER + r'\s*(ngày|giờ|tiếng|h|phút|p)\b')
+_HOURS_MINUTES = re.compile(r'(\d+)\s*h\s*(\d+)')
+_INTEGER = re.compile(r'\d+')
+_UNIT_MINUTES = {'ngày': 1440, 'giờ': 60, 'tiếng': 60, 'h': 60, 'phút': 1, 'p': 1}
+
+# Điều kiện lọc: "cook_time<=30", "servings>=4", "prep_time=15"
+_FILTER = re.compile(r'^\s*(\w+)\s*(<=|>=|==|=|<|>)\s*(\d+)\s*$')
+
+
+def _after_keyword(text, name):
+    """
+    Phần chuỗi sau từ khóa của thuộc tính (nếu có)
+    """
+    for keyword in _KEYWORDS[name]:
+        pos = text.find(keyword)
+        if pos >= 0:
+            return text[pos + len(keyword):]
+    return text
+
+
+def parse_minutes(text, name='cook_time'):
+    """
+    Số phút trong chuỗi thời gian, None nếu không đọc được
+    """
+    text = _RANGE.sub('', _after_keyword(text.lower(), name))
+    text = _HOURS_MINUTES.sub(r'\1 giờ \2 phút', text)
+    total = 0
+    found = False
+    previous_scale = None
+    for number, unit in _DURATION.findall(text):
+        scale = _UNIT_MINUTES[unit]
+        if previous_scale is not None and scale >= previous_scale:
+            # "1 giờ 30 phút, nấu 2 giờ": chỉ cộng các đơn vị giảm dần liền nhau
+            break
+        total += float(number.replace(',', '.')) * scale
+        previous_scale = scale
+        found = True
+    return round(total) if found else None
+
+
+def parse_servings(text):
+    """
+    Số người trong chuỗi khẩu phần, None nếu không đọc được
+    """
+    match = _INTEGER.search(_RANGE.sub('', _after_keyword(text.lower(), 'servings')))
+    return int(match.group()) if match else None
+
+
+def parse_attributes(doc):
+    """
+    Giá trị số các thuộc tính của một công thức theo thứ tự ATTRIBUTES (MISSING nếu không có)
+    """
+    values = (parse_minutes(doc.get('prep_time') or '', 'prep_time'),
+              parse_minutes(doc.get('cook_time') or '', 'cook_time'),
+              parse_servings(doc.get('servings') or ''))
+    return tuple(MISSING if value is None or value >= MISSING else value for value in values)
+
+
+def parse_filters(filters):
+    """
+    Chuẩn hóa điều kiện lọc khoảng thành {thuộc tính: (nhỏ nhất, lớn nhất)}, cận là None khi
+    không chặn; nhiều điều kiện trên cùng thuộc tính được giao lại
+    Args:
+        filters: list chuỗi ("cook_time<=30", "servings>=4") hoặc dict {thuộc tính: (nhỏ nhất, lớn nhất)}
+    """
+    if not filters:
+        return {}
+    if isinstance(filters, dict):
+        items = list(filters.items())
+    else:
+        items = []
+        for spec in filters:
+            match = _FILTER.match(spec)
+            if not match or match.group(1) not in ATTRIBUTES:
+                raise ValueError(f"Điều kiện lọc không hợp lệ: {spec} (ví dụ: cook_time<=30, servings>=4)")
+            name, op, value = match.group(1), match.group(2), int(match.group(3))
+            low = value if op in ('>=', '=', '==') else value + 1 if op == '>' else None
+            high = value if op in ('<=', '=', '==') else value - 1 if op == '<' else None
+            items.append((name, (low, high)))
+
+    ranges = {}
+    for name, (low, high) in items:
+        if name not in ATTRIBUTES:
+            raise ValueError(f"Thuộc tính không hỗ trợ: {name} (chỉ có {', '.join(ATTRIBUTES)})")
+        old_low, old_high = ranges.get(name, (None, None))
+        if old_low is not None:
+            low = old_low if low is None else max(low, old_low)
+        if old_high is not None:
+            high = old_high if high is None else min(high, old_high)
+        ranges[name] = (low, high)
+    return ranges
+
+
+class AttributeColumn:
+    """
+    Bitmap theo từng giá trị của một cột thuộc tính (dựng một lần khi lọc / đếm facet lần đầu)
+    """
+    def __init__(self, column, deleted=()):
+        """
+        Args:
+            column: giá trị theo ordinal (array / memoryview 'I')
+            deleted: các ordinal bỏ qua (tài liệu đã xóa)
+        """
+        by_value = {}
+        for ordinal, value in enumerate(column):
+            if value != MISSING and ordinal not in deleted:
+                by_value.setdefault(value, array('I')).append(ordinal)
+        self.values = sorted(by_value)
+        self.bitmaps = [Bitmap.from_sorted(by_value[value]) for value in self.values]
+        self.ranges = {}  # {(vị trí đầu, vị trí cuối): Bitmap} cache các khoảng đã hỏi
+
+    def range(self, low=None, high=None):
+        """
+        Bitmap các ordinal có low <= giá trị <= high (cận None = không chặn)
+        """
+        start = bisect.bisect_left(self.values, low) if low is not None else 0
+        end = bisect.bisect_right(self.values, high) if high is not None else len(self.values)
+        bitmap = self.ranges.get((start, end))
+        if bitmap is None:
+            bitmap = Bitmap.union(self.bitmaps[start:end])
+            self.ranges[(start, end)] = bitmap
+        return bitmap
+
+
+def facet_counts(index, matches, names=ATTRIBUTES):
+    """
+    Đếm số tài liệu của tập kết quả trong từng nhóm facet
+    Args:
+        index: index có get_attribute_bitmap (InvertedIndex, SegmentSnapshot, ...)
+        matches: Bitmap tập kết quả
+        names: các thuộc tính cần đếm
+    Returns:
+        dict: {thuộc tính: {nhãn nhóm: số tài liệu}}, kể cả nhóm UNKNOWN_BUCKET
+    """
+    total = len(matches)
+    facets = {}
+    for name in names:
+        counts = {}
+        for low, high, label in FACET_BUCKETS[name]:
+            counts[label] = len(matches & index.get_attribute_bitmap(name, low, high))
+        counts[UNKNOWN_BUCKET] = total - sum(counts.values())
+        facets[name] = counts
+    return facets
+
+
+def merge_facets(parts):
+    """
+    Cộng các bảng facet (ví dụ của từng shard)
+    """
+    merged = {}
+    for facets in parts:
+        for name, counts in facets.items():
+            target = merged.setdefault(name, {})
+            for label, count in counts.items():
+                target[label] = target.get(label, 0) + count
+    return merged
@@ -0,0 +1,273 @@
+"""
+MODULE 2: BITMAP NÉN TRÊN ORDINAL TÀI LIỆU
+Mục tiêu: Lọc tập tài liệu (ví dụ theo nguyên liệu) bằng phép AND / ANDNOT nhanh cả khi
+có hàng triệu công thức, mà không tốn 1 bit cho mọi tài liệu với các tập thưa
+
+Cách chia giống Roaring bitmap: ordinal được chia theo 16 bit cao thành các khối 65536 tài liệu;
+mỗi khối chỉ lưu khi có tài liệu và chọn một trong hai dạng:
+    - mảng:   các 16 bit thấp đã sắp xếp (array('H')), khi khối có <= ARRAY_MAX_SIZE phần tử
+    - bitset: số nguyên Python 65536 bit (8 KB), khi khối dày hơn; AND / ANDNOT chạy trong C
+Ngưỡng ARRAY_MAX_SIZE = 4096 là điểm mà mảng 2 byte / phần tử bằng kích thước bitset.
+Kết quả của AND / ANDNOT có bitset thì giữ dạng bitset (đổi sang mảng cần duyệt từng bit
+bằng Python); dạng gọn nhất chỉ được chọn lại khi ghi ra bytes.
+
+Định dạng nhị phân (to_bytes):
+    [số khối]  rồi mỗi khối (16 bit cao, số phần tử)   - uint32
+    nội dung từng khối theo thứ tự: mảng uint16 hoặc bitset 8192 byte (little-endian)
+"""
+
+from array import array
+
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+BITSET_BYTES = CHUNK_SIZE // 8
+ARRAY_MAX_SIZE = 4096
+
+
+# Một byte 0 / 1 cho mỗi bit -> chữ số nhị phân (để int(..., 2) dựng bitset trong C)
+_FLAG_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+
+def _bitset_from_lows(lows):
+    flags = bytearray(CHUNK_SIZE)
+    for low in lows:
+        flags[low] = 1
+    return int(flags[::-1].translate(_FLAG_DIGITS), 2)
+
+
+def _lows_from_bitset(bitset):
+    bits = bitset.to_bytes(BITSET_BYTES, 'little')
+    lows = array('H')
+    for i, byte in enumerate(bits):
+        if byte:
+            base = i << 3
+            for bit in range(8):
+                if byte >> bit & 1:
+                    lows.append(base + bit)
+    return lows
+
+
+def _container(value):
+    """
+    Khối mảng: đổi sang bitset nếu quá ARRAY_MAX_SIZE phần tử; None nếu khối rỗng
+    """
+    if isinstance(value, int):
+        return value or None
+    if not value:
+        return None
+    return _bitset_from_lows(value) if len(value) > ARRAY_MAX_SIZE else value
+
+
+def _filter_lows(lows, bitset, keep):
+    """
+    Giữ các phần tử của mảng có (keep=True) hoặc không có (keep=False) trong bitset
+    """
+    bits = bitset.to_bytes(BITSET_BYTES, 'little')
+    return array('H', (low for low in lows if bool(bits[low >> 3] >> (low & 7) & 1) == keep))
+
+
+class Bitmap:
+    """
+    Tập ordinal tài liệu dạng bitmap nén (xem đầu file)
+    """
+    __slots__ = ('containers',)
+
+    def __init__(self, containers=None):
+        """
+        Args:
+            containers: {16 bit cao: array('H') hoặc int bitset}
+        """
+        self.containers = containers if containers is not None else {}
+
+    @classmethod
+    def from_sorted(cls, ordinals):
+        """
+        Tạo bitmap từ dãy ordinal tăng dần (không trùng)
+        """
+        containers = {}
+        high = None
+        lows = None
+        for ordinal in ordinals:
+            if ordinal >> CHUNK_BITS != high:
+                if lows is not None:
+                    containers[high] = _container(lows)
+                high = ordinal >> CHUNK_BITS
+                lows = array('H')
+            lows.append(ordinal & CHUNK_MASK)
+        if lows is not None:
+            containers[high] = _container(lows)
+        return cls(containers)
+
+    @classmethod
+    def full(cls, size):
+        """
+        Bitmap chứa mọi ordinal trong [0, size)
+        """
+        containers = {}
+        for high in range((size + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            count = min(CHUNK_SIZE, size - (high << CHUNK_BITS))
+            containers[high] = _container((1 << count) - 1)
+        return cls(containers)
+
+    @classmethod
+    def union(cls, bitmaps):
+        """
+        OR nhiều bitmap
+        """
+        grouped = {}
+        for bitmap in bitmaps:
+            for high, container in bitmap.containers.items():
+                grouped.setdefault(high, []).append(container)
+        containers = {}
+        for high, parts in grouped.items():
+            if len(parts) == 1:
+                containers[high] = parts[0]
+                continue
+            bitset = 0
+            arrays = []
+            for part in parts:
+                if isinstance(part, int):
+                    bitset |= part
+                else:
+                    arrays.append(part)
+            if not bitset and sum(len(lows) for lows in arrays) <= ARRAY_MAX_SIZE:
+                containers[high] = array('H', sorted(set().union(*arrays)))
+            else:
+                containers[high] = bitset | _bitset_from_lows(low for lows in arrays for low in lows)
+        return cls(containers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Đọc bitmap từ bytes / memoryview theo định dạng của to_bytes
+        """
+        header = array('I')
+        header.frombytes(bytes(data[:4]))
+        count = header[0]
+        header = array('I')
+        header.frombytes(bytes(data[4:4 + 8 * count]))
+        containers = {}
+        pos = 4 + 8 * count
+        for k in range(count):
+            high, size = header[2 * k], header[2 * k + 1]
+            if size > ARRAY_MAX_SIZE:
+                containers[high] = int.from_bytes(data[pos:pos + BITSET_BYTES], 'little')
+                pos += BITSET_BYTES
+            else:
+                lows = array('H')
+                lows.frombytes(bytes(data[pos:pos + 2 * size]))
+                containers[high] = lows
+                pos += 2 * size
+        return cls(containers)
+
+    def to_bytes(self):
+        highs = sorted(self.containers)
+        header = array('I', [len(highs)])
+        body = bytearray()
+        for high in highs:
+            container = self.containers[high]
+            if isinstance(container, int) and container.bit_count() <= ARRAY_MAX_SIZE:
+                container = _lows_from_bitset(container)
+            if isinstance(container, int):
+                header.extend((high, container.bit_count()))
+                body += container.to_bytes(BITSET_BYTES, 'little')
+            else:
+                header.extend((high, len(container)))
+                body += container.tobytes()
+        return header.tobytes() + bytes(body)
+
+    def __and__(self, other):
+        containers = {}
+        for high, a in self.containers.items():
+            b = other.containers.get(high)
+            if b is None:
+                continue
+            if isinstance(a, int) and isinstance(b, int):
+                result = _container(a & b)
+            elif isinstance(a, int):
+                result = _container(_filter_lows(b, a, True))
+            elif isinstance(b, int):
+                result = _container(_filter_lows(a, b, True))
+            else:
+                result = _container(array('H', sorted(set(a).intersection(b))))
+            if result is not None:
+                containers[high] = result
+        return Bitmap(containers)
+
+    def __or__(self, other):
+        return Bitmap.union((self, other))
+
+    def __sub__(self, other):
+        """
+        ANDNOT: các phần tử của self không có trong other
+        """
+        containers = {}
+        for high, a in self.containers.items():
+            b = other.containers.get(high)
+            if b is None:
+                containers[high] = a
+                continue
+            if isinstance(a, int) and isinstance(b, int):
+                result = _container(a & ~b)
+            elif isinstance(a, int):
+                result = _container(a & ~_bitset_from_lows(b))
+            elif isinstance(b, int):
+                result = _container(_filter_lows(a, b, False))
+            else:
+                result = _container(array('H', sorted(set(a).difference(b))))
+            if result is not None:
+                containers[high] = result
+        return Bitmap(containers)
+
+    def __contains__(self, ordinal):
+        container = self.containers.get(ordinal >> CHUNK_BITS)
+        if container is None:
+            return False
+        low = ordinal & CHUNK_MASK
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        lo, hi = 0, len(container)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if container[mid] < low:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < len(container) and container[lo] == low
+
+    def __len__(self):
+        return sum(c.bit_count() if isinstance(c, int) else len(c) for c in self.containers.values())
+
+    def __bool__(self):
+        return bool(self.containers)
+
+    def __iter__(self):
+        for high in sorted(self.containers):
+            container = self.containers[high]
+            base = high << CHUNK_BITS
+            lows = _lows_from_bitset(container) if isinstance(container, int) else container
+            for low in lows:
+                yield base + low
+
+    def to_mask(self, size):
+        """
+        Bitset phẳng (bytearray, 1 bit cho mỗi ordinal < size) để kiểm tra thành viên
+        trong vòng lặp nóng: mask[o >> 3] >> (o & 7) & 1
+        """
+        mask = bytearray((size + 7) // 8)
+        for high, container in self.containers.items():
+            start = high * BITSET_BYTES
+            if start >= len(mask):
+                continue
+            if isinstance(container, int):
+                chunk = container.to_bytes(BITSET_BYTES, 'little')[:len(mask) - start]
+                mask[start:start + len(chunk)] = chunk
+            else:
+                base = high << CHUNK_BITS
+                for low in container:
+                    ordinal = base + low
+                    if ordinal < size:
+                        mask[ordinal >> 3] |= 1 << (ordinal & 7)
+        return mask
@@ -0,0 +1,50 @@
+"""
+MODULE 2: ĐỊNH DANH TÀI LIỆU
+Mục tiêu: Mỗi công thức có đúng một doc_id (URL chuẩn hóa) và một số nguyên (ordinal)
+
+Crawler lấy cùng một công thức với nhiều URL chỉ khác tham số theo dõi:
+    https://www.cooky.vn/cong-thuc/ca-basa-kho-to-3030?itm_source=home_z3_p5_chefrecipe&itm_medium=desktop
+    https://www.cooky.vn/cong-thuc/ca-basa-kho-to-3030
+URL được chuẩn hóa (bỏ tham số theo dõi, fragment, cổng mặc định, "/" cuối; host chữ thường;
+tham số còn lại sắp xếp) trước khi vào index, nên cả hai là một tài liệu.
+
+Index cấp cho mỗi URL chuẩn một ordinal theo thứ tự gặp lần đầu; postings, độ dài tài liệu,
+cột thuộc tính, bitmap và kho công thức của SearchEngine đều dùng ordinal. Bảng ordinal <-> URL
+duy nhất là doc_ids / doc_ordinals của index (lưu một lần trong docs.bin), URL chỉ xuất hiện
+ở API (kết quả tìm kiếm, trang chi tiết).
+"""
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# Tham số theo dõi bị bỏ khi chuẩn hóa URL
+TRACKING_PREFIXES = ('utm_', 'itm_')
+TRACKING_PARAMS = frozenset(['fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', 'ref', 'ref_src'])
+
+_DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonical_url(url):
+    """
+    URL chuẩn của một tài liệu (doc_id trong index); chuỗi không phải URL tuyệt đối giữ nguyên
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    default_port = _DEFAULT_PORTS.get(scheme)
+    if default_port and netloc.endswith(default_port):
+        netloc = netloc[:-len(default_port)]
+    path = parts.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not is_tracking_param(name))
+    return urlunsplit((scheme, netloc, path, urlencode(query), ''))
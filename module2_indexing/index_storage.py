@@ -0,0 +1,787 @@
+"""
+MODULE 2: LƯU TRỮ INDEX DẠNG NHỊ PHÂN (MEMORY-MAPPED)
+Mục tiêu: Lưu Inverted Index dạng nhị phân có phiên bản, mở bằng mmap để
+khởi động gần như tức thì và chia sẻ trang nhớ giữa các worker
+
+Cấu trúc thư mục index:
+    meta.json     - thông tin chung (phiên bản, số tài liệu, vị trí các section)
+    terms.bin     - từ điển term đã sắp xếp, nén front coding theo khối (tra cứu chính xác,
+                    theo tiền tố, theo khoảng), offset postings và bảng thống kê term
+                    (df, idf, max_tf, min_doc_length, max_score - xem term_stats.py),
+                    bảng gấp dấu: dạng bỏ dấu -> id các term có dấu (xem accent_folding.py),
+                    chỉ mục trigram: trigram ký tự -> id các term chứa nó (xem ngram_index.py)
+    postings.bin  - postings của từng term nằm liên tiếp, theo codec ghi trong meta.json:
+                    'raw':    doc_ordinals | frequencies | pos_offsets | pos_counts | field_freqs | positions
+                    'varint': nén delta + variable-byte theo khối (postings.encode_posting_list),
+                              thư mục khối có skip entry và block-max của từng khối
+    docs.bin      - bảng tài liệu: độ dài tài liệu, độ dài từng trường, bảng doc_id (URL),
+                    cột thuộc tính số theo ordinal (xem attributes.py)
+    ingredients.bin - key nguyên liệu đã sắp xếp (front coding) và bitmap nén các ordinal
+                    tài liệu của từng key (xem ingredients.py, bitmap.py)
+"""
+
+import os
+import sys
+import json
+import mmap
+import shutil
+from array import array
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from postings import (PostingList, CompressedPostingList, encode_posting_list, encode_varint,
+                      decode_varint, BLOCK_SIZE)
+from term_stats import TermStats, make_term_stats, scan_postings
+from accent_folding import fold_accents
+from ngram_index import term_ngrams, find_similar, DEFAULT_MAX_DISTANCE, DEFAULT_MAX_CANDIDATES
+from bitmap import Bitmap
+
+
+FORMAT_NAME = 'recipe-inverted-index'
+FORMAT_VERSION = 10
+# Phiên bản 2 giống phiên bản 3 với codec 'raw'; phiên bản 4 thêm bảng thống kê term;
+# phiên bản 5 lưu từ điển term dạng front coding; phiên bản 6 thêm bảng gấp dấu;
+# phiên bản 7 thêm chỉ mục trigram; phiên bản 8 thêm block-max vào thư mục khối (codec 'varint');
+# phiên bản 9 thêm ingredients.bin (bitmap nguyên liệu); phiên bản 10 thêm cột thuộc tính số vào docs.bin
+SUPPORTED_VERSIONS = (2, 3, 4, 5, 6, 7, 8, 9, 10)
+CODECS = ('raw', 'varint')
+DEFAULT_CODEC = 'varint'
+
+
+def _map_file(filepath):
+    """
+    Mở file bằng mmap chỉ đọc (file rỗng trả về bytes rỗng)
+    """
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _view(buffer, start, count, typecode):
+    """
+    Tạo memoryview kiểu typecode trên vùng nhớ [start, start + count * itemsize)
+    """
+    itemsize = array(typecode).itemsize
+    return memoryview(buffer)[start:start + count * itemsize].cast(typecode)
+
+
+class MappedStrings:
+    """
+    Danh sách chuỗi UTF-8 lưu liên tiếp, truy cập theo chỉ số không cần giải mã toàn bộ
+    """
+    def __init__(self, buffer, offsets, blob_start):
+        self.buffer = buffer
+        self.offsets = offsets  # memoryview 'I', độ dài n + 1
+        self.blob_start = blob_start
+
+    def get_bytes(self, i):
+        start = self.blob_start + self.offsets[i]
+        end = self.blob_start + self.offsets[i + 1]
+        return self.buffer[start:end]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return self.get_bytes(i).decode('utf-8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def lower_bound(self, key):
+        """
+        Chỉ số của chuỗi đầu tiên >= key (bytes), các chuỗi phải đã sắp xếp
+        """
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.get_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_bytes(self, start=0):
+        """
+        Duyệt (chỉ số, bytes) từ chuỗi thứ start
+        """
+        for i in range(start, len(self)):
+            yield i, self.get_bytes(i)
+
+
+# Số term trong một khối front coding
+TERM_BLOCK_SIZE = 16
+
+
+def _front_code(key, previous, index, blocks, block_offsets):
+    """
+    Ghi chuỗi thứ index (bytes) vào blob front coding; mở khối mới sau mỗi TERM_BLOCK_SIZE chuỗi
+    Args:
+        previous: chuỗi liền trước (bytes), bỏ qua khi mở khối mới
+        blocks, block_offsets: blob (bytearray) và vị trí các khối (array 'I') đang ghi
+    """
+    if index % TERM_BLOCK_SIZE == 0:
+        block_offsets.append(len(blocks))
+        encode_varint(len(key), blocks)
+        blocks += key
+        return
+    shared = 0
+    limit = min(len(previous), len(key))
+    while shared < limit and previous[shared] == key[shared]:
+        shared += 1
+    encode_varint(shared, blocks)
+    encode_varint(len(key) - shared, blocks)
+    blocks += key[shared:]
+
+
+class FrontCodedStrings:
+    """
+    Danh sách chuỗi UTF-8 đã sắp xếp, nén front coding theo khối TERM_BLOCK_SIZE chuỗi:
+    chuỗi đầu khối lưu đầy đủ (độ dài, bytes), các chuỗi sau lưu (số byte chung với
+    chuỗi trước, độ dài phần còn lại, phần còn lại). Tìm kiếm nhị phân trên chuỗi đầu
+    các khối rồi giải nén tuần tự trong một khối: O(log n + TERM_BLOCK_SIZE)
+    """
+    def __init__(self, buffer, block_offsets, blob_start, count):
+        self.buffer = buffer
+        self.block_offsets = block_offsets  # memoryview 'I', vị trí khối trong blob
+        self.blob_start = blob_start
+        self.count = count
+
+    def _block_first(self, b):
+        length, pos = decode_varint(self.buffer, self.blob_start + self.block_offsets[b])
+        return self.buffer[pos:pos + length]
+
+    def _iter_block(self, b, start=0):
+        """
+        Giải nén các chuỗi của khối b, bỏ qua start chuỗi đầu
+        """
+        pos = self.blob_start + self.block_offsets[b]
+        end = min(TERM_BLOCK_SIZE, self.count - b * TERM_BLOCK_SIZE)
+        length, pos = decode_varint(self.buffer, pos)
+        current = self.buffer[pos:pos + length]
+        pos += length
+        for j in range(end):
+            if j > 0:
+                shared, pos = decode_varint(self.buffer, pos)
+                length, pos = decode_varint(self.buffer, pos)
+                current = current[:shared] + self.buffer[pos:pos + length]
+                pos += length
+            if j >= start:
+                yield b * TERM_BLOCK_SIZE + j, current
+
+    def get_bytes(self, i):
+        for _, value in self._iter_block(i // TERM_BLOCK_SIZE, i % TERM_BLOCK_SIZE):
+            return value
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return self.get_bytes(i).decode('utf-8')
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for _, value in self.iter_bytes():
+            yield value.decode('utf-8')
+
+    def lower_bound(self, key):
+        """
+        Chỉ số của chuỗi đầu tiên >= key (bytes)
+        """
+        # Khối cuối cùng có chuỗi đầu <= key
+        lo, hi = 0, len(self.block_offsets)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._block_first(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return 0
+        for i, value in self._iter_block(lo - 1):
+            if value >= key:
+                return i
+        return min(lo * TERM_BLOCK_SIZE, self.count)
+
+    def iter_bytes(self, start=0):
+        """
+        Duyệt (chỉ số, bytes) từ chuỗi thứ start, giải nén lần lượt từng khối
+        """
+        if start >= self.count:
+            return
+        first_block = start // TERM_BLOCK_SIZE
+        yield from self._iter_block(first_block, start % TERM_BLOCK_SIZE)
+        for b in range(first_block + 1, len(self.block_offsets)):
+            yield from self._iter_block(b)
+
+
+class MappedTermTable:
+    """
+    Bảng key -> danh sách id term đọc từ terms.bin: các key đã sắp xếp (front coding)
+    và các danh sách id nối liền nhau (bảng gấp dấu, chỉ mục trigram)
+    """
+    def __init__(self, buffer, sections, name, count):
+        """
+        Args:
+            sections: vị trí các section trong terms.bin
+            name: tiền tố tên section ('folded', 'trigram')
+            count: số key
+        """
+        self.keys = FrontCodedStrings(
+            buffer,
+            _view(buffer, sections[name + '_block_offsets'], (count + TERM_BLOCK_SIZE - 1) // TERM_BLOCK_SIZE, 'I'),
+            sections[name + '_blocks'],
+            count
+        )
+        self.offsets = _view(buffer, sections[name + '_offsets'], count + 1, 'I')
+        self.term_ids = _view(buffer, sections[name + '_term_ids'], self.offsets[count], 'I')
+
+    def get(self, key):
+        """
+        Danh sách id term (memoryview, tăng dần) của key, rỗng nếu không có
+        """
+        key_bytes = key.encode('utf-8')
+        j = self.keys.lower_bound(key_bytes)
+        if j >= len(self.keys) or self.keys.get_bytes(j) != key_bytes:
+            return self.term_ids[0:0]
+        return self.term_ids[self.offsets[j]:self.offsets[j + 1]]
+
+    def iter_prefix(self, prefix):
+        """
+        Duyệt danh sách id term của các key bắt đầu bằng prefix (theo thứ tự key)
+        """
+        prefix_key = prefix.encode('utf-8')
+        for j, key in self.keys.iter_bytes(self.keys.lower_bound(prefix_key)):
+            if not key.startswith(prefix_key):
+                return
+            yield self.term_ids[self.offsets[j]:self.offsets[j + 1]]
+
+
+class MappedIngredients:
+    """
+    Bitmap nguyên liệu đọc từ ingredients.bin: key đã sắp xếp (front coding)
+    và bitmap nén của từng key nối liền nhau
+    """
+    def __init__(self, buffer, sections, count):
+        self.buffer = buffer
+        self.names = FrontCodedStrings(
+            buffer,
+            _view(buffer, sections['name_block_offsets'], (count + TERM_BLOCK_SIZE - 1) // TERM_BLOCK_SIZE, 'I'),
+            sections['name_blocks'],
+            count
+        )
+        self.bitmap_offsets = _view(buffer, sections['bitmap_offsets'], count + 1, 'Q')
+        self.bitmaps_start = sections['bitmaps']
+
+    def get(self, key):
+        """
+        Bitmap của key nguyên liệu, rỗng nếu không có
+        """
+        key_bytes = key.encode('utf-8')
+        j = self.names.lower_bound(key_bytes)
+        if j >= len(self.names) or self.names.get_bytes(j) != key_bytes:
+            return Bitmap()
+        start = self.bitmaps_start + self.bitmap_offsets[j]
+        end = self.bitmaps_start + self.bitmap_offsets[j + 1]
+        return Bitmap.from_bytes(memoryview(self.buffer)[start:end])
+
+
+class MappedTermDictionary:
+    """
+    Từ điển term đọc trực tiếp từ file mmap: tra cứu bằng tìm kiếm nhị phân,
+    posting list chỉ được "fault in" khi truy cập
+    """
+    def __init__(self, terms_buffer, postings_buffer, meta):
+        sections = meta['sections']
+        term_count = meta['term_count']
+        self.field_count = len(meta['fields'])
+        self.field_weights = meta['field_weights']
+        self.codec = meta.get('postings_codec', 'raw')
+        self.block_size = meta.get('block_size', BLOCK_SIZE)
+        self.block_max = meta.get('block_max', False)
+        self.postings_buffer = postings_buffer
+        if 'term_block_offsets' in sections:
+            block_count = (term_count + TERM_BLOCK_SIZE - 1) // TERM_BLOCK_SIZE
+            self.terms = FrontCodedStrings(
+                terms_buffer,
+                _view(terms_buffer, sections['term_block_offsets'], block_count, 'I'),
+                sections['term_blocks'],
+                term_count
+            )
+        else:
+            self.terms = MappedStrings(
+                terms_buffer,
+                _view(terms_buffer, sections['term_string_offsets'], term_count + 1, 'I'),
+                sections['term_strings']
+            )
+        self.postings_offsets = _view(terms_buffer, sections['postings_offsets'], term_count, 'Q')
+        self.dfs = _view(terms_buffer, sections['dfs'], term_count, 'I')
+        self.position_totals = _view(terms_buffer, sections['position_totals'], term_count, 'I')
+
+        # Bảng thống kê term (không có ở index phiên bản cũ)
+        self.has_term_statistics = 'idfs' in sections
+        if self.has_term_statistics:
+            self.idfs = _view(terms_buffer, sections['idfs'], term_count, 'd')
+            self.max_scores = _view(terms_buffer, sections['max_scores'], term_count, 'd')
+            self.max_tfs = _view(terms_buffer, sections['max_tfs'], term_count, 'f')
+            self.min_doc_lengths = _view(terms_buffer, sections['min_doc_lengths'], term_count, 'I')
+
+        # Bảng gấp dấu (không có ở index phiên bản cũ)
+        self.has_folded_terms = 'folded_blocks' in sections
+        if self.has_folded_terms:
+            self.folded_table = MappedTermTable(terms_buffer, sections, 'folded', meta['folded_count'])
+
+        # Chỉ mục trigram (không có ở index phiên bản cũ)
+        self.has_trigrams = 'trigram_blocks' in sections
+        if self.has_trigrams:
+            self.trigram_table = MappedTermTable(terms_buffer, sections, 'trigram', meta['trigram_count'])
+
+    def find(self, term):
+        """
+        Tìm chỉ số của term trong từ điển (tìm kiếm nhị phân), -1 nếu không có
+        """
+        key = term.encode('utf-8')
+        i = self.terms.lower_bound(key)
+        if i < len(self.terms) and self.terms.get_bytes(i) == key:
+            return i
+        return -1
+
+    def iter_range(self, start, end=None):
+        """
+        Duyệt các term trong khoảng [start, end) theo thứ tự tăng dần (end=None: đến hết)
+        """
+        end_key = end.encode('utf-8') if end is not None else None
+        for _, key in self.terms.iter_bytes(self.terms.lower_bound(start.encode('utf-8'))):
+            if end_key is not None and key >= end_key:
+                return
+            yield key.decode('utf-8')
+
+    def iter_prefix(self, prefix):
+        """
+        Duyệt các term bắt đầu bằng prefix theo thứ tự tăng dần
+        """
+        prefix_key = prefix.encode('utf-8')
+        for _, key in self.terms.iter_bytes(self.terms.lower_bound(prefix_key)):
+            if not key.startswith(prefix_key):
+                return
+            yield key.decode('utf-8')
+
+    def folded_terms(self, folded):
+        """
+        Các term có dấu có dạng bỏ dấu là folded (tìm kiếm nhị phân trên bảng gấp dấu)
+        """
+        return [self.terms[i] for i in self.folded_table.get(folded)]
+
+    def folded_terms_with_prefix(self, prefix):
+        """
+        Các term có dấu có dạng bỏ dấu bắt đầu bằng prefix (duyệt khoảng trên các key của bảng gấp dấu)
+        """
+        for term_ids in self.folded_table.iter_prefix(prefix):
+            for i in term_ids:
+                yield self.terms[i]
+
+    def similar_terms(self, term, max_distance=DEFAULT_MAX_DISTANCE, max_candidates=DEFAULT_MAX_CANDIDATES):
+        """
+        Các cặp (khoảng cách sửa, term) gần đúng với term, tìm qua chỉ mục trigram
+        """
+        return find_similar(term, self.trigram_table.get, self.terms.__getitem__, max_distance, max_candidates)
+
+    def posting_list(self, i):
+        """
+        Tạo PostingList (memoryview trên mmap, không sao chép) cho term thứ i
+        """
+        df = self.dfs[i]
+        start = self.postings_offsets[i]
+        if self.codec == 'varint':
+            end = self.postings_offsets[i + 1] if i + 1 < len(self.postings_offsets) else len(self.postings_buffer)
+            return CompressedPostingList(memoryview(self.postings_buffer)[start:end], df,
+                                         self.field_count, self.field_weights, self.block_size,
+                                         self.block_max)
+        doc_ordinals = _view(self.postings_buffer, start, df, 'I')
+        frequencies = _view(self.postings_buffer, start + 4 * df, df, 'f')
+        pos_offsets = _view(self.postings_buffer, start + 8 * df, df, 'I')
+        pos_counts = _view(self.postings_buffer, start + 12 * df, df, 'I')
+        field_freqs = _view(self.postings_buffer, start + 16 * df, df * self.field_count, 'I')
+        positions = _view(self.postings_buffer, start + (16 + 4 * self.field_count) * df,
+                          self.position_totals[i], 'I')
+        return PostingList(positions, self.field_count, doc_ordinals, frequencies,
+                           pos_offsets, pos_counts, field_freqs)
+
+    def term_statistics(self, i):
+        """
+        TermStats của term thứ i, None nếu index không có bảng thống kê
+        """
+        if not self.has_term_statistics:
+            return None
+        return TermStats(self.dfs[i], self.idfs[i], self.max_tfs[i],
+                         self.min_doc_lengths[i], self.max_scores[i])
+
+    def get(self, term, default=None):
+        i = self.find(term)
+        if i < 0:
+            return default
+        return self.posting_list(i)
+
+    def __getitem__(self, term):
+        posting_list = self.get(term)
+        if posting_list is None:
+            raise KeyError(term)
+        return posting_list
+
+    def __contains__(self, term):
+        return self.find(term) >= 0
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def keys(self):
+        return iter(self.terms)
+
+    def items(self):
+        for i, term in enumerate(self.terms):
+            yield term, self.posting_list(i)
+
+
+class IndexWriter:
+    """
+    Ghi index nhị phân theo kiểu streaming: các term phải được thêm theo thứ tự tăng dần
+    """
+    def __init__(self, out_dir, doc_lengths, codec=DEFAULT_CODEC):
+        """
+        Args:
+            out_dir: thư mục index đầu ra
+            doc_lengths: độ dài tài liệu theo ordinal (dùng cho bảng thống kê term)
+            codec: 'varint' (nén delta + variable-byte) hoặc 'raw' (mảng thô)
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Codec không hỗ trợ: {codec}")
+        self.out_dir = out_dir
+        self.codec = codec
+        self.doc_lengths = array('I', doc_lengths)
+        self.doc_count = len(self.doc_lengths)
+        self.avg_doc_length = sum(self.doc_lengths) / self.doc_count if self.doc_count else 0
+        self.tmp_dir = out_dir + '.tmp'
+        if os.path.exists(self.tmp_dir):
+            shutil.rmtree(self.tmp_dir)
+        os.makedirs(self.tmp_dir)
+
+        self.postings_file = open(os.path.join(self.tmp_dir, 'postings.bin'), 'wb')
+        self.postings_size = 0
+        self.term_blocks = bytearray()
+        self.term_block_offsets = array('I')
+        self.postings_offsets = array('Q')
+        self.dfs = array('I')
+        self.position_totals = array('I')
+        self.idfs = array('d')
+        self.max_scores = array('d')
+        self.max_tfs = array('f')
+        self.min_doc_lengths = array('I')
+        self.folded_terms = defaultdict(list)  # {dạng bỏ dấu: [id term có dấu, ...]}
+        self.trigram_terms = defaultdict(lambda: array('I'))  # {trigram: id các term chứa nó}
+        self.last_term = None
+
+    def add_term(self, term, posting_list):
+        """
+        Ghi postings của một term
+        Args:
+            term: term (phải lớn hơn term trước đó)
+            posting_list: PostingList (positions có thể là buffer dùng chung)
+        """
+        if self.last_term is not None and term <= self.last_term:
+            raise ValueError(f"Term phải được ghi theo thứ tự tăng dần: '{term}'")
+        self._add_term_string(term)
+        self.last_term = term
+        term_id = len(self.dfs)
+        folded = fold_accents(term)
+        if folded != term:
+            self.folded_terms[folded].append(term_id)
+        for gram in term_ngrams(term):
+            self.trigram_terms[gram].append(term_id)
+
+        stats = make_term_stats(len(posting_list), *scan_postings(posting_list, self.doc_lengths),
+                                self.doc_count, self.avg_doc_length)
+        self.idfs.append(stats.idf)
+        self.max_scores.append(stats.max_score)
+        self.max_tfs.append(stats.max_tf)
+        self.min_doc_lengths.append(stats.min_doc_length)
+
+        if self.codec == 'varint':
+            data = encode_posting_list(posting_list, BLOCK_SIZE, self.doc_lengths)
+            self.postings_offsets.append(self.postings_size)
+            self.dfs.append(len(posting_list))
+            self.position_totals.append(sum(posting_list.pos_counts))
+            self.postings_file.write(data)
+            self.postings_size += len(data)
+            return
+
+        # Gom positions của term thành một khối liên tiếp, offset tính từ đầu khối
+        positions = array('I')
+        pos_offsets = array('I')
+        for i in range(len(posting_list)):
+            pos_offsets.append(len(positions))
+            positions.extend(posting_list.get_positions(i))
+
+        self.postings_offsets.append(self.postings_size)
+        self.dfs.append(len(posting_list))
+        self.position_totals.append(len(positions))
+
+        for block in (array('I', posting_list.doc_ordinals),
+                      array('f', posting_list.frequencies),
+                      pos_offsets,
+                      array('I', posting_list.pos_counts),
+                      array('I', posting_list.field_freqs),
+                      positions):
+            data = block.tobytes()
+            self.postings_file.write(data)
+            self.postings_size += len(data)
+
+    def _add_term_string(self, term):
+        """
+        Ghi term vào khối front coding hiện tại (mở khối mới sau mỗi TERM_BLOCK_SIZE term)
+        """
+        previous = self.last_term.encode('utf-8') if self.last_term is not None else b''
+        _front_code(term.encode('utf-8'), previous, len(self.dfs),
+                    self.term_blocks, self.term_block_offsets)
+
+    @staticmethod
+    def _table_sections(table):
+        """
+        Mã hóa bảng key -> id term (MappedTermTable): các key đã sắp xếp (front coding),
+        offset và các danh sách id nối liền
+        Returns:
+            tuple: (blob key, vị trí các khối key, offset, id term)
+        """
+        blocks = bytearray()
+        block_offsets = array('I')
+        offsets = array('I', [0])
+        term_ids = array('I')
+        previous = b''
+        for j, name in enumerate(sorted(table)):
+            key = name.encode('utf-8')
+            _front_code(key, previous, j, blocks, block_offsets)
+            previous = key
+            term_ids.extend(table[name])
+            offsets.append(len(term_ids))
+        return blocks, block_offsets, offsets, term_ids
+
+    def finish(self, doc_ids, field_lengths, stats, ingredients=(), attributes=None):
+        """
+        Ghi từ điển term, bảng tài liệu, bitmap nguyên liệu, meta.json và chuyển thư mục tạm
+        thành thư mục đích
+        Args:
+            doc_ids, field_lengths: bảng tài liệu theo ordinal
+            stats: thống kê toàn cục (InvertedIndex.get_statistics())
+            ingredients: các cặp (key nguyên liệu, ordinal tăng dần) theo thứ tự key
+            attributes: {thuộc tính: giá trị theo ordinal} (cột thuộc tính số)
+        """
+        self.postings_file.close()
+
+        # terms.bin: các mảng 8 byte, rồi 4 byte, chuỗi term và key của các bảng phụ ở cuối
+        tables = {'folded': self._table_sections(self.folded_terms),
+                  'trigram': self._table_sections(self.trigram_terms)}
+        arrays = [('postings_offsets', self.postings_offsets),
+                  ('idfs', self.idfs),
+                  ('max_scores', self.max_scores),
+                  ('term_block_offsets', self.term_block_offsets),
+                  ('dfs', self.dfs),
+                  ('position_totals', self.position_totals),
+                  ('max_tfs', self.max_tfs),
+                  ('min_doc_lengths', self.min_doc_lengths)]
+        blobs = [('term_blocks', self.term_blocks)]
+        for table, (blocks, block_offsets, offsets, term_ids) in tables.items():
+            arrays += [(table + '_block_offsets', block_offsets),
+                       (table + '_offsets', offsets),
+                       (table + '_term_ids', term_ids)]
+            blobs.append((table + '_blocks', blocks))
+
+        sections = {}
+        with open(os.path.join(self.tmp_dir, 'terms.bin'), 'wb') as f:
+            offset = 0
+            for name, block in arrays + blobs:
+                sections[name] = offset
+                data = block.tobytes() if isinstance(block, array) else block
+                f.write(data)
+                offset += len(data)
+
+        # docs.bin: độ dài tài liệu, cột thuộc tính, offset chuỗi doc_id, chuỗi doc_id
+        doc_strings = bytearray()
+        doc_string_offsets = array('I', [0])
+        for doc_id in doc_ids:
+            doc_strings += doc_id.encode('utf-8')
+            doc_string_offsets.append(len(doc_strings))
+        lengths = self.doc_lengths
+        with open(os.path.join(self.tmp_dir, 'docs.bin'), 'wb') as f:
+            offset = 0
+            columns = [('attr_' + name, array('I', column)) for name, column in (attributes or {}).items()]
+            for name, block in [('doc_lengths', lengths),
+                                ('field_lengths', array('I', field_lengths))] + columns + [
+                                ('doc_string_offsets', doc_string_offsets)]:
+                sections[name] = offset
+                data = block.tobytes()
+                f.write(data)
+                offset += len(data)
+            sections['doc_strings'] = offset
+            f.write(doc_strings)
+
+        # ingredients.bin: vị trí khối key, offset bitmap, key (front coding), bitmap
+        name_blocks = bytearray()
+        name_block_offsets = array('I')
+        bitmap_offsets = array('Q', [0])
+        bitmaps = bytearray()
+        previous = b''
+        for j, (name, ordinals) in enumerate(ingredients):
+            key = name.encode('utf-8')
+            _front_code(key, previous, j, name_blocks, name_block_offsets)
+            previous = key
+            bitmaps += Bitmap.from_sorted(ordinals).to_bytes()
+            bitmap_offsets.append(len(bitmaps))
+        ingredient_sections = {}
+        with open(os.path.join(self.tmp_dir, 'ingredients.bin'), 'wb') as f:
+            offset = 0
+            for name, block in (('bitmap_offsets', bitmap_offsets),
+                                ('name_block_offsets', name_block_offsets),
+                                ('name_blocks', name_blocks),
+                                ('bitmaps', bitmaps)):
+                ingredient_sections[name] = offset
+                data = block.tobytes() if isinstance(block, array) else block
+                f.write(data)
+                offset += len(data)
+
+        meta = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'postings_codec': self.codec,
+            'block_size': BLOCK_SIZE,
+            'block_max': True,
+            'term_count': len(self.dfs),
+            'folded_count': len(self.folded_terms),
+            'trigram_count': len(self.trigram_terms),
+            'doc_total': len(lengths),
+            'ingredient_count': len(bitmap_offsets) - 1,
+            'attributes': list(attributes or {}),
+            **stats,
+            'sections': sections,
+            'ingredient_sections': ingredient_sections
+        }
+        with open(os.path.join(self.tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+        if os.path.exists(self.out_dir):
+            shutil.rmtree(self.out_dir)
+        os.replace(self.tmp_dir, self.out_dir)
+
+
+def write_index(inverted_index, out_dir, codec=DEFAULT_CODEC):
+    """
+    Ghi một InvertedIndex (trong bộ nhớ hoặc mmap) ra định dạng nhị phân
+    """
+    writer = IndexWriter(out_dir, inverted_index.doc_lengths, codec)
+    for term in sorted(inverted_index.index.keys()):
+        writer.add_term(term, inverted_index.index[term])
+    writer.finish(inverted_index.doc_ids, inverted_index.field_lengths,
+                  inverted_index.get_statistics(), inverted_index.iter_ingredient_postings(),
+                  inverted_index.attribute_columns)
+
+
+def open_index(index_dir):
+    """
+    Mở index nhị phân bằng mmap
+    Returns:
+        tuple: (meta, term_dictionary, doc_ids, doc_lengths, field_lengths)
+    """
+    with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    if meta.get('format') != FORMAT_NAME:
+        raise ValueError(f"Không phải thư mục index hợp lệ: {index_dir}")
+    if meta.get('version') not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Phiên bản index không hỗ trợ: {meta.get('version')} (cần {FORMAT_VERSION})")
+    if meta.get('postings_codec', 'raw') not in CODECS:
+        raise ValueError(f"Codec postings không hỗ trợ: {meta.get('postings_codec')}")
+    if meta.get('byteorder') != sys.byteorder:
+        raise ValueError(f"Index được ghi với byteorder {meta.get('byteorder')}, máy hiện tại là {sys.byteorder}")
+
+    terms_buffer = _map_file(os.path.join(index_dir, 'terms.bin'))
+    postings_buffer = _map_file(os.path.join(index_dir, 'postings.bin'))
+    docs_buffer = _map_file(os.path.join(index_dir, 'docs.bin'))
+
+    sections = meta['sections']
+    doc_total = meta['doc_total']
+    term_dictionary = MappedTermDictionary(terms_buffer, postings_buffer, meta)
+    doc_lengths = _view(docs_buffer, sections['doc_lengths'], doc_total, 'I')
+    field_lengths = _view(docs_buffer, sections['field_lengths'], doc_total * len(meta['fields']), 'I')
+    doc_ids = MappedStrings(
+        docs_buffer,
+        _view(docs_buffer, sections['doc_string_offsets'], doc_total + 1, 'I'),
+        sections['doc_strings']
+    )
+    return meta, term_dictionary, doc_ids, doc_lengths, field_lengths
+
+
+def open_ingredients(index_dir, meta):
+    """
+    Mở bitmap nguyên liệu (ingredients.bin) bằng mmap, None với index phiên bản cũ
+    """
+    if 'ingredient_sections' not in meta:
+        return None
+    buffer = _map_file(os.path.join(index_dir, 'ingredients.bin'))
+    return MappedIngredients(buffer, meta['ingredient_sections'], meta['ingredient_count'])
+
+
+def open_attributes(index_dir, meta):
+    """
+    Các cột thuộc tính số trong docs.bin (memoryview 'I' theo ordinal), {} với index phiên bản cũ
+    """
+    names = meta.get('attributes', [])
+    if not names:
+        return {}
+    docs_buffer = _map_file(os.path.join(index_dir, 'docs.bin'))
+    return {name: _view(docs_buffer, meta['sections']['attr_' + name], meta['doc_total'], 'I')
+            for name in names}
+
+
+def convert_json_index(json_path, out_dir, codec=DEFAULT_CODEC):
+    """
+    Chuyển index JSON (định dạng cũ hoặc dạng mảng) hoặc index nhị phân sang định dạng nhị phân
+    """
+    from text_processor import InvertedIndex
+
+    inverted_index = InvertedIndex()
+    inverted_index.load(json_path)
+    inverted_index.save(out_dir, codec=codec)
+
+
+def main():
+    """
+    Chuyển index/inverted_index.json sang index/inverted_index (nhị phân)
+    """
+    import argparse
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.dirname(script_dir)
+
+    parser = argparse.ArgumentParser(description='Chuyển index JSON sang định dạng nhị phân mmap')
+    parser.add_argument('json_path', nargs='?',
+                        default=os.path.join(base_dir, 'index', 'inverted_index.json'))
+    parser.add_argument('out_dir', nargs='?',
+                        default=os.path.join(base_dir, 'index', 'inverted_index'))
+    parser.add_argument('--codec', choices=CODECS, default=DEFAULT_CODEC,
+                        help='cách lưu postings (varint = nén delta + variable-byte)')
+    args = parser.parse_args()
+
+    print(f"🔄 Đang chuyển {args.json_path} -> {args.out_dir} (codec {args.codec})")
+    convert_json_index(args.json_path, args.out_dir, args.codec)
+    print("✅ Hoàn thành!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+MODULE 2: CHUẨN HÓA NGUYÊN LIỆU
+Mục tiêu: Trả lời các truy vấn kiểu "có tôm và hành, nhưng không có đậu phộng"
+bằng bitmap theo từng nguyên liệu thay vì tìm toàn văn trên dòng nguyên liệu thô
+
+Mỗi dòng nguyên liệu được đưa về tên chuẩn:
+    "2 muỗng canh nước mắm"     -> "nước mắm"
+    "100g đậu phộng rang"       -> "đậu phộng rang"
+    "Quế, hồi, thảo quả"        -> "quế", "hồi", "thảo quả"
+    "Gia vị: muối, tiêu (xay)"  -> "muối", "tiêu"
+Tên chuẩn được index theo mọi tiền tố âm tiết ("đậu phộng rang" -> "đậu", "đậu phộng",
+"đậu phộng rang"), nên lọc theo "tôm" khớp cả "tôm tươi", "tôm khô", còn "hành" loại
+cả "hành lá", "hành tím".
+"""
+
+import re
+
+
+# Số âm tiết tối đa của tên nguyên liệu được index (tiền tố dài hơn ít khi được tìm)
+MAX_INGREDIENT_SYLLABLES = 4
+
+# Đơn vị đo / lượng từ đứng trước tên nguyên liệu (cụm nhiều âm tiết được xét trước)
+UNIT_PHRASES = sorted([
+    'muỗng canh', 'muỗng cà phê', 'muỗng café', 'muỗng súp', 'muỗng nhỏ', 'muỗng',
+    'thìa canh', 'thìa cà phê', 'thìa café', 'thìa súp', 'thìa nhỏ', 'thìa',
+    'chén', 'bát', 'tách', 'cốc', 'ly', 'cup',
+    'g', 'gr', 'gam', 'gram', 'kg', 'kí', 'ký', 'lạng', 'mg', 'ml', 'l', 'lít',
+    'củ', 'quả', 'trái', 'tép', 'nhánh', 'cây', 'con', 'miếng', 'lát', 'khúc', 'túi',
+    'gói', 'hộp', 'lon', 'chai', 'bó', 'nắm', 'nhúm', 'ít', 'chút', 'vài', 'nửa',
+], key=lambda phrase: -phrase.count(' '))
+
+# Dấu phân tách nhiều nguyên liệu trên một dòng
+_SEPARATORS = re.compile(r'[,;/+]|\bhoặc\b|\bvà\b')
+# Số, phân số, số liền đơn vị: "2", "1/2", "1.5", "2-3", "500g"
+_QUANTITY = re.compile(r'^\d+([.,/-]\d+)*[^\W\d]*$')
+_DECIMAL_COMMA = re.compile(r'(\d),(\d)')
+_PARENTHESES = re.compile(r'\([^)]*\)|\[[^\]]*\]')
+_NON_LETTERS = re.compile(r'[^\w\s]|\d|_')
+
+
+def _strip_quantity(syllables):
+    """
+    Bỏ số lượng và đơn vị ở đầu: ["2", "muỗng", "canh", "nước", "mắm"] -> ["nước", "mắm"]
+    """
+    changed = True
+    while syllables and changed:
+        changed = False
+        if _QUANTITY.match(syllables[0]):
+            syllables = syllables[1:]
+            changed = True
+            continue
+        for phrase in UNIT_PHRASES:
+            words = phrase.split(' ')
+            # Chỉ bỏ đơn vị khi sau nó còn tên nguyên liệu ("1 con gà" -> "gà"),
+            # để dòng chỉ có một từ trùng đơn vị (ví dụ "ít") không bị xóa hết
+            if syllables[:len(words)] == words and len(syllables) > len(words):
+                syllables = syllables[len(words):]
+                changed = True
+                break
+    return syllables
+
+
+def normalize_ingredients(line):
+    """
+    Các tên nguyên liệu chuẩn trên một dòng nguyên liệu (chữ thường, không số lượng / đơn vị)
+    """
+    text = _PARENTHESES.sub(' ', _DECIMAL_COMMA.sub(r'\1.\2', line.lower()))
+    if ':' in text:
+        # "Gia vị: muối, tiêu" -> phần sau dấu hai chấm
+        text = text.split(':', 1)[1]
+    names = []
+    for part in _SEPARATORS.split(text):
+        syllables = _strip_quantity(part.split())
+        syllables = _NON_LETTERS.sub(' ', ' '.join(syllables)).split()
+        if syllables:
+            names.append(' '.join(syllables))
+    return names
+
+
+def normalize_ingredient(name):
+    """
+    Tên chuẩn của một nguyên liệu trong bộ lọc (cùng quy tắc với lúc index), '' nếu rỗng
+    """
+    names = normalize_ingredients(name)
+    return names[0] if names else ''
+
+
+def ingredient_keys(lines):
+    """
+    Các key nguyên liệu của một công thức: mọi tiền tố âm tiết của các tên chuẩn
+    (tối đa MAX_INGREDIENT_SYLLABLES âm tiết), sắp xếp, không trùng
+    """
+    keys = set()
+    for line in lines:
+        for name in normalize_ingredients(line):
+            syllables = name.split(' ')[:MAX_INGREDIENT_SYLLABLES]
+            for end in range(1, len(syllables) + 1):
+                keys.add(' '.join(syllables[:end]))
+    return sorted(keys)
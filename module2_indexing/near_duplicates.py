@@ -0,0 +1,199 @@
+"""
+MODULE 2: PHÁT HIỆN CÔNG THỨC GẦN TRÙNG (MINHASH / LSH)
+Mục tiêu: Gộp các công thức gần như giống hệt nhau (cùng công thức đăng lại trên nhiều trang,
+cùng trang nhưng URL khác tham số theo dõi) thành một tài liệu đại diện trước khi index
+
+Các bước cho mỗi công thức:
+    1. Shingle: các cụm SHINGLE_SIZE âm tiết liên tiếp của dòng nguyên liệu và các bước làm
+    2. Chữ ký MinHash NUM_HASHES giá trị: hai công thức có giá trị bằng nhau ở một vị trí với
+       xác suất bằng độ tương đồng Jaccard của hai tập shingle. Dùng one-permutation hashing
+       (mỗi shingle băm một lần, rơi vào một ô, mỗi ô giữ giá trị nhỏ nhất) nên chi phí là
+       O(số shingle + NUM_HASHES) thay vì tích của hai số. Công thức chỉ có vài chục shingle nên
+       phần lớn ô rỗng; ô rỗng mượn giá trị của ô khác rỗng đầu tiên theo một dãy ô ngẫu nhiên
+       cố định riêng cho từng ô (densification), không phải ô kế bên, để các ô khác nhau giữa
+       hai công thức không dồn thành cụm liền nhau làm hỏng cả dải ở bước 3
+    3. LSH banding: chữ ký chia thành BANDS dải, mỗi dải ROWS giá trị; hai công thức chỉ được
+       so sánh khi trùng ít nhất một dải, nên không phải so từng cặp (O(n^2))
+    4. Ứng viên có độ tương đồng Jaccard (tính chính xác trên tập shingle) >= SIMILARITY_THRESHOLD
+       là bản gần trùng của công thức đại diện đã gặp trước (tài liệu đầu tiên của cụm theo
+       thứ tự đầu vào)
+
+Chỉ công thức đại diện được đưa vào bảng LSH (và giữ tập shingle, ~4 byte / shingle), nên mỗi
+công thức so với tối đa vài đại diện của các dải trùng, kể cả khi bị đăng lại hàng trăm lần.
+"""
+
+import re
+import zlib
+import random
+from array import array
+
+from doc_ids import canonical_url
+
+
+# Số âm tiết của một shingle
+SHINGLE_SIZE = 3
+
+# Số giá trị của chữ ký MinHash (= BANDS * ROWS, lũy thừa của 2)
+NUM_HASHES = 128
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+
+# Độ tương đồng Jaccard tối thiểu để coi là gần trùng; với 16 dải x 8 hàng, cặp có
+# Jaccard 0.8 trùng ít nhất một dải với xác suất ~95%, Jaccard 0.85 ~ 99.5%
+SIMILARITY_THRESHOLD = 0.8
+
+_BIN_BITS = NUM_HASHES.bit_length() - 1
+_BIN_SEED = 0x5BD1E995
+
+
+def _probe_orders(seed=0x6D696E68):
+    """
+    Dãy ô cố định cho densification: ô j lần lượt thử các ô khác theo một hoán vị ngẫu nhiên
+    (seed cố định để chữ ký giống nhau giữa các lần chạy / process)
+    """
+    rng = random.Random(seed)
+    orders = []
+    for slot in range(NUM_HASHES):
+        order = [other for other in range(NUM_HASHES) if other != slot]
+        rng.shuffle(order)
+        orders.append(order)
+    return orders
+
+
+_PROBE_ORDERS = _probe_orders()
+
+_NON_LETTERS = re.compile(r'[^\w\s]|\d|_')
+
+
+def recipe_shingles(doc):
+    """
+    Tập shingle (đã băm) của một công thức: cụm SHINGLE_SIZE âm tiết liên tiếp trên
+    dòng nguyên liệu và các bước làm, chữ thường, bỏ số và dấu câu
+    """
+    lines = list(doc.get('ingredients') or []) + list(doc.get('instructions') or [])
+    syllables = _NON_LETTERS.sub(' ', '\n'.join(lines).lower()).split()
+    if len(syllables) < SHINGLE_SIZE:
+        windows = [' '.join(syllables)] if syllables else []
+    else:
+        windows = (' '.join(syllables[i:i + SHINGLE_SIZE]) for i in range(len(syllables) - SHINGLE_SIZE + 1))
+    return {zlib.crc32(window.encode('utf-8')) for window in windows}
+
+
+def minhash_signature(shingles):
+    """
+    Chữ ký MinHash (array('I') NUM_HASHES giá trị) của một tập shingle, None nếu tập rỗng
+    """
+    if not shingles:
+        return None
+    bins = [None] * NUM_HASHES
+    for shingle in shingles:
+        # Ô lấy từ một hàm băm khác để không phụ thuộc giá trị trong ô
+        slot = zlib.crc32(shingle.to_bytes(4, 'little'), _BIN_SEED) >> (32 - _BIN_BITS)
+        value = bins[slot]
+        if value is None or shingle < value:
+            bins[slot] = shingle
+
+    # Densification: ô rỗng mượn giá trị của ô khác rỗng đầu tiên trong dãy ô của nó
+    signature = array('I', bytes(4 * NUM_HASHES))
+    for slot, value in enumerate(bins):
+        if value is None:
+            for other in _PROBE_ORDERS[slot]:
+                value = bins[other]
+                if value is not None:
+                    break
+        signature[slot] = value
+    return signature
+
+
+def jaccard(shingles, other):
+    """
+    Độ tương đồng Jaccard giữa một set shingle và một dãy shingle không trùng
+    """
+    common = len(shingles.intersection(other))
+    return common / (len(shingles) + len(other) - common)
+
+
+class NearDuplicateDetector:
+    """
+    Gom cụm công thức gần trùng theo thứ tự đưa vào (xem đầu file)
+    """
+    def __init__(self, threshold=SIMILARITY_THRESHOLD):
+        """
+        Args:
+            threshold: độ tương đồng Jaccard tối thiểu để gộp
+        """
+        self.threshold = threshold
+        self.buckets = [{} for _ in range(BANDS)]  # {khóa dải: [chỉ số đại diện]}
+        self.shingles = []                         # tập shingle (array('I')) của các công thức đại diện
+        self.canonical_ids = []                    # doc_id của các công thức đại diện
+        self.clusters = {}                         # {chỉ số đại diện: [(doc_id, độ tương đồng)]}
+        self.checked = 0                           # số cặp ứng viên đã tính Jaccard
+
+    def add(self, doc_id, doc):
+        """
+        Đưa một công thức vào bộ phát hiện
+        Returns:
+            doc_id của công thức đại diện nếu doc là bản gần trùng, None nếu doc được giữ lại
+            (công thức không có nguyên liệu / cách làm luôn được giữ lại)
+        """
+        shingles = recipe_shingles(doc)
+        signature = minhash_signature(shingles)
+        if signature is None:
+            return None
+        keys = [hash(tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for band, key in enumerate(keys):
+            for candidate in self.buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                self.checked += 1
+                similarity = jaccard(shingles, self.shingles[candidate])
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+        if best is not None:
+            self.clusters.setdefault(best, []).append((doc_id, best_similarity))
+            return self.canonical_ids[best]
+
+        canonical = len(self.shingles)
+        self.shingles.append(array('I', shingles))
+        self.canonical_ids.append(doc_id)
+        for band, key in enumerate(keys):
+            self.buckets[band].setdefault(key, []).append(canonical)
+        return None
+
+    def report(self):
+        """
+        Báo cáo các cụm đã gộp, cụm lớn trước
+        Returns:
+            list: [{'canonical': doc_id giữ lại, 'duplicates': [{'doc_id', 'similarity'}]}]
+        """
+        clusters = sorted(self.clusters.items(), key=lambda item: (-len(item[1]), item[0]))
+        return [{'canonical': self.canonical_ids[canonical],
+                 'duplicates': [{'doc_id': doc_id, 'similarity': round(similarity, 4)}
+                                for doc_id, similarity in members]}
+                for canonical, members in clusters]
+
+
+def collapse_near_duplicates(documents, threshold=SIMILARITY_THRESHOLD):
+    """
+    Bỏ các công thức gần trùng, giữ công thức đầu tiên của mỗi cụm
+    Args:
+        documents: list các dict công thức
+        threshold: độ tương đồng Jaccard tối thiểu để gộp
+    Returns:
+        tuple: (các công thức được giữ lại theo thứ tự ban đầu, báo cáo NearDuplicateDetector.report);
+               URL (chuẩn) lặp lại theo quyết định của lần xuất hiện đầu tiên
+    """
+    detector = NearDuplicateDetector(threshold)
+    keep = {}  # {url chuẩn: giữ lại hay không}
+    kept = []
+    for doc in documents:
+        url = canonical_url(doc['url'])
+        if url not in keep:
+            keep[url] = detector.add(url, doc) is None
+        if keep[url]:
+            kept.append(doc)
+    return kept, detector.report()
@@ -0,0 +1,141 @@
+"""
+MODULE 2: CHỈ MỤC N-GRAM KÝ TỰ CHO TÌM KIẾM GẦN ĐÚNG
+Mục tiêu: Tìm các term gần đúng với một term gõ sai ("phơ" -> "phở", "banh xoe" -> "bánh xèo")
+mà không phải so khoảng cách sửa với toàn bộ từ điển
+
+Mỗi term (thêm NGRAM_PAD ở hai đầu) được tách thành các trigram ký tự; chỉ mục lưu
+trigram -> id các term chứa trigram đó (tăng dần). Tìm các term cách query không quá k phép sửa:
+    1. Lọc đếm: mỗi phép sửa làm mất tối đa NGRAM_SIZE trigram, nên term hợp lệ phải
+       chung ít nhất |G| - 3k trigram với query (G = tập trigram của query)
+    2. Lọc tiền tố: term như vậy phải nằm trong ít nhất một trong 3k + 1 danh sách ngắn nhất,
+       nên chỉ sinh ứng viên từ các danh sách đó; các danh sách dài chỉ được tìm kiếm nhị phân
+    3. Lọc độ dài rồi kiểm tra bằng khoảng cách Levenshtein có chặn k (dừng sớm)
+"""
+
+import bisect
+from array import array
+
+
+NGRAM_SIZE = 3
+NGRAM_PAD = '$' * (NGRAM_SIZE - 1)  # normalize đã bỏ ký tự đặc biệt nên '$' không có trong term
+
+# Khoảng cách sửa tối đa và số ứng viên tối đa được kiểm tra bằng khoảng cách sửa
+DEFAULT_MAX_DISTANCE = 1
+DEFAULT_MAX_CANDIDATES = 200
+
+_EMPTY = array('I')
+
+
+def term_ngrams(term):
+    """
+    Tập trigram ký tự của term: "phở" -> {"$$p", "$ph", "phở", "hở$", "ở$$"}
+    """
+    padded = NGRAM_PAD + term + NGRAM_PAD
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    Khoảng cách Levenshtein giữa a và b nếu không quá max_distance, ngược lại max_distance + 1.
+    Chỉ tính dải 2 * max_distance + 1 đường chéo và dừng khi cả hàng đã vượt ngưỡng
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if a == b:
+        return 0
+    limit = max_distance + 1
+    previous = [min(j, limit) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [limit] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        lo = max(1, i - max_distance)
+        hi = min(len(b), i + max_distance)
+        char = a[i - 1]
+        for j in range(lo, hi + 1):
+            cost = previous[j - 1] + (char != b[j - 1])
+            current[j] = min(cost, previous[j] + 1, current[j - 1] + 1, limit)
+        if min(current[lo - 1:hi + 1]) > max_distance:
+            return limit
+        previous = current
+    return previous[len(b)]
+
+
+def find_similar(term, ngram_postings, term_at, max_distance=DEFAULT_MAX_DISTANCE,
+                 max_candidates=DEFAULT_MAX_CANDIDATES):
+    """
+    Tìm các term trong từ điển cách term không quá max_distance phép sửa
+    Args:
+        term: term cần tìm (đã xử lý)
+        ngram_postings: hàm trigram -> dãy id term chứa trigram (tăng dần)
+        term_at: hàm id -> term
+        max_distance: khoảng cách sửa tối đa
+        max_candidates: số ứng viên tối đa được kiểm tra bằng khoảng cách sửa
+                        (ứng viên chung nhiều trigram nhất được kiểm tra trước)
+    Returns:
+        list: các cặp (khoảng cách, term) tăng dần
+    """
+    grams = term_ngrams(term)
+    lists = sorted((ngram_postings(gram) for gram in grams), key=len)
+    threshold = len(grams) - NGRAM_SIZE * max_distance
+    if threshold <= 0:
+        # Term quá ngắn so với k: lọc đếm không loại được gì, chỉ xét term chung ít nhất một trigram
+        generators, others, threshold = lists, [], 1
+    else:
+        split = len(lists) - threshold + 1
+        generators, others = lists[:split], lists[split:]
+
+    counts = {}
+    for ids in generators:
+        for i in ids:
+            counts[i] = counts.get(i, 0) + 1
+
+    results = []
+    checked = 0
+    for i, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        if checked >= max_candidates:
+            break
+        for k, ids in enumerate(others):
+            if count >= threshold or count + len(others) - k < threshold:
+                break
+            j = bisect.bisect_left(ids, i)
+            if j < len(ids) and ids[j] == i:
+                count += 1
+        if count < threshold:
+            continue
+        candidate = term_at(i)
+        if abs(len(candidate) - len(term)) > max_distance:
+            continue
+        checked += 1
+        distance = bounded_edit_distance(term, candidate, max_distance)
+        if distance <= max_distance:
+            results.append((distance, candidate))
+    results.sort()
+    return results
+
+
+class TrigramIndex:
+    """
+    Chỉ mục trigram trong bộ nhớ trên một danh sách term đã sắp xếp
+    (index nhị phân lưu sẵn bảng tương tự trong terms.bin, xem index_storage.py)
+    """
+    def __init__(self, terms):
+        """
+        Args:
+            terms: danh sách term, id của term là vị trí trong danh sách
+        """
+        self.terms = terms
+        self.postings = {}  # {trigram: array('I') id term}
+        for i, term in enumerate(terms):
+            for gram in term_ngrams(term):
+                ids = self.postings.get(gram)
+                if ids is None:
+                    ids = array('I')
+                    self.postings[gram] = ids
+                ids.append(i)
+
+    def get(self, gram):
+        return self.postings.get(gram, _EMPTY)
+
+    def find_similar(self, term, max_distance=DEFAULT_MAX_DISTANCE, max_candidates=DEFAULT_MAX_CANDIDATES):
+        return find_similar(term, self.get, self.terms.__getitem__, max_distance, max_candidates)
@@ -0,0 +1,680 @@
+"""
+MODULE 2: CẤU TRÚC POSTING LIST DẠNG MẢNG
+Mục tiêu: Lưu posting list gọn nhẹ bằng các mảng kiểu cố định (array) thay vì dict
+
+Có hai dạng:
+    - PostingList: các mảng thô, dùng khi build và với index nhị phân codec 'raw'
+    - CompressedPostingList: nén delta + variable-byte theo khối BLOCK_SIZE posting,
+      giải nén từng khối khi duyệt (index nhị phân codec 'varint')
+
+Cả hai chia posting thành các khối BLOCK_SIZE posting; mỗi khối có skip entry
+(doc_ordinal cuối khối, max_tf, min_doc_length của khối) để PostingCursor nhảy qua
+nguyên khối (advance) và tính cận trên điểm BM25 của khối (block-max) mà không giải nén
+"""
+
+import re
+import bisect
+from array import array
+from itertools import accumulate, repeat
+from operator import add, mul
+
+from term_stats import bm25_bound
+
+
+# Số posting trong một khối nén
+BLOCK_SIZE = 128
+
+# Byte có bit tiếp nối (varint nhiều byte)
+_CONTINUATION = re.compile(b'[\x80-\xff]')
+
+# doc_ordinal của con trỏ đã duyệt hết posting list (lớn hơn mọi ordinal 'I')
+NO_MORE_DOCS = 1 << 32
+
+
+class PostingList:
+    """
+    Posting list của một term, lưu dưới dạng các mảng song song:
+    - doc_ordinals: số thứ tự (ordinal) của tài liệu trong index
+    - frequencies: tần suất đã nhân trọng số trường
+    - pos_offsets: vị trí bắt đầu trong buffer positions dùng chung của index
+    - pos_counts: số lượng positions của posting
+    - field_freqs: tần suất theo từng trường, trải phẳng (posting i, trường f) -> i * field_count + f
+    """
+    __slots__ = ('positions', 'field_count', 'doc_ordinals', 'frequencies',
+                 'pos_offsets', 'pos_counts', 'field_freqs', '_skip_entries')
+
+    def __init__(self, positions, field_count, doc_ordinals=None, frequencies=None,
+                 pos_offsets=None, pos_counts=None, field_freqs=None):
+        """
+        Args:
+            positions: buffer positions dùng chung (array('I')) của InvertedIndex
+            field_count: số trường được index (title, description, ...)
+            doc_ordinals, frequencies, pos_offsets, pos_counts, field_freqs: các mảng có sẵn (nếu có)
+        """
+        self.positions = positions
+        self.field_count = field_count
+        self.doc_ordinals = doc_ordinals if doc_ordinals is not None else array('I')
+        self.frequencies = frequencies if frequencies is not None else array('f')
+        self.pos_offsets = pos_offsets if pos_offsets is not None else array('I')
+        self.pos_counts = pos_counts if pos_counts is not None else array('I')
+        self.field_freqs = field_freqs if field_freqs is not None else array('I')
+        self._skip_entries = None  # tính khi tạo PostingCursor đầu tiên, xóa khi thêm posting
+
+    def append(self, doc_ordinal, frequency, field_freqs, positions):
+        """
+        Thêm một posting vào cuối danh sách
+        Args:
+            doc_ordinal: ordinal của tài liệu
+            frequency: tần suất (tổng có trọng số của các trường)
+            field_freqs: tần suất của term trong từng trường
+            positions: danh sách vị trí của term trong tài liệu
+        """
+        self.doc_ordinals.append(doc_ordinal)
+        self.frequencies.append(frequency)
+        self.field_freqs.extend(field_freqs)
+        self.pos_offsets.append(len(self.positions))
+        self.pos_counts.append(len(positions))
+        self.positions.extend(positions)
+        self._skip_entries = None
+
+    def get_positions(self, i):
+        """
+        Lấy danh sách vị trí của posting thứ i
+        """
+        start = self.pos_offsets[i]
+        return self.positions[start:start + self.pos_counts[i]]
+
+    def get_field_freqs(self, i):
+        """
+        Lấy tần suất theo từng trường của posting thứ i
+        """
+        start = i * self.field_count
+        return self.field_freqs[start:start + self.field_count]
+
+    def positions_of(self, doc_ordinal):
+        """
+        Danh sách vị trí của term trong tài liệu doc_ordinal (rỗng nếu tài liệu không chứa term)
+        """
+        i = bisect.bisect_left(self.doc_ordinals, doc_ordinal)
+        if i < len(self.doc_ordinals) and self.doc_ordinals[i] == doc_ordinal:
+            return self.get_positions(i)
+        return []
+
+    def __len__(self):
+        return len(self.doc_ordinals)
+
+    def __iter__(self):
+        """
+        Duyệt các cặp (doc_ordinal, frequency)
+        """
+        return zip(self.doc_ordinals, self.frequencies)
+
+    def iter_blocks(self):
+        """
+        Duyệt theo khối (doc_ordinals, frequencies, field_freqs);
+        dạng thô không cần giải nén nên cả danh sách là một khối
+        """
+        yield self.doc_ordinals, self.frequencies, self.field_freqs
+
+    def iter_doc_ordinals(self):
+        """
+        Duyệt doc_ordinal theo khối (không cần tần suất, ví dụ để dựng tập kết quả)
+        """
+        yield self.doc_ordinals
+
+    def decode_block(self, b):
+        """
+        Khối thứ b (BLOCK_SIZE posting): (doc_ordinals, frequencies, field_freqs)
+        """
+        start = b * BLOCK_SIZE
+        end = start + BLOCK_SIZE
+        return (self.doc_ordinals[start:end], self.frequencies[start:end],
+                self.field_freqs[start * self.field_count:end * self.field_count])
+
+    def skip_entries(self, doc_lengths):
+        """
+        Skip entry của từng khối BLOCK_SIZE posting, tính từ các mảng một lần rồi giữ lại cho các
+        PostingCursor sau (append xóa bản đã tính; ai sửa trực tiếp các mảng phải gọi clear_skip_entries)
+        Returns:
+            tuple: (doc_ordinal cuối mỗi khối, max_tf mỗi khối, min_doc_length mỗi khối)
+        """
+        if self._skip_entries is None:
+            last_docs, max_tfs, min_doc_lengths = [], [], []
+            for start in range(0, len(self.doc_ordinals), BLOCK_SIZE):
+                ordinals = self.doc_ordinals[start:start + BLOCK_SIZE]
+                last_docs.append(ordinals[-1])
+                max_tfs.append(max(self.frequencies[start:start + BLOCK_SIZE]))
+                min_doc_lengths.append(min(doc_lengths[ordinal] for ordinal in ordinals))
+            self._skip_entries = (last_docs, max_tfs, min_doc_lengths)
+        return self._skip_entries
+
+    def clear_skip_entries(self):
+        """
+        Bỏ skip entry đã tính (sau khi nối thêm posting trực tiếp vào các mảng)
+        """
+        self._skip_entries = None
+
+    def to_dict(self):
+        """
+        Chuyển sang dict các list để lưu JSON
+        """
+        return {
+            'doc_ordinals': self.doc_ordinals.tolist(),
+            'frequencies': self.frequencies.tolist(),
+            'pos_offsets': self.pos_offsets.tolist(),
+            'pos_counts': self.pos_counts.tolist(),
+            'field_freqs': self.field_freqs.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, positions, field_count, data):
+        """
+        Tạo PostingList từ dict đã lưu trong JSON
+        """
+        return cls(
+            positions,
+            field_count,
+            array('I', data['doc_ordinals']),
+            array('f', data['frequencies']),
+            array('I', data['pos_offsets']),
+            array('I', data['pos_counts']),
+            array('I', data['field_freqs'])
+        )
+
+
+def encode_varint(value, out):
+    """
+    Ghi số nguyên không âm dạng variable-byte (7 bit mỗi byte, bit cao = còn byte tiếp theo)
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    """
+    Đọc một số varint từ data tại pos
+    Returns:
+        tuple: (giá trị, vị trí sau số vừa đọc)
+    """
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def decode_varints(data, pos, count):
+    """
+    Đọc count số varint từ data (bytes) bắt đầu tại pos
+    Returns:
+        tuple: (list giá trị, vị trí sau số cuối cùng)
+    """
+    # Đường nhanh: toàn số nhỏ hơn 128 thì mỗi số đúng một byte
+    chunk = data[pos:pos + count]
+    if len(chunk) == count and not _CONTINUATION.search(chunk):
+        return list(chunk), pos + count
+
+    values = []
+    append = values.append
+    value = shift = 0
+    remaining = count
+    while remaining:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            append(value)
+            value = shift = 0
+            remaining -= 1
+    return values, pos
+
+
+def encode_posting_list(posting_list, block_size=BLOCK_SIZE, doc_lengths=None):
+    """
+    Nén một posting list thành bytes
+    Cấu trúc:
+        thư mục khối (skip entries): mỗi khối (delta doc_ordinal cuối khối, số byte của khối
+                      [, min_doc_length của khối]) rồi [max_tf float32 của từng khối]
+        từng khối:    delta doc_ordinals | field_freqs | pos_counts | delta positions (trong từng tài liệu)
+    Tần suất có trọng số không được lưu mà tính lại từ field_freqs và trọng số trường
+    Args:
+        doc_lengths: độ dài tài liệu theo ordinal; có thì ghi kèm block-max (min_doc_length, max_tf)
+    """
+    field_count = posting_list.field_count
+    df = len(posting_list)
+    directory = bytearray()
+    block_max_tfs = array('f')
+    blocks = bytearray()
+    last_doc = 0
+    for start in range(0, df, block_size):
+        end = min(start + block_size, df)
+        block = bytearray()
+        previous = last_doc
+        for i in range(start, end):
+            ordinal = posting_list.doc_ordinals[i]
+            encode_varint(ordinal - previous, block)
+            previous = ordinal
+        for value in posting_list.field_freqs[start * field_count:end * field_count]:
+            encode_varint(value, block)
+        for i in range(start, end):
+            encode_varint(posting_list.pos_counts[i], block)
+        for i in range(start, end):
+            previous_position = 0
+            for position in posting_list.get_positions(i):
+                encode_varint(position - previous_position, block)
+                previous_position = position
+
+        encode_varint(previous - last_doc, directory)
+        encode_varint(len(block), directory)
+        if doc_lengths is not None:
+            encode_varint(min(doc_lengths[o] for o in posting_list.doc_ordinals[start:end]), directory)
+            block_max_tfs.append(max(posting_list.frequencies[start:end]))
+        blocks += block
+        last_doc = previous
+    return bytes(directory + block_max_tfs.tobytes() + blocks)
+
+
+class CompressedPostingList:
+    """
+    Posting list nén (delta + variable-byte) đọc từ index nhị phân.
+    Duyệt bằng iter_blocks() chỉ giải nén từng khối một; các thuộc tính dạng mảng
+    (doc_ordinals, frequencies, ...) giải nén toàn bộ một lần khi cần
+    """
+    __slots__ = ('data', 'df', 'field_count', 'field_weights', 'block_size',
+                 'block_last_docs', 'block_offsets', 'block_max_tfs', 'block_min_doc_lengths',
+                 '_decoded', '_position_blocks')
+
+    def __init__(self, data, df, field_count, field_weights, block_size=BLOCK_SIZE, block_max=False):
+        """
+        Args:
+            data: bytes/memoryview chứa posting list đã nén (encode_posting_list)
+            df: số posting
+            field_count: số trường
+            field_weights: trọng số trường, dùng để tính lại tần suất có trọng số
+            block_size: số posting mỗi khối
+            block_max: thư mục khối có kèm block-max (index từ phiên bản 8)
+        """
+        self.data = data
+        self.df = df
+        self.field_count = field_count
+        self.field_weights = field_weights
+        self.block_size = block_size
+        self._decoded = None
+        self._position_blocks = {}  # {khối: (doc_ordinals, offset positions, positions)} đã giải nén
+
+        # Thư mục khối: doc_ordinal cuối mỗi khối, vị trí byte bắt đầu của khối và block-max
+        block_count = (df + block_size - 1) // block_size
+        fields = 3 if block_max else 2
+        header = bytes(data[:(10 * fields + 4) * block_count])
+        values, pos = decode_varints(header, 0, fields * block_count)
+        self.block_last_docs = list(accumulate(values[0::fields]))
+        self.block_max_tfs = self.block_min_doc_lengths = None
+        if block_max:
+            self.block_min_doc_lengths = values[2::3]
+            self.block_max_tfs = array('f', header[pos:pos + 4 * block_count])
+            pos += 4 * block_count
+        self.block_offsets = list(accumulate(values[1::fields], initial=pos))
+
+    def _block_length(self, b):
+        return min(self.block_size, self.df - b * self.block_size)
+
+    def _weighted(self, field_freqs, n):
+        # Cùng thứ tự cộng với lúc build để kết quả float32 giống hệt
+        totals = [0] * n
+        for field, weight in enumerate(self.field_weights):
+            totals = list(map(add, totals, map(mul, repeat(weight, n), field_freqs[field::self.field_count])))
+        return array('f', totals)
+
+    def decode_block(self, b, with_positions=False):
+        """
+        Giải nén khối thứ b
+        Returns:
+            tuple: (doc_ordinals, frequencies, field_freqs[, pos_counts, positions])
+        """
+        n = self._block_length(b)
+        data = bytes(self.data[self.block_offsets[b]:self.block_offsets[b + 1]])
+        gaps, pos = decode_varints(data, 0, n)
+        gaps[0] += self.block_last_docs[b - 1] if b > 0 else 0
+        doc_ordinals = list(accumulate(gaps))
+        field_freqs, pos = decode_varints(data, pos, n * self.field_count)
+        frequencies = self._weighted(field_freqs, n)
+        if not with_positions:
+            return doc_ordinals, frequencies, field_freqs
+
+        pos_counts, pos = decode_varints(data, pos, n)
+        position_gaps, pos = decode_varints(data, pos, sum(pos_counts))
+        positions = []
+        start = 0
+        for count in pos_counts:
+            positions.extend(accumulate(position_gaps[start:start + count]))
+            start += count
+        return doc_ordinals, frequencies, field_freqs, pos_counts, positions
+
+    def iter_blocks(self):
+        """
+        Duyệt theo khối (doc_ordinals, frequencies, field_freqs), giải nén lần lượt từng khối
+        """
+        for b in range(len(self.block_last_docs)):
+            yield self.decode_block(b)
+
+    def iter_doc_ordinals(self):
+        """
+        Duyệt doc_ordinal theo khối, chỉ giải nén phần khoảng cách doc_ordinal đầu mỗi khối
+        """
+        for b in range(len(self.block_last_docs)):
+            gaps, _ = decode_varints(bytes(self.data[self.block_offsets[b]:self.block_offsets[b + 1]]),
+                                     0, self._block_length(b))
+            gaps[0] += self.block_last_docs[b - 1] if b > 0 else 0
+            yield list(accumulate(gaps))
+
+    def skip_entries(self, doc_lengths):
+        """
+        Skip entry của từng khối đọc từ thư mục khối (không giải nén);
+        index cũ chưa có block-max thì giải nén các khối để tính một lần
+        Returns:
+            tuple: (doc_ordinal cuối mỗi khối, max_tf mỗi khối, min_doc_length mỗi khối)
+        """
+        if self.block_max_tfs is None:
+            self.block_max_tfs = array('f')
+            self.block_min_doc_lengths = []
+            for doc_ordinals, frequencies, _ in self.iter_blocks():
+                self.block_max_tfs.append(max(frequencies))
+                self.block_min_doc_lengths.append(min(doc_lengths[o] for o in doc_ordinals))
+        return self.block_last_docs, self.block_max_tfs, self.block_min_doc_lengths
+
+    def decode(self):
+        """
+        Giải nén toàn bộ thành PostingList (được giữ lại cho các lần truy cập sau)
+        """
+        if self._decoded is None:
+            posting_list = PostingList(array('I'), self.field_count)
+            for b in range(len(self.block_last_docs)):
+                doc_ordinals, frequencies, field_freqs, pos_counts, positions = self.decode_block(b, True)
+                posting_list.doc_ordinals.extend(doc_ordinals)
+                posting_list.frequencies.extend(frequencies)
+                posting_list.field_freqs.extend(field_freqs)
+                posting_list.pos_offsets.extend(
+                    accumulate(pos_counts[:-1], initial=len(posting_list.positions)))
+                posting_list.pos_counts.extend(pos_counts)
+                posting_list.positions.extend(positions)
+            self._decoded = posting_list
+        return self._decoded
+
+    @property
+    def positions(self):
+        return self.decode().positions
+
+    @property
+    def doc_ordinals(self):
+        return self.decode().doc_ordinals
+
+    @property
+    def frequencies(self):
+        return self.decode().frequencies
+
+    @property
+    def pos_offsets(self):
+        return self.decode().pos_offsets
+
+    @property
+    def pos_counts(self):
+        return self.decode().pos_counts
+
+    @property
+    def field_freqs(self):
+        return self.decode().field_freqs
+
+    def get_positions(self, i):
+        return self.decode().get_positions(i)
+
+    def get_field_freqs(self, i):
+        return self.decode().get_field_freqs(i)
+
+    def positions_of(self, doc_ordinal):
+        """
+        Danh sách vị trí của term trong tài liệu doc_ordinal; chỉ giải nén khối chứa tài liệu
+        """
+        b = bisect.bisect_left(self.block_last_docs, doc_ordinal)
+        if b >= len(self.block_last_docs):
+            return []
+        block = self._position_blocks.get(b)
+        if block is None:
+            doc_ordinals, _, _, pos_counts, positions = self.decode_block(b, True)
+            block = (doc_ordinals, list(accumulate(pos_counts, initial=0)), positions)
+            self._position_blocks[b] = block
+        doc_ordinals, starts, positions = block
+        i = bisect.bisect_left(doc_ordinals, doc_ordinal)
+        if i < len(doc_ordinals) and doc_ordinals[i] == doc_ordinal:
+            return positions[starts[i]:starts[i + 1]]
+        return []
+
+    def __len__(self):
+        return self.df
+
+    def __iter__(self):
+        """
+        Duyệt các cặp (doc_ordinal, frequency), giải nén từng khối
+        """
+        for doc_ordinals, frequencies, _ in self.iter_blocks():
+            yield from zip(doc_ordinals, frequencies)
+
+    def to_dict(self):
+        return self.decode().to_dict()
+
+
+def intersect_positions(starts, positions, offset):
+    """
+    Giữ các vị trí bắt đầu p trong starts mà p + offset có trong positions
+    (trộn hai danh sách tăng dần, dừng khi một danh sách hết)
+    """
+    result = []
+    i = j = 0
+    while i < len(starts) and j < len(positions):
+        target = starts[i] + offset
+        position = positions[j]
+        if position == target:
+            result.append(starts[i])
+            i += 1
+            j += 1
+        elif position < target:
+            j += 1
+        else:
+            i += 1
+    return result
+
+
+def min_position_distance(first, second):
+    """
+    Khoảng cách nhỏ nhất |p - q| giữa hai danh sách vị trí tăng dần (None nếu một danh sách rỗng);
+    dừng sớm khi gặp hai vị trí liền kề
+    """
+    best = None
+    i = j = 0
+    while i < len(first) and j < len(second):
+        distance = abs(first[i] - second[j])
+        if best is None or distance < best:
+            best = distance
+            if best <= 1:
+                break
+        if first[i] < second[j]:
+            i += 1
+        else:
+            j += 1
+    return best
+
+
+class PostingCursor:
+    """
+    Con trỏ duyệt một posting list theo thứ tự doc_ordinal tăng dần, dùng cho truy vấn
+    giao (AND) và truy vấn cắt tỉa (MaxScore/WAND):
+        - advance(target): nhảy tới posting đầu tiên có doc_ordinal >= target, bỏ qua
+          nguyên các khối có doc_ordinal cuối < target (chỉ giải nén khối đích)
+        - block_max_score(), max_score_at(target): cận trên điểm BM25 của một khối,
+          tính từ skip entry nên không cần giải nén
+    """
+    __slots__ = ('posting_list', 'idf', 'avg_doc_length', 'block_last_docs', 'block_max_tfs',
+                 'block_min_doc_lengths', 'block', 'doc_ordinals', 'frequencies', 'field_freqs',
+                 'i', 'doc')
+
+    def __init__(self, posting_list, doc_lengths, idf, avg_doc_length):
+        """
+        Args:
+            posting_list: PostingList hoặc CompressedPostingList
+            doc_lengths: độ dài tài liệu theo ordinal (của index chứa posting list)
+            idf, avg_doc_length: dùng để tính cận trên điểm BM25 của từng khối
+        """
+        self.posting_list = posting_list
+        self.idf = idf
+        self.avg_doc_length = avg_doc_length
+        if len(posting_list) > 0:
+            self.block_last_docs, self.block_max_tfs, self.block_min_doc_lengths = \
+                posting_list.skip_entries(doc_lengths)
+        else:
+            self.block_last_docs, self.block_max_tfs, self.block_min_doc_lengths = [], [], []
+        self._load_block(0)
+
+    def _load_block(self, b):
+        self.i = 0
+        # Khối có thể rỗng sau khi bỏ tài liệu đã xóa (posting list của index phân đoạn)
+        while b < len(self.block_last_docs):
+            self.doc_ordinals, self.frequencies, self.field_freqs = self.posting_list.decode_block(b)
+            if len(self.doc_ordinals) > 0:
+                self.block = b
+                self.doc = self.doc_ordinals[0]
+                return
+            b += 1
+        self.block = b
+        self.doc_ordinals = self.frequencies = self.field_freqs = ()
+        self.doc = NO_MORE_DOCS
+
+    @property
+    def frequency(self):
+        """
+        Tần suất có trọng số của posting hiện tại
+        """
+        return self.frequencies[self.i]
+
+    def get_field_freqs(self):
+        """
+        Tần suất theo từng trường của posting hiện tại
+        """
+        field_count = self.posting_list.field_count
+        return self.field_freqs[self.i * field_count:(self.i + 1) * field_count]
+
+    def next(self):
+        """
+        Sang posting tiếp theo, trả về doc_ordinal (NO_MORE_DOCS nếu hết)
+        """
+        self.i += 1
+        if self.i < len(self.doc_ordinals):
+            self.doc = self.doc_ordinals[self.i]
+        else:
+            self._load_block(self.block + 1)
+        return self.doc
+
+    def advance(self, target):
+        """
+        Nhảy tới posting đầu tiên có doc_ordinal >= target, trả về doc_ordinal đó
+        (NO_MORE_DOCS nếu hết); không bao giờ lùi lại
+        """
+        if target <= self.doc:
+            return self.doc
+        if target > self.block_last_docs[self.block]:
+            # Bỏ qua nguyên các khối kết thúc trước target theo skip entries
+            self._load_block(bisect.bisect_left(self.block_last_docs, target, self.block + 1))
+            if target <= self.doc:
+                return self.doc
+        self.i = bisect.bisect_left(self.doc_ordinals, target, self.i)
+        if self.i == len(self.doc_ordinals):
+            # Các posting cuối khối đã bị xóa: khối sau bắt đầu sau block_last_docs >= target
+            self._load_block(self.block + 1)
+            return self.doc
+        self.doc = self.doc_ordinals[self.i]
+        return self.doc
+
+    def positions_of(self, doc_ordinal):
+        """
+        Danh sách vị trí của term trong tài liệu doc_ordinal (xem posting list)
+        """
+        return self.posting_list.positions_of(doc_ordinal)
+
+    def block_score_bound(self, b):
+        """
+        Cận trên điểm BM25 của mọi posting trong khối b
+        """
+        return bm25_bound(self.idf, self.block_max_tfs[b], self.block_min_doc_lengths[b], self.avg_doc_length)
+
+    def block_max_score(self):
+        """
+        Cận trên điểm BM25 của khối hiện tại (0 nếu đã hết)
+        """
+        if self.doc == NO_MORE_DOCS:
+            return 0.0
+        return self.block_score_bound(self.block)
+
+    def block_end(self):
+        """
+        doc_ordinal cuối cùng của khối hiện tại
+        """
+        if self.doc == NO_MORE_DOCS:
+            return NO_MORE_DOCS
+        return self.block_last_docs[self.block]
+
+    def max_score_at(self, target):
+        """
+        Cận trên điểm BM25 của khối chứa target (tính từ khối hiện tại, không giải nén, không di chuyển con trỏ)
+        """
+        b = bisect.bisect_left(self.block_last_docs, target, max(self.block, 0))
+        if b >= len(self.block_last_docs):
+            return 0.0
+        return self.block_score_bound(b)
+
+    def max_score(self):
+        """
+        Cận trên điểm BM25 của cả posting list (lớn nhất trong các khối)
+        """
+        return max((self.block_score_bound(b) for b in range(len(self.block_last_docs))), default=0.0)
+
+
+class UnionCursor:
+    """
+    Con trỏ trên hợp nhiều posting list (các term thay thế nhau ở một vị trí của cụm từ,
+    ví dụ "pho" hoặc "phở"): doc là doc_ordinal nhỏ nhất của các con trỏ con
+    """
+    __slots__ = ('cursors', 'doc')
+
+    def __init__(self, cursors):
+        self.cursors = cursors
+        self.doc = min((cursor.doc for cursor in cursors), default=NO_MORE_DOCS)
+
+    def advance(self, target):
+        """
+        Nhảy tới tài liệu đầu tiên có doc_ordinal >= target trong hợp các posting list
+        """
+        if target <= self.doc:
+            return self.doc
+        self.doc = min(cursor.advance(target) for cursor in self.cursors)
+        return self.doc
+
+    def next(self):
+        if self.doc == NO_MORE_DOCS:
+            return self.doc
+        return self.advance(self.doc + 1)
+
+    def positions_of(self, doc_ordinal):
+        """
+        Vị trí (tăng dần) của mọi term thay thế trong tài liệu doc_ordinal hiện tại
+        """
+        positions = []
+        for cursor in self.cursors:
+            if cursor.doc == doc_ordinal:
+                positions.extend(cursor.positions_of(doc_ordinal))
+        positions.sort()
+        return positions
@@ -0,0 +1,880 @@
+"""
+MODULE 2: CẬP NHẬT INDEX TĂNG DẦN THEO PHÂN ĐOẠN (SEGMENTS)
+Mục tiêu: Thêm / sửa / xóa từng công thức mà không phải build lại toàn bộ index
+
+Mỗi lần commit ghi các tài liệu mới thành một phân đoạn (segment) bất biến ở định dạng
+nhị phân. Tài liệu bị sửa hoặc xóa được đánh dấu "tombstone" trong phân đoạn cũ.
+Các phân đoạn nhỏ được gộp (merge) định kỳ, có thể chạy nền. Khi truy vấn, posting
+list của các phân đoạn được nối lại và bỏ tài liệu đã xóa, nên IDF và độ dài trung bình
+luôn tính trên toàn bộ tài liệu còn sống.
+
+Cấu trúc thư mục:
+    segments.json   - manifest: danh sách phân đoạn và tombstone của từng phân đoạn
+    seg_000001/     - phân đoạn (định dạng của index_storage)
+    seg_000002/ ...
+"""
+
+import os
+import sys
+import json
+import shutil
+import heapq
+import bisect
+import threading
+from array import array
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from postings import PostingList, PostingCursor, BLOCK_SIZE
+from text_processor import InvertedIndex, TextProcessor, FIELDS, FIELD_WEIGHTS, extract_fields
+from attributes import ATTRIBUTES, MISSING, AttributeColumn, parse_attributes
+from term_stats import make_term_stats
+from tokenizer_backends import matches_info
+from ngram_index import DEFAULT_MAX_DISTANCE, DEFAULT_MAX_CANDIDATES
+from bitmap import Bitmap
+from doc_ids import canonical_url
+
+
+MANIFEST_NAME = 'segments.json'
+MANIFEST_FORMAT = 'recipe-segments'
+MANIFEST_VERSION = 1
+
+
+def _read_manifest(index_dir):
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {'format': MANIFEST_FORMAT, 'version': MANIFEST_VERSION,
+                'generation': 0, 'next_segment': 1, 'segments': []}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != MANIFEST_FORMAT or manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Manifest phân đoạn không hợp lệ: {manifest_path}")
+    return manifest
+
+
+def _write_manifest(index_dir, manifest):
+    """
+    Ghi manifest nguyên tử: ghi file tạm rồi os.replace
+    """
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def _open_segment(index_dir, name):
+    segment = InvertedIndex()
+    segment._load_binary(os.path.join(index_dir, name))
+    return segment
+
+
+def _live_copy(segment, deleted, text_processor):
+    """
+    Chép các tài liệu còn sống của một phân đoạn sang InvertedIndex mới trong bộ nhớ
+    (không cần tách từ lại)
+    """
+    field_count = len(segment.fields)
+    copy = InvertedIndex(text_processor)
+    remap = {}
+    for ordinal in range(len(segment.doc_ids)):
+        if ordinal in deleted:
+            continue
+        new_ordinal = copy.get_ordinal(segment.get_doc_id(ordinal))
+        remap[ordinal] = new_ordinal
+        copy.doc_lengths[new_ordinal] = segment.doc_lengths[ordinal]
+        for f in range(field_count):
+            copy.field_lengths[new_ordinal * field_count + f] = segment.field_lengths[ordinal * field_count + f]
+        for name, column in segment.attribute_columns.items():
+            copy.attribute_columns[name][new_ordinal] = column[ordinal]
+
+    for term, posting_list in segment.index.items():
+        live_list = None
+        for i, ordinal in enumerate(posting_list.doc_ordinals):
+            if ordinal in deleted:
+                continue
+            if live_list is None:
+                live_list = PostingList(copy.positions, field_count)
+            live_list.append(remap[ordinal], posting_list.frequencies[i],
+                             posting_list.get_field_freqs(i), posting_list.get_positions(i))
+        if live_list is not None:
+            copy.index[term] = live_list
+
+    for key, ordinals in segment.iter_ingredient_postings():
+        live_ordinals = array('I', (remap[o] for o in ordinals if o not in deleted))
+        if live_ordinals:
+            copy.ingredient_postings[key] = live_ordinals
+    return copy, remap
+
+
+def _block_count(posting_list):
+    """
+    Số khối của posting list (CompressedPostingList có thư mục khối, PostingList chia theo BLOCK_SIZE)
+    """
+    block_last_docs = getattr(posting_list, 'block_last_docs', None)
+    if block_last_docs is not None:
+        return len(block_last_docs)
+    return (len(posting_list) + BLOCK_SIZE - 1) // BLOCK_SIZE
+
+
+def _live_block(base, deleted, doc_ordinals, frequencies, field_freqs, field_count):
+    """
+    Một khối posting của phân đoạn đổi sang ordinal toàn cục, bỏ tài liệu đã xóa
+    """
+    if not deleted:
+        if base == 0:
+            return doc_ordinals, frequencies, field_freqs
+        return [base + ordinal for ordinal in doc_ordinals], frequencies, field_freqs
+    keep = [j for j, ordinal in enumerate(doc_ordinals) if ordinal not in deleted]
+    if len(keep) == len(doc_ordinals):
+        return [base + ordinal for ordinal in doc_ordinals], frequencies, field_freqs
+    live_field_freqs = []
+    for j in keep:
+        live_field_freqs.extend(field_freqs[j * field_count:(j + 1) * field_count])
+    return ([base + doc_ordinals[j] for j in keep], array('f', (frequencies[j] for j in keep)),
+            live_field_freqs)
+
+
+class SegmentPostingList:
+    """
+    Posting list toàn cục của một term trên nhiều phân đoạn, không chép posting:
+    các khối của từng phân đoạn được nối lại (ordinal + base, bỏ tài liệu đã xóa) và chỉ
+    giải nén khi duyệt. Skip entry lấy từ các phân đoạn nên PostingCursor vẫn nhảy khối và
+    dùng block-max được (max_tf / min_doc_length của khối vẫn là cận hợp lệ khi có tombstone)
+    """
+    def __init__(self, parts, field_count):
+        """
+        Args:
+            parts: list các (base, phân đoạn, posting list của phân đoạn, set ordinal đã xóa)
+            field_count: số trường
+        """
+        self.parts = parts
+        self.field_count = field_count
+        self.part_bases = [base for base, _, _, _ in parts]
+        # Khối toàn cục thứ b -> (phần, khối trong phần)
+        self.blocks = [(p, b) for p, (_, _, posting_list, _) in enumerate(parts)
+                       for b in range(_block_count(posting_list))]
+        self._skip_entries = None
+        self._decoded = None
+        self._length = None
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(len(ordinals) for ordinals in self.iter_doc_ordinals())
+        return self._length
+
+    def __iter__(self):
+        for doc_ordinals, frequencies, _ in self.iter_blocks():
+            yield from zip(doc_ordinals, frequencies)
+
+    def iter_blocks(self):
+        """
+        Duyệt theo khối (doc_ordinals, frequencies, field_freqs) của lần lượt các phân đoạn
+        """
+        for base, _, posting_list, deleted in self.parts:
+            for block in posting_list.iter_blocks():
+                yield _live_block(base, deleted, *block, self.field_count)
+
+    def iter_doc_ordinals(self):
+        """
+        Duyệt doc_ordinal toàn cục theo khối
+        """
+        for base, _, posting_list, deleted in self.parts:
+            for ordinals in posting_list.iter_doc_ordinals():
+                yield [base + ordinal for ordinal in ordinals if ordinal not in deleted]
+
+    def decode_block(self, b):
+        """
+        Khối toàn cục thứ b (có thể rỗng nếu mọi tài liệu của khối đã bị xóa)
+        """
+        p, local_block = self.blocks[b]
+        base, _, posting_list, deleted = self.parts[p]
+        return _live_block(base, deleted, *posting_list.decode_block(local_block), self.field_count)
+
+    def skip_entries(self, doc_lengths):
+        """
+        Skip entry nối từ skip entry của các phân đoạn (tính bằng độ dài tài liệu của phân đoạn)
+        """
+        if self._skip_entries is None:
+            last_docs, max_tfs, min_doc_lengths = [], [], []
+            for base, segment, posting_list, _ in self.parts:
+                part_last_docs, part_max_tfs, part_min_doc_lengths = posting_list.skip_entries(segment.doc_lengths)
+                last_docs.extend(base + ordinal for ordinal in part_last_docs)
+                max_tfs.extend(part_max_tfs)
+                min_doc_lengths.extend(part_min_doc_lengths)
+            self._skip_entries = (last_docs, max_tfs, min_doc_lengths)
+        return self._skip_entries
+
+    def positions_of(self, doc_ordinal):
+        """
+        Danh sách vị trí của term trong tài liệu doc_ordinal; chỉ giải nén khối chứa tài liệu
+        """
+        p = bisect.bisect_right(self.part_bases, doc_ordinal) - 1
+        if p < 0:
+            return []
+        base, _, posting_list, deleted = self.parts[p]
+        if doc_ordinal - base in deleted:
+            return []
+        return posting_list.positions_of(doc_ordinal - base)
+
+    def decode(self):
+        """
+        Chép toàn bộ thành một PostingList (chỉ khi cần truy cập dạng mảng)
+        """
+        if self._decoded is None:
+            merged = PostingList(array('I'), self.field_count)
+            for base, _, posting_list, deleted in self.parts:
+                for i, ordinal in enumerate(posting_list.doc_ordinals):
+                    if ordinal in deleted:
+                        continue
+                    merged.append(base + ordinal, posting_list.frequencies[i],
+                                  posting_list.get_field_freqs(i), posting_list.get_positions(i))
+            self._decoded = merged
+        return self._decoded
+
+    @property
+    def positions(self):
+        return self.decode().positions
+
+    @property
+    def doc_ordinals(self):
+        return self.decode().doc_ordinals
+
+    @property
+    def frequencies(self):
+        return self.decode().frequencies
+
+    @property
+    def pos_offsets(self):
+        return self.decode().pos_offsets
+
+    @property
+    def pos_counts(self):
+        return self.decode().pos_counts
+
+    @property
+    def field_freqs(self):
+        return self.decode().field_freqs
+
+    def get_positions(self, i):
+        return self.decode().get_positions(i)
+
+    def get_field_freqs(self, i):
+        return self.decode().get_field_freqs(i)
+
+    def to_dict(self):
+        return self.decode().to_dict()
+
+
+class SegmentSnapshot:
+    """
+    Ảnh chụp chỉ đọc của tập phân đoạn tại một thời điểm, có cùng giao diện đọc
+    với InvertedIndex (get_posting_list, get_idf, doc_lengths, ...) nên SearchEngine
+    dùng được trực tiếp. Ordinal toàn cục = base của phân đoạn + ordinal trong phân đoạn
+    """
+    def __init__(self, segments, deleted, text_processor=None):
+        """
+        Args:
+            segments: list các InvertedIndex (phân đoạn) theo thứ tự
+            deleted: list các set ordinal đã xóa, tương ứng từng phân đoạn
+            text_processor: TextProcessor xử lý term khi tra cứu
+        """
+        self.segments = list(segments)
+        self.deleted = [frozenset(d) for d in deleted]
+        if text_processor is None:
+            # Tách từ query giống lúc build các phân đoạn
+            text_processor = segments[0].text_processor if segments else TextProcessor()
+        self.text_processor = text_processor
+        self.tokenizer_info = segments[0].tokenizer_info if segments else text_processor.tokenizer.describe()
+        self.fields = list(segments[0].fields) if segments else list(FIELDS)
+        self.field_weights = list(segments[0].field_weights) if segments else list(FIELD_WEIGHTS)
+        self.read_only = True
+
+        # Bảng tài liệu nối liền các phân đoạn
+        field_count = len(self.fields)
+        self.bases = []
+        self.doc_lengths = array('I')
+        self.field_lengths = array('I')
+        self.attribute_columns = {name: array('I') for name in ATTRIBUTES}
+        for segment in self.segments:
+            self.bases.append(len(self.doc_lengths))
+            self.doc_lengths.frombytes(memoryview(segment.doc_lengths).tobytes())
+            self.field_lengths.frombytes(memoryview(segment.field_lengths).tobytes())
+            for name, column in self.attribute_columns.items():
+                # Phân đoạn cũ chưa có cột thuộc tính: coi như không có giá trị
+                segment_column = segment.attribute_columns.get(name)
+                if segment_column is not None:
+                    column.frombytes(memoryview(segment_column).tobytes())
+                else:
+                    column.extend([MISSING] * len(segment.doc_lengths))
+
+        # Thống kê toàn cục chỉ tính trên tài liệu còn sống
+        live_count = len(self.doc_lengths)
+        total_length = sum(self.doc_lengths)
+        field_totals = [sum(self.field_lengths[f::field_count]) for f in range(field_count)]
+        for base, deleted_set in zip(self.bases, self.deleted):
+            for ordinal in deleted_set:
+                live_count -= 1
+                total_length -= self.doc_lengths[base + ordinal]
+                for f in range(field_count):
+                    field_totals[f] -= self.field_lengths[(base + ordinal) * field_count + f]
+        self.doc_count = live_count
+        self.avg_doc_length = total_length / live_count if live_count > 0 else 0
+        self.avg_field_lengths = [t / live_count if live_count > 0 else 0.0 for t in field_totals]
+        self.term_stats = {}  # {term: TermStats} gộp từ các phân đoạn, tính khi truy cập lần đầu
+        self.ingredient_bitmaps = {}  # {key nguyên liệu: Bitmap} toàn cục, tính khi truy cập lần đầu
+        self.attribute_index = {}  # {thuộc tính: AttributeColumn} trên tài liệu còn sống, dựng khi cần
+
+    def get_doc_id(self, ordinal):
+        """
+        Lấy doc_id (URL) từ ordinal toàn cục
+        """
+        s = bisect.bisect_right(self.bases, ordinal) - 1
+        return self.segments[s].get_doc_id(ordinal - self.bases[s])
+
+    def find_ordinal(self, url):
+        """
+        Ordinal toàn cục của tài liệu còn sống theo URL, None nếu không có
+        """
+        # Bản cập nhật nằm ở phân đoạn sau: tìm từ phân đoạn mới nhất
+        for s in range(len(self.segments) - 1, -1, -1):
+            ordinal = self.segments[s].find_ordinal(url)
+            if ordinal is not None and ordinal not in self.deleted[s]:
+                return self.bases[s] + ordinal
+        return None
+
+    def get_term_postings(self, term):
+        """
+        Posting list của một term (đã xử lý) trên toàn bộ phân đoạn, bỏ tài liệu đã xóa
+        """
+        found = []
+        for base, segment, deleted_set in zip(self.bases, self.segments, self.deleted):
+            posting_list = segment.index.get(term)
+            if posting_list is not None:
+                found.append((base, segment, posting_list, deleted_set))
+
+        # Chỉ một phân đoạn, không có tài liệu bị xóa: dùng trực tiếp
+        if len(found) == 1 and found[0][0] == 0 and not found[0][3]:
+            return found[0][2]
+        return SegmentPostingList(found, len(self.fields))
+
+    def get_term_cursor(self, term):
+        """
+        PostingCursor trên posting list toàn cục của một term (advance, block-max)
+        """
+        return PostingCursor(self.get_term_postings(term), self.doc_lengths,
+                             self.get_term_statistics(term).idf, self.avg_doc_length)
+
+    def ingredient_names(self):
+        """
+        Các key nguyên liệu có trong ít nhất một phân đoạn, đã sắp xếp
+        """
+        return sorted(set().union(*(segment.ingredient_names() for segment in self.segments)))
+
+    def get_ingredient_bitmap(self, key):
+        """
+        Bitmap ordinal toàn cục của các tài liệu còn sống có nguyên liệu key
+        """
+        bitmap = self.ingredient_bitmaps.get(key)
+        if bitmap is None:
+            if len(self.segments) == 1 and not self.deleted[0]:
+                bitmap = self.segments[0].get_ingredient_bitmap(key)
+            else:
+                bitmap = Bitmap.from_sorted(
+                    base + ordinal
+                    for base, segment, deleted_set in zip(self.bases, self.segments, self.deleted)
+                    for ordinal in segment.get_ingredient_bitmap(key) if ordinal not in deleted_set)
+            self.ingredient_bitmaps[key] = bitmap
+        return bitmap
+
+    def get_attribute_bitmap(self, name, low=None, high=None):
+        """
+        Bitmap ordinal toàn cục của các tài liệu còn sống có low <= thuộc tính name <= high
+        """
+        attribute = self.attribute_index.get(name)
+        if attribute is None:
+            deleted = {base + ordinal for base, deleted_set in zip(self.bases, self.deleted)
+                       for ordinal in deleted_set}
+            attribute = AttributeColumn(self.attribute_columns[name], deleted)
+            self.attribute_index[name] = attribute
+        return attribute.range(low, high)
+
+    def terms_in_range(self, start, end=None):
+        """
+        Duyệt các term trong khoảng [start, end) trên mọi phân đoạn (trộn theo thứ tự, không trùng)
+        """
+        previous = None
+        for term in heapq.merge(*(segment.terms_in_range(start, end) for segment in self.segments)):
+            if term != previous:
+                yield term
+                previous = term
+
+    def terms_with_prefix(self, prefix):
+        """
+        Duyệt các term bắt đầu bằng prefix trên mọi phân đoạn
+        """
+        previous = None
+        for term in heapq.merge(*(segment.terms_with_prefix(prefix) for segment in self.segments)):
+            if term != previous:
+                yield term
+                previous = term
+
+    def get_folded_terms(self, folded):
+        """
+        Các term có dấu có dạng bỏ dấu là folded trên mọi phân đoạn (sắp xếp, không trùng)
+        """
+        terms = set()
+        for segment in self.segments:
+            terms.update(segment.get_folded_terms(folded))
+        return sorted(terms)
+
+    def terms_with_folded_prefix(self, prefix):
+        """
+        Các term có dấu có dạng bỏ dấu bắt đầu bằng prefix trên mọi phân đoạn (mỗi term một lần)
+        """
+        seen = set()
+        for segment in self.segments:
+            for term in segment.terms_with_folded_prefix(prefix):
+                if term not in seen:
+                    seen.add(term)
+                    yield term
+
+    def get_similar_terms(self, term, max_distance=DEFAULT_MAX_DISTANCE, max_candidates=DEFAULT_MAX_CANDIDATES):
+        """
+        Các cặp (khoảng cách sửa, term) gần đúng với term trên mọi phân đoạn (mỗi term một lần)
+        """
+        distances = {}
+        for segment in self.segments:
+            for distance, similar in segment.get_similar_terms(term, max_distance, max_candidates):
+                distances[similar] = min(distance, distances.get(similar, distance))
+        return sorted((distance, similar) for similar, distance in distances.items())
+
+    def get_posting_list(self, term):
+        """
+        Lấy posting list (PostingList) của một term
+        """
+        processed_term = self.text_processor.process(term)
+        if processed_term:
+            return self.get_term_postings(processed_term[0])
+        return PostingList(array('I'), len(self.fields))
+
+    def get_term_statistics(self, term):
+        """
+        Thống kê của một term đã xử lý trên toàn bộ tài liệu còn sống, gộp từ bảng
+        thống kê của từng phân đoạn (max_tf/min_doc_length vẫn là cận hợp lệ khi có tombstone)
+        """
+        stats = self.term_stats.get(term)
+        if stats is not None:
+            return stats
+        df = 0
+        max_tf = 0.0
+        min_doc_length = 0
+        for segment, deleted_set in zip(self.segments, self.deleted):
+            segment_stats = segment.get_term_statistics(term)
+            if segment_stats.df == 0:
+                continue
+            df += segment_stats.df
+            if deleted_set:
+                # Trừ các tài liệu đã xóa có chứa term: con trỏ chỉ giải nén khối chứa chúng
+                cursor = PostingCursor(segment.get_term_postings(term), segment.doc_lengths, 0.0, 0.0)
+                df -= sum(1 for ordinal in sorted(deleted_set) if cursor.advance(ordinal) == ordinal)
+            max_tf = max(max_tf, segment_stats.max_tf)
+            min_doc_length = (segment_stats.min_doc_length if min_doc_length == 0
+                              else min(min_doc_length, segment_stats.min_doc_length))
+        stats = make_term_stats(df, max_tf, min_doc_length, self.doc_count, self.avg_doc_length)
+        self.term_stats[term] = stats
+        return stats
+
+    def get_document_frequency(self, term):
+        """
+        Lấy số tài liệu còn sống chứa term
+        """
+        processed_term = self.text_processor.process(term)
+        if processed_term:
+            return self.get_term_statistics(processed_term[0]).df
+        return 0
+
+    def get_idf(self, term):
+        """
+        Tính IDF trên toàn bộ tài liệu còn sống: IDF = log(N / df)
+        """
+        processed_term = self.text_processor.process(term)
+        if processed_term:
+            return self.get_term_statistics(processed_term[0]).idf
+        return 0
+
+
+class SegmentedIndex:
+    """
+    Quản lý index phân đoạn: thêm / sửa / xóa tài liệu, commit, merge (có thể chạy nền)
+
+    Thay đổi chỉ hiển thị cho truy vấn sau khi commit(). Các thuộc tính đọc
+    (get_posting_list, doc_count, ...) được chuyển tới snapshot hiện tại; để một truy vấn
+    nhất quán khi merge nền đang chạy, dùng snapshot() làm index cho SearchEngine.
+    """
+    def __init__(self, index_dir, text_processor=None, max_segments=8,
+                 merge_factor=4, max_deleted_ratio=0.3):
+        """
+        Args:
+            index_dir: thư mục chứa manifest và các phân đoạn
+            text_processor: TextProcessor dùng để tách từ tài liệu mới
+            max_segments: số phân đoạn tối đa trước khi gộp
+            merge_factor: số phân đoạn nhỏ nhất được gộp mỗi lần
+            max_deleted_ratio: phân đoạn có tỷ lệ tài liệu đã xóa vượt ngưỡng sẽ được viết lại
+        """
+        self.index_dir = index_dir
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+        self.max_deleted_ratio = max_deleted_ratio
+
+        self.lock = threading.RLock()
+        self.merge_lock = threading.Lock()
+        self.merging = set()  # phân đoạn đang được gộp: commit() không được bỏ
+        self.merge_thread = None
+        self.merge_stop = threading.Event()
+
+        os.makedirs(index_dir, exist_ok=True)
+        manifest = _read_manifest(index_dir)
+        self.generation = manifest['generation']
+        self.next_segment = manifest['next_segment']
+        self.segment_names = [entry['name'] for entry in manifest['segments']]
+        self.readers = {name: _open_segment(index_dir, name) for name in self.segment_names}
+        self.deleted = {entry['name']: set(entry['deleted']) for entry in manifest['segments']}
+
+        # Mọi phân đoạn phải dùng cùng một backend tách từ
+        if self.segment_names:
+            first = self.readers[self.segment_names[0]]
+            if text_processor is None:
+                text_processor = first.text_processor
+            elif not matches_info(text_processor.tokenizer, first.tokenizer_info):
+                raise ValueError(f"Index {index_dir} dùng tokenizer {first.tokenizer_info['name']}, "
+                                 f"không thể thêm tài liệu bằng {text_processor.tokenizer.name}")
+        self.text_processor = text_processor if text_processor is not None else TextProcessor()
+
+        # {url: (tên phân đoạn, ordinal)} của các tài liệu còn sống
+        self.live = {}
+        for name in self.segment_names:
+            reader = self.readers[name]
+            for ordinal, doc_id in enumerate(reader.doc_ids):
+                if ordinal not in self.deleted[name]:
+                    self.live[doc_id] = (name, ordinal)
+
+        self.buffer = InvertedIndex(self.text_processor)
+        self.current = self._make_snapshot()
+
+    def __getattr__(self, name):
+        # Giao diện đọc (get_posting_list, doc_lengths, doc_count, ...) lấy từ snapshot hiện tại
+        if name == 'current':
+            raise AttributeError(name)
+        return getattr(self.current, name)
+
+    def _make_snapshot(self):
+        return SegmentSnapshot(
+            [self.readers[name] for name in self.segment_names],
+            [self.deleted[name] for name in self.segment_names],
+            self.text_processor
+        )
+
+    def snapshot(self):
+        """
+        Snapshot chỉ đọc của trạng thái đã commit gần nhất
+        """
+        return self.current
+
+    def add_document(self, doc):
+        """
+        Thêm hoặc cập nhật một công thức (theo URL chuẩn, xem doc_ids)
+        """
+        with self.lock:
+            doc_id = canonical_url(doc['url'])
+            if doc_id in self.buffer.doc_ordinals:
+                # Tài liệu đã nằm trong buffer chưa commit: commit trước rồi đánh dấu xóa
+                self.commit()
+            self._tombstone(doc['url'])
+            self.buffer.add_document(doc_id, extract_fields(doc), doc.get('ingredients', []), parse_attributes(doc))
+
+    def update_document(self, doc):
+        """
+        Cập nhật một công thức = xóa bản cũ + thêm bản mới
+        """
+        self.add_document(doc)
+
+    def add_documents(self, documents, workers=1):
+        """
+        Thêm / cập nhật nhiều công thức, có thể tách từ song song
+        """
+        with self.lock:
+            if len(self.buffer.doc_ids) > 0:
+                self.commit()
+            for doc in documents:
+                self._tombstone(doc['url'])
+            self.buffer.build_from_documents(documents, workers=workers)
+
+    def delete_document(self, url):
+        """
+        Xóa một công thức theo URL
+        Returns:
+            bool: True nếu tài liệu tồn tại
+        """
+        with self.lock:
+            if canonical_url(url) in self.buffer.doc_ordinals:
+                self.commit()
+            return self._tombstone(url)
+
+    def _tombstone(self, url):
+        location = self.live.pop(canonical_url(url), None)
+        if location is None:
+            # Phân đoạn build trước khi chuẩn hóa URL lưu URL gốc
+            location = self.live.pop(url, None)
+        if location is None:
+            return False
+        name, ordinal = location
+        self.deleted[name].add(ordinal)
+        return True
+
+    def _manifest(self):
+        return {
+            'format': MANIFEST_FORMAT,
+            'version': MANIFEST_VERSION,
+            'generation': self.generation,
+            'next_segment': self.next_segment,
+            'segments': [{'name': name, 'deleted': sorted(self.deleted[name])}
+                         for name in self.segment_names]
+        }
+
+    def _new_segment_name(self):
+        name = f'seg_{self.next_segment:06d}'
+        self.next_segment += 1
+        return name
+
+    def commit(self):
+        """
+        Ghi buffer thành phân đoạn mới, lưu tombstone và cập nhật snapshot
+        """
+        with self.lock:
+            if len(self.buffer.doc_ids) > 0:
+                self.buffer.compute_statistics()
+                name = self._new_segment_name()
+                self.buffer.save(os.path.join(self.index_dir, name))
+                reader = _open_segment(self.index_dir, name)
+                self.readers[name] = reader
+                self.deleted[name] = set()
+                self.segment_names.append(name)
+                for ordinal, doc_id in enumerate(reader.doc_ids):
+                    self.live[doc_id] = (name, ordinal)
+                self.buffer = InvertedIndex(self.text_processor)
+
+            # Phân đoạn không còn tài liệu sống thì bỏ luôn (trừ phân đoạn đang gộp:
+            # merge() sẽ thay nó bằng phân đoạn mới)
+            removed = [name for name in self.segment_names
+                       if name not in self.merging
+                       and len(self.deleted[name]) == len(self.readers[name].doc_ids)]
+            self.segment_names = [name for name in self.segment_names if name not in removed]
+
+            self.generation += 1
+            _write_manifest(self.index_dir, self._manifest())
+            self.current = self._make_snapshot()
+            self._drop_segments(removed)
+
+    def _drop_segments(self, names):
+        for name in names:
+            self.readers.pop(name, None)
+            self.deleted.pop(name, None)
+            # Trên Linux có thể xóa thư mục đang được mmap; lỗi (Windows) thì bỏ qua
+            shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+
+    def _select_merge(self):
+        """
+        Chính sách merge: viết lại phân đoạn có nhiều tài liệu đã xóa; khi số phân đoạn
+        vượt max_segments thì gộp merge_factor phân đoạn nhỏ nhất
+        """
+        with self.lock:
+            for name in self.segment_names:
+                total = len(self.readers[name].doc_ids)
+                if total > 0 and len(self.deleted[name]) / total > self.max_deleted_ratio:
+                    return [name]
+            if len(self.segment_names) > self.max_segments:
+                by_size = sorted(self.segment_names,
+                                 key=lambda n: len(self.readers[n].doc_ids) - len(self.deleted[n]))
+                chosen = set(by_size[:self.merge_factor])
+                return [name for name in self.segment_names if name in chosen]
+        return []
+
+    def merge(self, names):
+        """
+        Gộp các phân đoạn thành một phân đoạn mới (không tách từ lại)
+        """
+        if not names:
+            return
+        with self.merge_lock:
+            with self.lock:
+                if any(name not in self.readers for name in names):
+                    return
+                readers = {name: self.readers[name] for name in names}
+                deleted_at_start = {name: set(self.deleted[name]) for name in names}
+                new_name = self._new_segment_name()
+                self.merging.update(names)
+
+            try:
+                # Phần tốn thời gian chạy ngoài lock: thêm / xóa vẫn hoạt động bình thường
+                merged = InvertedIndex(self.text_processor)
+                remaps = {}
+                for name in names:
+                    copy, remap = _live_copy(readers[name], deleted_at_start[name], self.text_processor)
+                    offset = len(merged.doc_ids)
+                    merged.merge_partial(copy)
+                    remaps[name] = {old: new + offset for old, new in remap.items()}
+                merged.compute_statistics()
+                merged.save(os.path.join(self.index_dir, new_name))
+                reader = _open_segment(self.index_dir, new_name)
+            except BaseException:
+                # Không để lại phân đoạn dở dang trên đĩa
+                with self.lock:
+                    self.merging.difference_update(names)
+                shutil.rmtree(os.path.join(self.index_dir, new_name), ignore_errors=True)
+                raise
+
+            with self.lock:
+                self.merging.difference_update(names)
+                # Tài liệu bị xóa trong lúc merge: chuyển tombstone sang phân đoạn mới
+                new_deleted = set()
+                for name in names:
+                    for ordinal in self.deleted[name] - deleted_at_start[name]:
+                        new_deleted.add(remaps[name][ordinal])
+                for name in names:
+                    for old, new in remaps[name].items():
+                        if old not in self.deleted[name]:
+                            self.live[reader.get_doc_id(new)] = (new_name, new)
+
+                position = self.segment_names.index(names[0])
+                self.segment_names = [name for name in self.segment_names if name not in names]
+                self.segment_names.insert(position, new_name)
+                self.readers[new_name] = reader
+                self.deleted[new_name] = new_deleted
+                removed = list(names)
+                if len(new_deleted) == len(reader.doc_ids):
+                    # Mọi tài liệu đã bị xóa trong lúc merge: bỏ luôn phân đoạn mới
+                    self.segment_names.remove(new_name)
+                    removed.append(new_name)
+
+                self.generation += 1
+                _write_manifest(self.index_dir, self._manifest())
+                self.current = self._make_snapshot()
+                self._drop_segments(removed)
+
+        print(f"🔀 Đã gộp {len(names)} phân đoạn -> {new_name} ({len(reader.doc_ids)} tài liệu)")
+
+    def maybe_merge(self):
+        """
+        Chạy merge nếu chính sách yêu cầu
+        Returns:
+            bool: True nếu đã merge
+        """
+        names = self._select_merge()
+        if not names:
+            return False
+        self.merge(names)
+        return True
+
+    def force_merge(self):
+        """
+        Gộp toàn bộ phân đoạn thành một
+        """
+        with self.lock:
+            names = list(self.segment_names)
+        if len(names) > 1 or any(self.deleted[name] for name in names):
+            self.merge(names)
+
+    def start_background_merge(self, interval=30.0):
+        """
+        Chạy thread nền kiểm tra và merge định kỳ
+        """
+        if self.merge_thread is not None:
+            return
+        self.merge_stop.clear()
+
+        def run():
+            while not self.merge_stop.wait(interval):
+                try:
+                    while self.maybe_merge():
+                        pass
+                except Exception as e:
+                    # Lỗi một lần merge không được dừng thread nền: thử lại ở lượt sau
+                    print(f"❌ Lỗi khi gộp phân đoạn: {e}")
+
+        self.merge_thread = threading.Thread(target=run, name='segment-merge', daemon=True)
+        self.merge_thread.start()
+
+    def stop_background_merge(self):
+        if self.merge_thread is None:
+            return
+        self.merge_stop.set()
+        self.merge_thread.join()
+        self.merge_thread = None
+
+
+def open_snapshot(index_dir):
+    """
+    Mở index phân đoạn ở chế độ chỉ đọc (dùng cho web / đánh giá)
+    """
+    manifest = _read_manifest(index_dir)
+    segments = [_open_segment(index_dir, entry['name']) for entry in manifest['segments']]
+    deleted = [set(entry['deleted']) for entry in manifest['segments']]
+    snapshot = SegmentSnapshot(segments, deleted)
+    print(f"📂 Đã mở index phân đoạn từ: {index_dir}")
+    print(f"   - Số phân đoạn: {len(segments)}")
+    print(f"   - Số tài liệu: {snapshot.doc_count}")
+    return snapshot
+
+
+def main():
+    """
+    Cập nhật index phân đoạn từ dòng lệnh
+    """
+    import argparse
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.dirname(script_dir)
+
+    parser = argparse.ArgumentParser(description='Cập nhật index phân đoạn')
+    parser.add_argument('--index-dir', default=os.path.join(base_dir, 'index', 'segments'))
+    parser.add_argument('--workers', type=int, default=1)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    update_parser = subparsers.add_parser('update', help='thêm / cập nhật công thức từ file JSON')
+    update_parser.add_argument('data_file')
+    delete_parser = subparsers.add_parser('delete', help='xóa công thức theo URL')
+    delete_parser.add_argument('urls', nargs='+')
+    merge_parser = subparsers.add_parser('merge', help='gộp phân đoạn theo chính sách')
+    merge_parser.add_argument('--force', action='store_true', help='gộp tất cả thành một phân đoạn')
+    subparsers.add_parser('info', help='thông tin các phân đoạn')
+
+    args = parser.parse_args()
+    segmented = SegmentedIndex(args.index_dir)
+
+    if args.command == 'update':
+        with open(args.data_file, 'r', encoding='utf-8') as f:
+            documents = json.load(f)
+        segmented.add_documents(documents, workers=args.workers)
+        segmented.commit()
+        while segmented.maybe_merge():
+            pass
+        print(f"✅ Đã cập nhật {len(documents)} công thức")
+    elif args.command == 'delete':
+        deleted = sum(1 for url in args.urls if segmented.delete_document(url))
+        segmented.commit()
+        print(f"✅ Đã xóa {deleted} công thức")
+    elif args.command == 'merge':
+        if args.force:
+            segmented.force_merge()
+        else:
+            while segmented.maybe_merge():
+                pass
+
+    print(f"\n📊 {len(segmented.segment_names)} phân đoạn, {segmented.doc_count} tài liệu còn sống")
+    for name in segmented.segment_names:
+        total = len(segmented.readers[name].doc_ids)
+        print(f"   - {name}: {total} tài liệu, {len(segmented.deleted[name])} đã xóa")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+MODULE 2: CHIA INDEX THÀNH NHIỀU SHARD
+Mục tiêu: Chia tập công thức thành N index con (shard) độc lập để tìm song song
+trên nhiều process (xem module3_ranking/sharded_search.py)
+
+Mỗi công thức thuộc đúng một shard theo hash ổn định của URL (blake2b), nên build lại
+hay thêm công thức luôn cho cùng cách chia. Mỗi shard là một index nhị phân bình thường
+(định dạng của index_storage); thống kê BM25 toàn cục (N, avgdl, df) được gộp từ các
+shard lúc truy vấn nên điểm giống hệt index không chia.
+
+Cấu trúc thư mục:
+    shards.json     - manifest: số shard, tên và số tài liệu của từng shard
+    shard_000/      - shard (định dạng của index_storage)
+    shard_001/ ...
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from text_processor import InvertedIndex, TextProcessor
+from near_duplicates import collapse_near_duplicates
+from doc_ids import canonical_url
+
+
+MANIFEST_NAME = 'shards.json'
+MANIFEST_FORMAT = 'recipe-shards'
+MANIFEST_VERSION = 1
+
+
+def shard_of(url, shard_count):
+    """
+    Shard chứa công thức: hash 8 byte của URL chuẩn modulo số shard
+    """
+    url_hash = hashlib.blake2b(canonical_url(url).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(url_hash, 'little') % shard_count
+
+
+def partition_documents(documents, shard_count):
+    """
+    Chia tài liệu theo shard, giữ thứ tự ban đầu trong từng shard
+    """
+    partitions = [[] for _ in range(shard_count)]
+    for doc in documents:
+        partitions[shard_of(doc['url'], shard_count)].append(doc)
+    return partitions
+
+
+def read_manifest(index_dir):
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != MANIFEST_FORMAT or manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Manifest shard không hợp lệ: {manifest_path}")
+    return manifest
+
+
+def shard_paths(index_dir):
+    """
+    Đường dẫn các shard theo thứ tự trong manifest
+    """
+    return [os.path.join(index_dir, entry['name']) for entry in read_manifest(index_dir)['shards']]
+
+
+def open_shard(shard_dir):
+    """
+    Mở một shard (mmap, không in thông tin)
+    """
+    shard = InvertedIndex()
+    shard._load_binary(shard_dir)
+    return shard
+
+
+def build_shards(documents, index_dir, shard_count, text_processor=None, workers=1, dedup=False):
+    """
+    Build index chia shard: mỗi shard là một index nhị phân trong index_dir
+    Args:
+        documents: list các dict công thức
+        index_dir: thư mục đầu ra (chứa shards.json)
+        shard_count: số shard
+        text_processor: TextProcessor dùng chung cho mọi shard (cùng backend tách từ)
+        workers: số process tách từ song song khi build từng shard
+        dedup: gộp công thức gần trùng trên toàn bộ dữ liệu trước khi chia shard (xem near_duplicates)
+    Returns:
+        list: số tài liệu của từng shard
+    """
+    if shard_count < 1:
+        raise ValueError("Số shard phải >= 1")
+    if text_processor is None:
+        text_processor = TextProcessor()
+    os.makedirs(index_dir, exist_ok=True)
+
+    if dedup:
+        documents, report = collapse_near_duplicates(documents)
+        removed = sum(len(cluster['duplicates']) for cluster in report)
+        print(f"🧬 Gần trùng: bỏ {removed} công thức trong {len(report)} cụm")
+
+    entries = []
+    for s, shard_docs in enumerate(partition_documents(documents, shard_count)):
+        name = f'shard_{s:03d}'
+        print(f"\n🧩 Shard {s + 1}/{shard_count}: {len(shard_docs)} tài liệu")
+        shard = InvertedIndex(text_processor)
+        shard.build_from_documents(shard_docs, workers=workers)
+        shard.save(os.path.join(index_dir, name))
+        entries.append({'name': name, 'doc_count': shard.doc_count})
+
+    # Ghi manifest sau cùng (nguyên tử) để không mở được tập shard build dở
+    manifest = {'format': MANIFEST_FORMAT, 'version': MANIFEST_VERSION,
+                'shard_count': shard_count, 'shards': entries}
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return [entry['doc_count'] for entry in entries]
+
+
+def main():
+    """
+    Build index chia shard từ dòng lệnh
+    """
+    import argparse
+    from token_cache import TokenCache
+    from tokenizer_backends import create_tokenizer, TOKENIZER_NAMES
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.dirname(script_dir)
+
+    parser = argparse.ArgumentParser(description='Build index chia shard (tìm kiếm song song)')
+    parser.add_argument('data_file', nargs='?', default=os.path.join(base_dir, 'data', 'recipes.json'))
+    parser.add_argument('--out', default=os.path.join(base_dir, 'index', 'shards'))
+    parser.add_argument('--shards', type=int, default=4, help='số shard (mặc định: 4)')
+    parser.add_argument('--workers', type=int, default=1, help='số process tách từ song song')
+    parser.add_argument('--token-cache', default=None, help='file SQLite cache kết quả tách từ')
+    parser.add_argument('--tokenizer', choices=TOKENIZER_NAMES, default=None,
+                        help='backend tách từ (mặc định: biến môi trường RECIPE_TOKENIZER hoặc underthesea)')
+    parser.add_argument('--lexicon', default=None, help='file từ điển từ ghép cho backend longest-match')
+    parser.add_argument('--dedup', action='store_true', help='gộp công thức gần trùng (MinHash / LSH)')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("MODULE 2: BUILD INDEX CHIA SHARD")
+    print("=" * 60)
+    print(f"\n📂 Đang đọc dữ liệu từ: {args.data_file}")
+    with open(args.data_file, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+
+    cache = TokenCache(args.token_cache) if args.token_cache else None
+    text_processor = TextProcessor(cache=cache, tokenizer=create_tokenizer(args.tokenizer, args.lexicon))
+    doc_counts = build_shards(documents, args.out, args.shards, text_processor, args.workers, args.dedup)
+    if cache is not None:
+        cache.close()
+
+    print(f"\n✅ Đã build {len(doc_counts)} shard -> {args.out}")
+    for s, count in enumerate(doc_counts):
+        print(f"   - shard_{s:03d}: {count} tài liệu")
+
+
+if __name__ == "__main__":
+    main()
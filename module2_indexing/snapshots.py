@@ -0,0 +1,235 @@
+"""
+MODULE 2: PHIÊN BẢN INDEX (SNAPSHOTS) VÀ CON TRỎ "CURRENT"
+Mục tiêu: Build lại index mà không làm gián đoạn web app đang chạy
+
+Mỗi lần build tạo một thư mục phiên bản mới, bất biến sau khi công bố; file CURRENT
+chứa tên phiên bản đang dùng và chỉ được đổi nguyên tử (ghi file tạm rồi os.replace),
+nên người đọc luôn thấy hoặc phiên bản cũ hoặc phiên bản mới đã build xong.
+Web app theo dõi CURRENT (hoặc nhận lệnh reload) và thay index nóng (xem module4_web/app.py).
+
+Cấu trúc thư mục (index/):
+    CURRENT             - tên phiên bản đang dùng, ví dụ "v000003"
+    snapshots/
+        v000001/        - một thư mục index đầy đủ: inverted_index/, segments/ hoặc shards/
+        v000002/            (kèm recipes.json nếu công bố cùng dữ liệu)
+        ...
+"""
+
+import os
+import sys
+import json
+import shutil
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+CURRENT_NAME = 'CURRENT'
+SNAPSHOTS_DIR = 'snapshots'
+SNAPSHOT_PREFIX = 'v'
+
+# Các loại index có thể nằm trong một phiên bản (tên thư mục con, file nhận diện)
+INDEX_KINDS = (
+    ('shards', 'shards.json'),
+    ('segments', 'segments.json'),
+    ('inverted_index', 'meta.json'),
+)
+
+
+def list_snapshots(index_root):
+    """
+    Tên các phiên bản đã công bố, tăng dần
+    """
+    snapshots_dir = os.path.join(index_root, SNAPSHOTS_DIR)
+    if not os.path.isdir(snapshots_dir):
+        return []
+    return sorted(name for name in os.listdir(snapshots_dir)
+                  if name.startswith(SNAPSHOT_PREFIX) and name[len(SNAPSHOT_PREFIX):].isdigit())
+
+
+def current_snapshot(index_root):
+    """
+    Tên phiên bản đang dùng (nội dung file CURRENT), None nếu chưa có
+    """
+    current_path = os.path.join(index_root, CURRENT_NAME)
+    if not os.path.exists(current_path):
+        return None
+    with open(current_path, 'r', encoding='utf-8') as f:
+        name = f.read().strip()
+    return name or None
+
+
+def snapshot_path(index_root, name):
+    return os.path.join(index_root, SNAPSHOTS_DIR, name)
+
+
+def set_current(index_root, name):
+    """
+    Đổi con trỏ CURRENT sang phiên bản name (nguyên tử: ghi file tạm rồi os.replace)
+    """
+    if not os.path.isdir(snapshot_path(index_root, name)):
+        raise ValueError(f"Không có phiên bản index: {name}")
+    current_path = os.path.join(index_root, CURRENT_NAME)
+    tmp_path = current_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(name + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, current_path)
+
+
+def publish_snapshot(index_root, build, make_current=True):
+    """
+    Tạo một phiên bản mới: build(thư_mục_tạm) ghi index vào thư mục tạm, sau đó thư mục
+    được đổi tên thành phiên bản kế tiếp (nguyên tử) và CURRENT trỏ tới nó
+    Args:
+        index_root: thư mục index (chứa CURRENT và snapshots/)
+        build: hàm nhận đường dẫn thư mục phiên bản và ghi index vào đó
+        make_current: đổi CURRENT sang phiên bản mới sau khi build xong
+    Returns:
+        str: tên phiên bản mới
+    """
+    snapshots_dir = os.path.join(index_root, SNAPSHOTS_DIR)
+    os.makedirs(snapshots_dir, exist_ok=True)
+    existing = list_snapshots(index_root)
+    number = int(existing[-1][len(SNAPSHOT_PREFIX):]) + 1 if existing else 1
+    name = f'{SNAPSHOT_PREFIX}{number:06d}'
+
+    # Build trong thư mục tạm (tên bắt đầu bằng '.') để không ai mở phải phiên bản dở
+    tmp_dir = os.path.join(snapshots_dir, f'.{name}.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        build(tmp_dir)
+        if not index_kind(tmp_dir):
+            raise ValueError("Phiên bản mới không chứa index nào")
+        os.rename(tmp_dir, os.path.join(snapshots_dir, name))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    if make_current:
+        set_current(index_root, name)
+    return name
+
+
+def index_kind(index_dir):
+    """
+    Loại index có trong thư mục ('shards', 'segments', 'inverted_index'), None nếu không có
+    """
+    for kind, marker in INDEX_KINDS:
+        if os.path.exists(os.path.join(index_dir, kind, marker)):
+            return kind
+    if os.path.exists(os.path.join(index_dir, 'inverted_index.json')):
+        return 'inverted_index'
+    return None
+
+
+def copy_index(source, snapshot_dir):
+    """
+    Chép một index đã build (thư mục nhị phân, segments/, shards/ hoặc file JSON) vào phiên bản
+    """
+    if os.path.isfile(source):
+        shutil.copy2(source, os.path.join(snapshot_dir, 'inverted_index.json'))
+        return
+    for kind, marker in INDEX_KINDS:
+        if os.path.exists(os.path.join(source, marker)):
+            shutil.copytree(source, os.path.join(snapshot_dir, kind))
+            return
+    raise ValueError(f"Không nhận ra index trong: {source}")
+
+
+def prune_snapshots(index_root, keep=3):
+    """
+    Xóa các phiên bản cũ, giữ keep phiên bản mới nhất và luôn giữ phiên bản CURRENT.
+    Process đang mmap phiên bản bị xóa vẫn đọc được đến khi đóng (Linux / macOS)
+    Returns:
+        list: tên các phiên bản đã xóa
+    """
+    current = current_snapshot(index_root)
+    names = list_snapshots(index_root)
+    removed = []
+    for name in names[:max(0, len(names) - keep)]:
+        if name == current:
+            continue
+        shutil.rmtree(snapshot_path(index_root, name))
+        removed.append(name)
+    return removed
+
+
+def main():
+    """
+    Quản lý phiên bản index từ dòng lệnh
+    """
+    import argparse
+    from tokenizer_backends import create_tokenizer, TOKENIZER_NAMES
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.dirname(script_dir)
+
+    parser = argparse.ArgumentParser(description='Quản lý phiên bản index (snapshots)')
+    parser.add_argument('--index-root', default=os.path.join(base_dir, 'index'))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='build index từ dữ liệu thành phiên bản mới')
+    build_parser.add_argument('data_file', nargs='?', default=os.path.join(base_dir, 'data', 'recipes.json'))
+    build_parser.add_argument('--shards', type=int, default=0, help='số shard (0 = một index)')
+    build_parser.add_argument('--workers', type=int, default=1)
+    build_parser.add_argument('--tokenizer', choices=TOKENIZER_NAMES, default=None,
+                              help='backend tách từ (mặc định: biến môi trường RECIPE_TOKENIZER hoặc underthesea)')
+    build_parser.add_argument('--lexicon', default=None, help='file từ điển từ ghép cho backend longest-match')
+    build_parser.add_argument('--no-switch', action='store_true', help='không đổi CURRENT')
+    publish_parser = subparsers.add_parser('publish', help='công bố một index đã build thành phiên bản mới')
+    publish_parser.add_argument('source', help='thư mục index nhị phân, segments/, shards/ hoặc file JSON')
+    publish_parser.add_argument('--data', default=None, help='file recipes.json đi kèm phiên bản')
+    publish_parser.add_argument('--no-switch', action='store_true', help='không đổi CURRENT')
+    use_parser = subparsers.add_parser('use', help='đổi CURRENT sang phiên bản có sẵn (rollback)')
+    use_parser.add_argument('name')
+    prune_parser = subparsers.add_parser('prune', help='xóa phiên bản cũ')
+    prune_parser.add_argument('--keep', type=int, default=3)
+    subparsers.add_parser('list', help='liệt kê các phiên bản')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from text_processor import InvertedIndex, TextProcessor
+        from shards import build_shards
+
+        with open(args.data_file, 'r', encoding='utf-8') as f:
+            documents = json.load(f)
+        text_processor = TextProcessor(tokenizer=create_tokenizer(args.tokenizer, args.lexicon))
+
+        def build(snapshot_dir):
+            if args.shards > 0:
+                build_shards(documents, os.path.join(snapshot_dir, 'shards'), args.shards,
+                             text_processor, args.workers)
+            else:
+                inverted_index = InvertedIndex(text_processor)
+                inverted_index.build_from_documents(documents, workers=args.workers)
+                inverted_index.save(os.path.join(snapshot_dir, 'inverted_index'))
+            # Dữ liệu đi kèm để web app hiển thị đúng công thức của phiên bản này
+            shutil.copy2(args.data_file, os.path.join(snapshot_dir, 'recipes.json'))
+
+        name = publish_snapshot(args.index_root, build, make_current=not args.no_switch)
+        print(f"✅ Đã tạo phiên bản {name}")
+    elif args.command == 'publish':
+        def build(snapshot_dir):
+            copy_index(args.source, snapshot_dir)
+            if args.data:
+                shutil.copy2(args.data, os.path.join(snapshot_dir, 'recipes.json'))
+
+        name = publish_snapshot(args.index_root, build, make_current=not args.no_switch)
+        print(f"✅ Đã công bố phiên bản {name}")
+    elif args.command == 'use':
+        set_current(args.index_root, args.name)
+        print(f"✅ CURRENT -> {args.name}")
+    elif args.command == 'prune':
+        removed = prune_snapshots(args.index_root, args.keep)
+        print(f"🗑️  Đã xóa {len(removed)} phiên bản: {', '.join(removed) or '-'}")
+
+    current = current_snapshot(args.index_root)
+    print(f"\n📊 Các phiên bản trong {args.index_root}:")
+    for name in list_snapshots(args.index_root):
+        kind = index_kind(snapshot_path(args.index_root, name))
+        print(f"   {'*' if name == current else ' '} {name} ({kind})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+MODULE 2: XÂY DỰNG INDEX DẠNG STREAMING (SPIMI)
+Mục tiêu: Build index cho tập dữ liệu lớn hơn RAM với bộ nhớ giới hạn
+
+Single-Pass In-Memory Indexing:
+    1. Đọc lần lượt từng công thức từ file JSON (mảng) hoặc JSONL
+    2. Thêm vào index tạm trong bộ nhớ; khi vượt ngân sách bộ nhớ thì ghi ra đĩa
+       một "run" đã sắp xếp theo term
+    3. Trộn k-way các run thành index nhị phân cuối cùng (định dạng của index_storage)
+
+Kết quả giống hệt InvertedIndex.build_from_documents + save với cùng dữ liệu.
+"""
+
+import os
+import sys
+import json
+import heapq
+import shutil
+import struct
+import hashlib
+import tempfile
+from array import array
+
+try:
+    import resource  # không có trên Windows
+except ImportError:
+    resource = None
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from postings import PostingList
+from text_processor import InvertedIndex, TextProcessor, extract_fields
+from index_storage import IndexWriter
+from ingredients import ingredient_keys
+from attributes import ATTRIBUTES, parse_attributes
+from doc_ids import canonical_url
+
+
+# Ước lượng bộ nhớ (byte) cho mỗi term mới trong index tạm: dict entry, chuỗi, PostingList, 5 array
+TERM_OVERHEAD_BYTES = 600
+
+
+def iter_recipes(filepath, chunk_size=1 << 20):
+    """
+    Đọc lần lượt từng công thức từ file JSON (mảng) hoặc JSONL mà không tải cả file
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        head = f.read(chunk_size)
+        stripped = head.lstrip()
+
+        if not stripped.startswith('['):
+            # JSONL: mỗi dòng một công thức
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = stripped[1:]
+        pos = 0
+        eof = False
+        while True:
+            # Bỏ khoảng trắng và dấu phẩy giữa các phần tử
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError('cần thêm dữ liệu', buffer, pos)
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield obj
+            pos = end
+
+
+def _write_run(filepath, partial, doc_offset):
+    """
+    Ghi index tạm ra file run, các term theo thứ tự tăng dần, ordinal đã cộng doc_offset
+    Mỗi bản ghi: term_len, term, df, position_total, doc_ordinals, frequencies,
+                 pos_counts, field_freqs, positions
+    """
+    with open(filepath, 'wb') as f:
+        for term in sorted(partial.index):
+            posting_list = partial.index[term]
+            term_bytes = term.encode('utf-8')
+            positions = array('I')
+            for i in range(len(posting_list)):
+                positions.extend(posting_list.get_positions(i))
+            f.write(struct.pack('<HII', len(term_bytes), len(posting_list), len(positions)))
+            f.write(term_bytes)
+            f.write(array('I', (o + doc_offset for o in posting_list.doc_ordinals)).tobytes())
+            f.write(posting_list.frequencies.tobytes())
+            f.write(posting_list.pos_counts.tobytes())
+            f.write(posting_list.field_freqs.tobytes())
+            f.write(positions.tobytes())
+
+
+def _read_array(f, typecode, count):
+    block = array(typecode)
+    if count:
+        block.frombytes(f.read(count * block.itemsize))
+    return block
+
+
+def _iter_run(filepath, field_count):
+    """
+    Đọc tuần tự các bản ghi (term, PostingList) của một file run
+    """
+    header = struct.Struct('<HII')
+    with open(filepath, 'rb') as f:
+        while True:
+            raw = f.read(header.size)
+            if not raw:
+                return
+            term_len, df, position_total = header.unpack(raw)
+            term = f.read(term_len).decode('utf-8')
+            doc_ordinals = _read_array(f, 'I', df)
+            frequencies = _read_array(f, 'f', df)
+            pos_counts = _read_array(f, 'I', df)
+            field_freqs = _read_array(f, 'I', df * field_count)
+            positions = _read_array(f, 'I', position_total)
+            pos_offsets = array('I')
+            offset = 0
+            for count in pos_counts:
+                pos_offsets.append(offset)
+                offset += count
+            yield term, PostingList(positions, field_count, doc_ordinals, frequencies,
+                                    pos_offsets, pos_counts, field_freqs)
+
+
+def _concat_postings(parts, field_count):
+    """
+    Nối posting list của cùng một term từ các run (theo thứ tự run = thứ tự ordinal)
+    """
+    if len(parts) == 1:
+        return parts[0]
+    merged = PostingList(array('I'), field_count)
+    for part in parts:
+        base = len(merged.positions)
+        merged.doc_ordinals.extend(part.doc_ordinals)
+        merged.frequencies.extend(part.frequencies)
+        merged.pos_offsets.extend(o + base for o in part.pos_offsets)
+        merged.pos_counts.extend(part.pos_counts)
+        merged.field_freqs.extend(part.field_freqs)
+        merged.positions.extend(part.positions)
+    return merged
+
+
+def get_peak_rss_mb():
+    """
+    Peak RSS của process hiện tại (MB), None nếu không đo được
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả về KB, macOS trả về byte
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class SpimiIndexBuilder:
+    """
+    Build index nhị phân theo SPIMI với ngân sách bộ nhớ cho phần postings
+    """
+    def __init__(self, out_dir, memory_budget_mb=256, text_processor=None, run_dir=None):
+        """
+        Args:
+            out_dir: thư mục index nhị phân đầu ra
+            memory_budget_mb: ngân sách bộ nhớ (MB) cho index tạm trước khi ghi run
+            text_processor: TextProcessor (có thể kèm TokenCache)
+            run_dir: thư mục chứa file run tạm (mặc định: thư mục tạm cạnh out_dir)
+        """
+        self.out_dir = out_dir
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.text_processor = text_processor if text_processor is not None else TextProcessor()
+        self.run_dir = run_dir or tempfile.mkdtemp(
+            prefix='spimi_', dir=os.path.dirname(os.path.abspath(out_dir)))
+        os.makedirs(self.run_dir, exist_ok=True)
+
+        self.partial = InvertedIndex(self.text_processor)
+        self.partial_bytes = 0
+        self.run_files = []
+        self.seen = set()  # hash 8 byte của URL đã index
+
+        # Bảng tài liệu gọn: chuỗi URL nối liền + độ dài
+        self.doc_strings = bytearray()
+        self.doc_string_offsets = array('Q', [0])
+        self.doc_lengths = array('I')
+        self.field_lengths = array('I')
+        # Postings nguyên liệu theo ordinal toàn cục: chỉ 4 byte cho mỗi (tài liệu, key),
+        # nhỏ so với postings term nên giữ trong bộ nhớ đến khi ghi index
+        self.ingredient_postings = {}
+        self.attribute_columns = {name: array('I') for name in ATTRIBUTES}
+
+    def add(self, doc):
+        """
+        Thêm một công thức (bỏ qua URL chuẩn trùng giống build_from_documents)
+        """
+        url = canonical_url(doc['url'])
+        url_hash = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+        if url_hash in self.seen:
+            return
+        self.seen.add(url_hash)
+
+        field_tokens = self.text_processor.process_many(extract_fields(doc))
+        terms_before = len(self.partial.index)
+        positions_before = len(self.partial.positions)
+        self.partial.add_tokenized_document(url, field_tokens)
+        ordinal = len(self.doc_lengths) + len(self.partial.doc_ids) - 1
+        for key in ingredient_keys(doc.get('ingredients', [])):
+            self.ingredient_postings.setdefault(key, array('I')).append(ordinal)
+        for name, value in zip(ATTRIBUTES, parse_attributes(doc)):
+            self.attribute_columns[name].append(value)
+
+        # Ước lượng bộ nhớ tăng thêm của index tạm
+        postings = len(set(token for tokens in field_tokens for token in tokens))
+        field_count = len(self.partial.fields)
+        self.partial_bytes += (
+            postings * (16 + 4 * field_count)
+            + (len(self.partial.positions) - positions_before) * 4
+            + (len(self.partial.index) - terms_before) * TERM_OVERHEAD_BYTES
+        )
+        if self.partial_bytes >= self.memory_budget:
+            self.flush()
+
+    def flush(self):
+        """
+        Ghi index tạm thành một run đã sắp xếp và giải phóng bộ nhớ
+        """
+        if not self.partial.doc_ids:
+            return
+        doc_offset = len(self.doc_lengths)
+        for doc_id in self.partial.doc_ids:
+            self.doc_strings += doc_id.encode('utf-8')
+            self.doc_string_offsets.append(len(self.doc_strings))
+        self.doc_lengths.extend(self.partial.doc_lengths)
+        self.field_lengths.extend(self.partial.field_lengths)
+
+        run_file = os.path.join(self.run_dir, f'run_{len(self.run_files):05d}.bin')
+        _write_run(run_file, self.partial, doc_offset)
+        self.run_files.append(run_file)
+        print(f"   💾 Run {len(self.run_files)}: {len(self.partial.doc_ids)} tài liệu, "
+              f"{len(self.partial.index)} terms")
+
+        self.partial = InvertedIndex(self.text_processor)
+        self.partial_bytes = 0
+
+    def _iter_doc_ids(self):
+        for i in range(len(self.doc_lengths)):
+            start, end = self.doc_string_offsets[i], self.doc_string_offsets[i + 1]
+            yield self.doc_strings[start:end].decode('utf-8')
+
+    def finish(self):
+        """
+        Trộn k-way các run thành index nhị phân cuối cùng
+        """
+        self.flush()
+        field_count = len(self.partial.fields)
+
+        writer = IndexWriter(self.out_dir, self.doc_lengths)
+        runs = [_iter_run(run_file, field_count) for run_file in self.run_files]
+        # Khóa trộn: (term, số thứ tự run) để postings của cùng term nối theo thứ tự run
+        keyed = [((term, r, posting_list) for term, posting_list in run) for r, run in enumerate(runs)]
+        current_term, parts = None, []
+        for term, _, posting_list in heapq.merge(*keyed, key=lambda item: (item[0], item[1])):
+            if term != current_term:
+                if parts:
+                    writer.add_term(current_term, _concat_postings(parts, field_count))
+                current_term, parts = term, []
+            parts.append(posting_list)
+        if parts:
+            writer.add_term(current_term, _concat_postings(parts, field_count))
+
+        # Thống kê toàn cục (cùng cách tính với InvertedIndex.compute_statistics)
+        stats_index = InvertedIndex(self.text_processor)
+        stats_index.doc_ids = range(len(self.doc_lengths))
+        stats_index.doc_lengths = self.doc_lengths
+        stats_index.field_lengths = self.field_lengths
+        stats_index.compute_statistics()
+        writer.finish(self._iter_doc_ids(), self.field_lengths, stats_index.get_statistics(),
+                      ((key, self.ingredient_postings[key]) for key in sorted(self.ingredient_postings)),
+                      self.attribute_columns)
+
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+        return stats_index.doc_count
+
+
+def build_streaming(data_file, out_dir, memory_budget_mb=256, text_processor=None):
+    """
+    Build index nhị phân từ file JSON/JSONL theo SPIMI
+    Returns:
+        int: số tài liệu đã index
+    """
+    builder = SpimiIndexBuilder(out_dir, memory_budget_mb, text_processor)
+    for doc in iter_recipes(data_file):
+        builder.add(doc)
+    return builder.finish()
+
+
+def main():
+    """
+    Build index streaming từ dòng lệnh
+    """
+    import argparse
+    import time
+    from token_cache import TokenCache
+    from tokenizer_backends import create_tokenizer, TOKENIZER_NAMES
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.dirname(script_dir)
+
+    parser = argparse.ArgumentParser(description='Build index streaming (SPIMI) với bộ nhớ giới hạn')
+    parser.add_argument('data_file', nargs='?', default=os.path.join(base_dir, 'data', 'recipes.json'),
+                        help='file JSON (mảng) hoặc JSONL')
+    parser.add_argument('--out', default=os.path.join(base_dir, 'index', 'inverted_index'))
+    parser.add_argument('--memory-mb', type=float, default=256, help='ngân sách bộ nhớ cho index tạm (MB)')
+    parser.add_argument('--token-cache', default=None, help='file SQLite cache kết quả tách từ')
+    parser.add_argument('--tokenizer', choices=TOKENIZER_NAMES, default=None,
+                        help='backend tách từ (mặc định: biến môi trường RECIPE_TOKENIZER hoặc underthesea)')
+    parser.add_argument('--lexicon', default=None, help='file từ điển từ ghép cho backend longest-match')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("MODULE 2: BUILD INDEX STREAMING (SPIMI)")
+    print("=" * 60)
+    print(f"\n📂 Đang đọc dữ liệu từ: {args.data_file}")
+
+    cache = TokenCache(args.token_cache) if args.token_cache else None
+    start = time.perf_counter()
+    text_processor = TextProcessor(cache=cache, tokenizer=create_tokenizer(args.tokenizer, args.lexicon))
+    doc_count = build_streaming(args.data_file, args.out, args.memory_mb, text_processor)
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        cache.close()
+
+    print(f"\n✅ Đã index {doc_count} tài liệu trong {elapsed:.1f} giây -> {args.out}")
+    peak = get_peak_rss_mb()
+    if peak is not None:
+        print(f"   - Peak RSS: {peak:.1f} MB")
+    else:
+        print("   - Peak RSS: không đo được trên hệ điều hành này")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+MODULE 2: BẢNG THỐNG KÊ TERM
+Mục tiêu: Tính sẵn df, idf và điểm BM25 tối đa của từng term để bước xếp hạng
+lấy ra trong O(1) thay vì tính lại (và tách từ lại) cho mỗi posting
+
+Mỗi term có các cột:
+    df              - số tài liệu chứa term
+    idf             - log(N / df)
+    max_tf          - tần suất có trọng số lớn nhất trong các posting
+    min_doc_length  - độ dài nhỏ nhất của các tài liệu chứa term
+    max_score       - cận trên điểm BM25 của một posting: BM25(max_tf, min_doc_length)
+
+df, max_tf, min_doc_length cập nhật được tăng dần (thêm tài liệu, gộp phân đoạn);
+idf và max_score được suy ra từ chúng và thống kê toàn cục (N, avgdl) trong O(1).
+Vì BM25 tăng theo tf và giảm theo độ dài tài liệu, max_score luôn >= điểm của mọi posting.
+"""
+
+import math
+from collections import namedtuple
+
+
+# Tham số BM25 mặc định (giống SearchEngine.calculate_bm25)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TermStats = namedtuple('TermStats', ['df', 'idf', 'max_tf', 'min_doc_length', 'max_score'])
+
+EMPTY_TERM_STATS = TermStats(0, 0, 0.0, 0, 0.0)
+
+
+def compute_idf(doc_count, df):
+    """
+    IDF = log(N / df), 0 nếu term không xuất hiện
+    """
+    if df == 0 or doc_count == 0:
+        return 0
+    return math.log(doc_count / df)
+
+
+def bm25_bound(idf, max_tf, min_doc_length, avg_doc_length, k1=BM25_K1, b=BM25_B):
+    """
+    Cận trên điểm BM25 của một term (cùng công thức với SearchEngine.calculate_bm25)
+    """
+    if max_tf <= 0 or avg_doc_length <= 0:
+        return 0.0
+    numerator = max_tf * (k1 + 1)
+    denominator = max_tf + k1 * (1 - b + b * (min_doc_length / avg_doc_length))
+    return idf * (numerator / denominator)
+
+
+def make_term_stats(df, max_tf, min_doc_length, doc_count, avg_doc_length):
+    """
+    Tạo TermStats từ các cột cập nhật tăng dần và thống kê toàn cục
+    """
+    if df == 0:
+        return EMPTY_TERM_STATS
+    idf = compute_idf(doc_count, df)
+    return TermStats(df, idf, max_tf, min_doc_length,
+                     bm25_bound(idf, max_tf, min_doc_length, avg_doc_length))
+
+
+def scan_postings(posting_list, doc_lengths):
+    """
+    Tính (max_tf, min_doc_length) bằng cách duyệt một posting list
+    (dùng khi build/ghi index hoặc với index cũ chưa có bảng thống kê)
+    """
+    max_tf = 0.0
+    min_doc_length = 0
+    for doc_ordinals, frequencies, _ in posting_list.iter_blocks():
+        if len(doc_ordinals) == 0:
+            continue
+        max_tf = max(max_tf, max(frequencies))
+        block_min = min(doc_lengths[ordinal] for ordinal in doc_ordinals)
+        min_doc_length = block_min if min_doc_length == 0 else min(min_doc_length, block_min)
+    return max_tf, min_doc_length
@@ -4,17 +4,50 @@ Mục tiêu: Làm sạch văn bản và xây dựng Inverted Index
 """
 
 import re
+import os
+import sys
 import json
+import hashlib
+import bisect
+from array import array
 from collections import defaultdict
 import math
-from underthesea import word_tokenize
+from multiprocessing import Pool
+
+# Import các module cùng thư mục (chạy trực tiếp hoặc qua package)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from postings import PostingList, PostingCursor
+import index_storage
+from token_cache import TokenCache
+from term_stats import EMPTY_TERM_STATS, make_term_stats, scan_postings
+from tokenizer_backends import create_tokenizer, tokenizer_from_info, matches_info, TOKENIZER_NAMES
+from accent_folding import fold_accents
+from ngram_index import TrigramIndex, DEFAULT_MAX_DISTANCE, DEFAULT_MAX_CANDIDATES
+from ingredients import ingredient_keys
+from attributes import ATTRIBUTES, MISSING, AttributeColumn, parse_attributes
+from near_duplicates import collapse_near_duplicates
+from doc_ids import canonical_url
+from bitmap import Bitmap
+
+
+# Ký tự đặc biệt bị thay bằng khoảng trắng khi chuẩn hóa (biên dịch sẵn một lần)
+SPECIAL_CHAR_PATTERN = re.compile(r'[^\w\s]')
+
+# Số tài liệu được tách từ chung một lô khi build (process_many)
+PROCESS_BATCH_SIZE = 64
 
 
 class TextProcessor:
     """
     Class xử lý văn bản tiếng Việt
     """
-    def __init__(self):
+    def __init__(self, cache=None, tokenizer=None):
+        """
+        Args:
+            cache: TokenCache (tùy chọn) để nhớ kết quả tokenize/process
+            tokenizer: backend tách từ (mặc định theo biến môi trường RECIPE_TOKENIZER,
+                       không đặt thì dùng underthesea) - xem tokenizer_backends.py
+        """
         # Danh sách từ dừng tiếng Việt
         self.stop_words = set([
             'và', 'của', 'là', 'có', 'được', 'trong', 'cho', 'với', 'từ', 'một',
@@ -22,6 +55,25 @@ class TextProcessor:
             'về', 'vào', 'ra', 'đến', 'lên', 'theo', 'nên', 'nhưng', 'hoặc',
             'thì', 'sẽ', 'rất', 'cũng', 'đang', 'bị', 'làm', 'nào', 'ai', 'gì'
         ])
+        self.cache = cache
+        self.tokenizer = tokenizer if tokenizer is not None else create_tokenizer()
+        self.tokenize_errors = 0
+        
+        # Phiên bản của bộ tách từ và danh sách từ dừng, là một phần của key cache
+        self.tokenizer_version = self.tokenizer.version
+        self.stopword_version = hashlib.sha1(
+            '\n'.join(sorted(self.stop_words)).encode('utf-8')
+        ).hexdigest()[:12]
+    
+    def _cache_key(self, kind, text):
+        """
+        Key cache = hash(loại, phiên bản tách từ, [phiên bản từ dừng], văn bản đã chuẩn hóa)
+        """
+        parts = [kind, self.tokenizer_version]
+        if kind == 'process':
+            parts.append(self.stopword_version)
+        parts.append(text)
+        return hashlib.sha1('\0'.join(parts).encode('utf-8')).digest()
     
     def tokenize(self, text):
         """
@@ -31,13 +83,26 @@ class TextProcessor:
         Returns:
             list: danh sách các từ
         """
+        if self.cache is not None:
+            key = self._cache_key('tokenize', text)
+            tokens = self.cache.get(key)
+            if tokens is not None:
+                return tokens
+        
         try:
-            # Sử dụng underthesea để tách từ tiếng Việt
-            tokens = word_tokenize(text, format="text").split()
-            return tokens
-        except:
-            # Fallback: tách đơn giản nếu underthesea lỗi
+            # Tách từ tiếng Việt bằng backend đã chọn (underthesea hoặc longest-match)
+            tokens = self.tokenizer.tokenize(text)
+        except Exception as e:
+            # Fallback: tách đơn giản nếu backend lỗi (không đưa vào cache); báo một lần
+            # vì term có thể khác với lúc build index
+            self.tokenize_errors += 1
+            if self.tokenize_errors == 1:
+                print(f"⚠️  Tokenizer {self.tokenizer.name} lỗi ({e}), tạm tách theo khoảng trắng")
             return text.split()
+        
+        if self.cache is not None:
+            self.cache.put(key, tokens)
+        return tokens
     
     def normalize(self, text):
         """
@@ -47,12 +112,17 @@ class TextProcessor:
         text = text.lower()
         
         # Loại bỏ ký tự đặc biệt, chỉ giữ chữ cái, số và khoảng trắng
-        text = re.sub(r'[^\w\s]', ' ', text)
-        
-        # Loại bỏ khoảng trắng thừa
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = SPECIAL_CHAR_PATTERN.sub(' ', text)
         
-        return text
+        # Loại bỏ khoảng trắng thừa (split() tách theo mọi khoảng trắng giống \s)
+        return ' '.join(text.split())
+    
+    def normalize_many(self, texts):
+        """
+        Chuẩn hóa một lô văn bản (giống normalize)
+        """
+        sub = SPECIAL_CHAR_PATTERN.sub
+        return [' '.join(sub(' ', text.lower()).split()) for text in texts]
     
     def remove_stopwords(self, tokens):
         """
@@ -67,153 +137,851 @@ class TextProcessor:
         # Chuẩn hóa
         normalized_text = self.normalize(text)
         
+        if self.cache is not None:
+            key = self._cache_key('process', normalized_text)
+            filtered_tokens = self.cache.get(key)
+            if filtered_tokens is not None:
+                return filtered_tokens
+        
         # Tách từ
         tokens = self.tokenize(normalized_text)
         
         # Loại bỏ từ dừng
         filtered_tokens = self.remove_stopwords(tokens)
         
+        if self.cache is not None:
+            self.cache.put(key, filtered_tokens)
         return filtered_tokens
+    
+    def _tokenize_batch(self, texts):
+        """
+        Tách từ các văn bản chưa có trong cache bằng một lần gọi backend (tokenize_many)
+        """
+        if not texts:
+            return []
+        try:
+            batch = self.tokenizer.tokenize_many(texts)
+        except Exception:
+            # Backend lỗi: tách từng văn bản (có fallback tách theo khoảng trắng)
+            return [self.tokenize(text) for text in texts]
+        if self.cache is not None:
+            for text, tokens in zip(texts, batch):
+                self.cache.put(self._cache_key('tokenize', text), tokens)
+        return batch
+    
+    def process_many(self, texts):
+        """
+        Xử lý một lô văn bản trong một lượt (kết quả giống process cho từng văn bản):
+        văn bản trùng nhau chỉ xử lý một lần, các văn bản chưa có trong cache được tách từ
+        chung một lần gọi backend, token kết quả được intern (term trùng dùng chung một chuỗi)
+        Returns:
+            list: danh sách token của từng văn bản, cùng thứ tự với texts
+        """
+        normalized = self.normalize_many(texts)
+        cache = self.cache
+        results = {}  # {văn bản đã chuẩn hóa: token}
+        pending = []
+        for text in normalized:
+            if text in results:
+                continue
+            tokens = cache.get(self._cache_key('process', text)) if cache is not None else None
+            results[text] = tokens
+            if tokens is None:
+                pending.append(text)
+        
+        # Tách từ: lấy từ cache tách từ, phần còn lại gọi backend theo lô
+        tokenized = {}
+        to_tokenize = []
+        for text in pending:
+            tokens = cache.get(self._cache_key('tokenize', text)) if cache is not None else None
+            if tokens is None:
+                to_tokenize.append(text)
+            else:
+                tokenized[text] = tokens
+        tokenized.update(zip(to_tokenize, self._tokenize_batch(to_tokenize)))
+        
+        stop_words = self.stop_words
+        for text in pending:
+            filtered_tokens = [token for token in tokenized[text] if token not in stop_words]
+            if cache is not None:
+                cache.put(self._cache_key('process', text), filtered_tokens)
+            results[text] = filtered_tokens
+        
+        intern = sys.intern
+        for text, tokens in results.items():
+            results[text] = [intern(token) for token in tokens]
+        # Mỗi văn bản một list riêng (người gọi có thể sửa list)
+        return [list(results[text]) for text in normalized]
+
+
+# Các trường được index và trọng số tương ứng (title quan trọng nhất)
+FIELDS = ['title', 'description', 'ingredients', 'instructions']
+FIELD_WEIGHTS = [3.0, 2.0, 1.5, 1.0]
+
+# Khoảng cách vị trí giữa hai trường liên tiếp để cụm từ không "nối" qua ranh giới trường
+FIELD_POSITION_GAP = 100
+
+
+def extract_fields(doc):
+    """
+    Lấy văn bản của từng trường (theo thứ tự FIELDS) từ một công thức
+    """
+    return [
+        doc.get('title', ''),
+        doc.get('description', ''),
+        ' '.join(doc.get('ingredients', [])),
+        ' '.join(doc.get('instructions', []))
+    ]
 
 
 class InvertedIndex:
     """
     Class xây dựng và quản lý Inverted Index
     """
-    def __init__(self):
-        self.index = defaultdict(list)  # {term: [(doc_id, frequency, positions), ...]}
-        self.doc_lengths = {}  # {doc_id: length}
+    def __init__(self, text_processor=None):
+        """
+        Args:
+            text_processor: TextProcessor dùng khi build (ví dụ có TokenCache), mặc định tạo mới
+        """
+        self.index = {}  # {term: PostingList}
+        self.sorted_terms = None  # danh sách term đã sắp xếp (cho tra cứu tiền tố), dựng khi cần
+        self.trigram_index = None  # TrigramIndex trên sorted_terms (tìm gần đúng), dựng khi cần
+        self.positions = array('I')  # buffer positions dùng chung cho mọi posting
+        self.doc_ids = []  # [doc_id, ...] theo ordinal
+        self.doc_ordinals = {}  # {doc_id: ordinal}
+        self.doc_lengths = array('I')  # [length, ...] theo ordinal (tổng các trường)
+        self.fields = list(FIELDS)
+        self.field_weights = list(FIELD_WEIGHTS)
+        self.field_lengths = array('I')  # [ordinal * số trường + f] -> độ dài trường f
+        self.avg_field_lengths = [0.0] * len(self.fields)
         self.doc_count = 0
         self.avg_doc_length = 0
-        self.text_processor = TextProcessor()
+        self.term_columns = {}  # {term: [max_tf, min_doc_length]}, cập nhật khi thêm tài liệu
+        self.term_stats = {}  # {term: TermStats} đọc từ index mmap (không đổi sau khi mở)
+        self.folded_terms = None  # {dạng bỏ dấu: [term có dấu, ...]}, dựng khi cần rồi cập nhật tăng dần
+        self.sorted_folded = None  # các dạng bỏ dấu đã sắp xếp (tra tiền tố không dấu), dựng khi cần
+        self.ingredient_postings = {}  # {key nguyên liệu: array('I') ordinal tăng dần}
+        self.ingredient_store = None  # MappedIngredients (bitmap trên mmap) khi index được mở bằng mmap
+        self.ingredient_bitmaps = {}  # {key nguyên liệu: Bitmap}, dựng khi cần
+        self.attribute_columns = {name: array('I') for name in ATTRIBUTES}  # {thuộc tính: giá trị theo ordinal}
+        self.attribute_index = {}  # {thuộc tính: AttributeColumn}, dựng khi cần
+        self.near_duplicates = []  # báo cáo các cụm gần trùng đã gộp ở lần build gần nhất (dedup=True)
+        self.read_only = False  # True khi index được mở bằng mmap
+        self.text_processor = text_processor if text_processor is not None else TextProcessor()
+        self.tokenizer_info = self.text_processor.tokenizer.describe()  # ghi vào metadata của index
+    
+    def get_ordinal(self, doc_id):
+        """
+        Lấy ordinal (số nguyên liên tục) của tài liệu, cấp mới nếu chưa có
+        """
+        if self.doc_ordinals is None:
+            # Index mmap: chỉ dựng bảng tra URL -> ordinal khi thực sự cần
+            self.doc_ordinals = {d: i for i, d in enumerate(self.doc_ids)}
+        ordinal = self.doc_ordinals.get(doc_id)
+        if ordinal is None:
+            if self.read_only:
+                raise ValueError("Index mmap chỉ đọc, không thể thêm tài liệu mới")
+            ordinal = len(self.doc_ids)
+            self.doc_ordinals[doc_id] = ordinal
+            self.doc_ids.append(doc_id)
+            self.doc_lengths.append(0)
+            self.field_lengths.extend([0] * len(self.fields))
+            for column in self.attribute_columns.values():
+                column.append(MISSING)
+        return ordinal
+    
+    def get_doc_id(self, ordinal):
+        """
+        Lấy doc_id (URL) từ ordinal
+        """
+        return self.doc_ids[ordinal]
+
+    def find_ordinal(self, url):
+        """
+        Ordinal của tài liệu theo URL (chuẩn hóa trước khi tra, xem doc_ids), None nếu không có
+        """
+        if self.doc_ordinals is None:
+            self.doc_ordinals = {d: i for i, d in enumerate(self.doc_ids)}
+        ordinal = self.doc_ordinals.get(canonical_url(url))
+        # Index build trước khi chuẩn hóa URL lưu URL gốc
+        return ordinal if ordinal is not None else self.doc_ordinals.get(url)
+    
+    def add_document(self, doc_id, field_texts, ingredients=(), attributes=None):
+        """
+        Thêm tài liệu vào index (mỗi tài liệu chỉ gọi một lần)
+        Args:
+            doc_id: ID của tài liệu
+            field_texts: list văn bản của từng trường theo thứ tự self.fields
+            ingredients: các dòng nguyên liệu thô (cho bộ lọc theo nguyên liệu)
+            attributes: giá trị số theo thứ tự ATTRIBUTES (xem attributes.parse_attributes)
+        """
+        field_tokens = self.text_processor.process_many(field_texts)
+        self.add_tokenized_document(doc_id, field_tokens, ingredient_keys(ingredients), attributes)
+    
+    def add_documents(self, documents, batch_size=PROCESS_BATCH_SIZE):
+        """
+        Thêm nhiều công thức (URL chuẩn chưa có trong index, không trùng nhau),
+        tách từ theo lô batch_size tài liệu bằng process_many
+        """
+        field_count = len(self.fields)
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            field_tokens = self.text_processor.process_many(
+                [text for doc in batch for text in extract_fields(doc)])
+            for i, doc in enumerate(batch):
+                self.add_tokenized_document(canonical_url(doc['url']), field_tokens[i * field_count:(i + 1) * field_count],
+                                            ingredient_keys(doc.get('ingredients', [])), parse_attributes(doc))
     
-    def add_document(self, doc_id, text, field_weight=1.0):
+    def add_tokenized_document(self, doc_id, field_tokens, ingredients=(), attributes=None):
         """
-        Thêm tài liệu vào index
+        Thêm tài liệu đã tách từ: mỗi term chỉ có một posting cho mỗi tài liệu,
+        mang tần suất theo từng trường
         Args:
             doc_id: ID của tài liệu
-            text: nội dung văn bản
-            field_weight: trọng số của trường (ví dụ: title có trọng số cao hơn)
+            field_tokens: list các danh sách token của từng trường
+            ingredients: các key nguyên liệu của tài liệu (xem ingredients.ingredient_keys)
+            attributes: giá trị số theo thứ tự ATTRIBUTES, None = không có
         """
-        # Xử lý văn bản
-        tokens = self.text_processor.process(text)
+        field_count = len(self.fields)
+        ordinal = self.get_ordinal(doc_id)
         
-        # Đếm tần suất và vị trí của mỗi từ
-        term_freq = defaultdict(int)
+        # Đếm tần suất theo trường và vị trí (vị trí tính liên tục qua các trường)
+        term_field_freqs = {}
         term_positions = defaultdict(list)
+        base = 0
+        for field, tokens in enumerate(field_tokens):
+            for position, token in enumerate(tokens):
+                field_freqs = term_field_freqs.get(token)
+                if field_freqs is None:
+                    field_freqs = [0] * field_count
+                    term_field_freqs[token] = field_freqs
+                field_freqs[field] += 1
+                term_positions[token].append(base + position)
+            self.field_lengths[ordinal * field_count + field] = len(tokens)
+            base += len(tokens) + FIELD_POSITION_GAP
         
-        for position, token in enumerate(tokens):
-            term_freq[token] += 1
-            term_positions[token].append(position)
+        # Lưu độ dài tài liệu (tổng các trường)
+        doc_length = sum(len(tokens) for tokens in field_tokens)
+        self.doc_lengths[ordinal] = doc_length
         
-        # Thêm vào inverted index
-        for term, freq in term_freq.items():
-            weighted_freq = freq * field_weight
-            self.index[term].append({
-                'doc_id': doc_id,
-                'frequency': weighted_freq,
-                'positions': term_positions[term]
-            })
+        # Thêm vào inverted index và cập nhật bảng thống kê term
+        for term, field_freqs in term_field_freqs.items():
+            posting_list = self.index.get(term)
+            if posting_list is None:
+                posting_list = self._new_posting_list(term)
+            weighted_freq = sum(w * tf for w, tf in zip(self.field_weights, field_freqs))
+            posting_list.append(ordinal, weighted_freq, field_freqs, term_positions[term])
+            self._update_term_columns(term, posting_list.frequencies[-1], doc_length)
         
-        # Lưu độ dài tài liệu
-        self.doc_lengths[doc_id] = len(tokens)
+        for key in ingredients:
+            self.ingredient_postings.setdefault(key, array('I')).append(ordinal)
+        if ingredients and self.ingredient_bitmaps:
+            self.ingredient_bitmaps = {}
+        if attributes is not None:
+            for name, value in zip(ATTRIBUTES, attributes):
+                self.attribute_columns[name][ordinal] = value
+            self.attribute_index = {}
+    
+    def _new_posting_list(self, term):
+        """
+        Tạo posting list rỗng cho term mới và cập nhật danh sách term đã sắp xếp, bảng gấp dấu
+        """
+        posting_list = PostingList(self.positions, len(self.fields))
+        self.index[term] = posting_list
+        self.sorted_terms = None
+        self.trigram_index = None
+        if self.folded_terms is not None:
+            self._add_folded_term(term)
+        return posting_list
+    
+    def _add_folded_term(self, term):
+        folded = fold_accents(term)
+        if folded != term:
+            if folded not in self.folded_terms:
+                self.sorted_folded = None
+            self.folded_terms.setdefault(folded, []).append(term)
     
-    def build_from_documents(self, documents):
+    def _update_term_columns(self, term, max_tf, min_doc_length):
+        """
+        Cập nhật tăng dần max_tf và min_doc_length của một term
+        """
+        columns = self.term_columns.get(term)
+        if columns is None:
+            self.term_columns[term] = [max_tf, min_doc_length]
+        else:
+            columns[0] = max(columns[0], max_tf)
+            columns[1] = min(columns[1], min_doc_length)
+    
+    def build_from_documents(self, documents, workers=1, dedup=False):
         """
         Xây dựng index từ danh sách tài liệu
         Args:
             documents: list các dict chứa thông tin tài liệu
+            workers: số process tách từ song song (1 = tuần tự); kết quả giống hệt build tuần tự
+            dedup: chỉ giữ một công thức cho mỗi cụm gần trùng (MinHash / LSH, xem near_duplicates);
+                   báo cáo các cụm đã gộp nằm ở self.near_duplicates
         """
         print("🔨 Đang xây dựng Inverted Index...")
         
-        for doc in documents:
-            doc_id = doc['url']  # Sử dụng URL làm doc_id
-            
-            # Index các trường với trọng số khác nhau
-            # Title có trọng số cao nhất
-            self.add_document(doc_id, doc.get('title', ''), field_weight=3.0)
-            
-            # Description có trọng số trung bình
-            self.add_document(doc_id, doc.get('description', ''), field_weight=2.0)
-            
-            # Ingredients
-            ingredients_text = ' '.join(doc.get('ingredients', []))
-            self.add_document(doc_id, ingredients_text, field_weight=1.5)
-            
-            # Instructions
-            instructions_text = ' '.join(doc.get('instructions', []))
-            self.add_document(doc_id, instructions_text, field_weight=1.0)
-        
-        self.doc_count = len(documents)
-        self.avg_doc_length = sum(self.doc_lengths.values()) / self.doc_count if self.doc_count > 0 else 0
+        # Loại URL trùng (và bản gần trùng) trước khi chia khối để build song song giống build tuần tự
+        unique_docs = self._unique_documents(documents)
+        if dedup:
+            unique_docs, self.near_duplicates = collapse_near_duplicates(unique_docs)
+            removed = sum(len(cluster['duplicates']) for cluster in self.near_duplicates)
+            print(f"   - Gần trùng: bỏ {removed} công thức trong {len(self.near_duplicates)} cụm")
+        
+        if workers > 1:
+            self._build_parallel(unique_docs, workers)
+        else:
+            # Index tất cả các trường trong một lần, trọng số theo FIELD_WEIGHTS
+            self.add_documents(unique_docs)
+        
+        self.compute_statistics()
+        
+        cache = self.text_processor.cache
+        if cache is not None:
+            cache.flush()
+            if cache.hits + cache.misses > 0:
+                print(f"   - Token cache: {cache.hits} hit / {cache.misses} miss")
         
         print(f"✅ Đã xây dựng index cho {self.doc_count} tài liệu")
         print(f"   - Tổng số terms: {len(self.index)}")
         print(f"   - Độ dài tài liệu trung bình: {self.avg_doc_length:.2f} từ")
     
+    def _unique_documents(self, documents):
+        """
+        Bỏ công thức có URL chuẩn (doc_id) đã có trong index hoặc lặp lại:
+        mỗi tài liệu chỉ có một posting cho mỗi term
+        """
+        seen = set(self.doc_ordinals)
+        unique_docs = []
+        for doc in documents:
+            doc_id = canonical_url(doc['url'])
+            if doc_id not in seen:
+                seen.add(doc_id)
+                unique_docs.append(doc)
+        return unique_docs
+    
+    def _build_parallel(self, unique_docs, workers):
+        """
+        Chia tài liệu (đã loại URL trùng) thành các khối liên tiếp, mỗi process dựng một index con,
+        sau đó gộp lần lượt theo đúng thứ tự khối
+        """
+        # Nhiều khối hơn số worker để cân bằng tải
+        chunk_count = workers * 4
+        chunk_size = max(1, -(-len(unique_docs) // chunk_count))
+        cache = self.text_processor.cache
+        tokenizer = self.text_processor.tokenizer
+        chunks = [(unique_docs[i:i + chunk_size], cache, tokenizer)
+                  for i in range(0, len(unique_docs), chunk_size)]
+        
+        with Pool(workers) as pool:
+            for partial in pool.imap(_build_partial_index, chunks):
+                self.merge_partial(partial)
+    
+    def merge_partial(self, partial):
+        """
+        Gộp một index con (các tài liệu nằm sau toàn bộ tài liệu hiện có) vào index này
+        Args:
+            partial: InvertedIndex con
+        """
+        doc_offset = len(self.doc_ids)
+        position_offset = len(self.positions)
+        
+        for doc_id in partial.doc_ids:
+            self.doc_ordinals[doc_id] = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+        self.doc_lengths.extend(partial.doc_lengths)
+        self.field_lengths.extend(partial.field_lengths)
+        self.positions.extend(partial.positions)
+        
+        for term, partial_list in partial.index.items():
+            posting_list = self.index.get(term)
+            if posting_list is None:
+                posting_list = self._new_posting_list(term)
+            posting_list.doc_ordinals.extend(o + doc_offset for o in partial_list.doc_ordinals)
+            posting_list.frequencies.extend(partial_list.frequencies)
+            posting_list.pos_offsets.extend(o + position_offset for o in partial_list.pos_offsets)
+            posting_list.pos_counts.extend(partial_list.pos_counts)
+            posting_list.field_freqs.extend(partial_list.field_freqs)
+            posting_list.clear_skip_entries()
+            max_tf, min_doc_length = partial.term_columns.get(term) or scan_postings(
+                partial_list, partial.doc_lengths)
+            self._update_term_columns(term, max_tf, min_doc_length)
+        
+        for key, ordinals in partial.ingredient_postings.items():
+            self.ingredient_postings.setdefault(key, array('I')).extend(o + doc_offset for o in ordinals)
+        self.ingredient_bitmaps = {}
+        for name, column in partial.attribute_columns.items():
+            self.attribute_columns[name].extend(column)
+        self.attribute_index = {}
+    
+    def compute_statistics(self):
+        """
+        Tính số tài liệu, độ dài trung bình của tài liệu và của từng trường
+        """
+        field_count = len(self.fields)
+        self.doc_count = len(self.doc_ids)
+        if self.doc_count == 0:
+            self.avg_doc_length = 0
+            self.avg_field_lengths = [0.0] * field_count
+            return
+        self.avg_doc_length = sum(self.doc_lengths) / self.doc_count
+        self.avg_field_lengths = [
+            sum(self.field_lengths[f::field_count]) / self.doc_count
+            for f in range(field_count)
+        ]
+    
+    def get_statistics(self):
+        """
+        Các thống kê toàn cục được lưu cùng index
+        """
+        return {
+            'doc_count': self.doc_count,
+            'avg_doc_length': self.avg_doc_length,
+            'fields': self.fields,
+            'field_weights': self.field_weights,
+            'avg_field_lengths': self.avg_field_lengths,
+            'tokenizer': self.tokenizer_info
+        }
+    
+    def set_statistics(self, stats):
+        """
+        Khôi phục các thống kê toàn cục khi tải index
+        """
+        self.doc_count = stats['doc_count']
+        self.avg_doc_length = stats['avg_doc_length']
+        self.fields = list(stats['fields'])
+        self.field_weights = list(stats['field_weights'])
+        self.avg_field_lengths = list(stats['avg_field_lengths'])
+        self.set_tokenizer_info(stats.get('tokenizer'))
+    
+    def set_tokenizer_info(self, info):
+        """
+        Dùng đúng backend tách từ đã build index (index cũ không ghi backend: underthesea)
+        """
+        if not matches_info(self.text_processor.tokenizer, info):
+            self.text_processor = TextProcessor(cache=self.text_processor.cache,
+                                                tokenizer=tokenizer_from_info(info))
+            print(f"   - Tokenizer theo index: {self.text_processor.tokenizer.name}")
+        self.tokenizer_info = self.text_processor.tokenizer.describe() if not info else info
+    
+    def get_term_postings(self, term):
+        """
+        Posting list của một term đã xử lý (không tách từ lại)
+        """
+        posting_list = self.index.get(term)
+        if posting_list is None:
+            return PostingList(self.positions, len(self.fields))
+        return posting_list
+    
+    def get_term_cursor(self, term):
+        """
+        PostingCursor trên posting list của một term đã xử lý (advance, block-max)
+        """
+        return PostingCursor(self.get_term_postings(term), self.doc_lengths,
+                             self.get_term_statistics(term).idf, self.avg_doc_length)
+    
+    def get_term_statistics(self, term):
+        """
+        Thống kê (df, idf, max_tf, min_doc_length, max_score) của một term đã xử lý
+        """
+        if self.read_only:
+            stats = self.term_stats.get(term)
+            if stats is None:
+                i = self.index.find(term)
+                stats = self.index.term_statistics(i) if i >= 0 else EMPTY_TERM_STATS
+                if stats is None:
+                    # Index phiên bản cũ chưa có bảng thống kê: duyệt postings một lần
+                    posting_list = self.index.posting_list(i)
+                    stats = make_term_stats(len(posting_list), *scan_postings(posting_list, self.doc_lengths),
+                                            self.doc_count, self.avg_doc_length)
+                self.term_stats[term] = stats
+            return stats
+        
+        posting_list = self.index.get(term)
+        if posting_list is None:
+            return EMPTY_TERM_STATS
+        columns = self.term_columns.get(term)
+        if columns is None:
+            # Postings được thêm trực tiếp (tải JSON, chuyển định dạng cũ): tính một lần
+            columns = list(scan_postings(posting_list, self.doc_lengths))
+            self.term_columns[term] = columns
+        return make_term_stats(len(posting_list), columns[0], columns[1],
+                               self.doc_count, self.avg_doc_length)
+    
+    def terms_in_range(self, start, end=None):
+        """
+        Duyệt các term trong khoảng [start, end) theo thứ tự tăng dần (end=None: đến hết)
+        """
+        if self.read_only:
+            yield from self.index.iter_range(start, end)
+            return
+        if self.sorted_terms is None:
+            self.sorted_terms = sorted(self.index)
+        for i in range(bisect.bisect_left(self.sorted_terms, start), len(self.sorted_terms)):
+            term = self.sorted_terms[i]
+            if end is not None and term >= end:
+                return
+            yield term
+    
+    def terms_with_prefix(self, prefix):
+        """
+        Duyệt các term bắt đầu bằng prefix theo thứ tự tăng dần (không quét toàn bộ từ điển)
+        """
+        if self.read_only:
+            yield from self.index.iter_prefix(prefix)
+            return
+        for term in self.terms_in_range(prefix):
+            if not term.startswith(prefix):
+                return
+            yield term
+    
+    def get_folded_terms(self, folded):
+        """
+        Các term có dấu có dạng bỏ dấu là folded, ví dụ "pho bo" -> ["phở bò"]
+        (tra cứu trực tiếp bảng gấp dấu, không quét từ điển)
+        """
+        if self.read_only and self.index.has_folded_terms:
+            return self.index.folded_terms(folded)
+        return list(self._folded_map().get(folded, ()))
+
+    def terms_with_folded_prefix(self, prefix):
+        """
+        Duyệt các term có dấu có dạng bỏ dấu bắt đầu bằng prefix, ví dụ "banh" -> "bánh", "bánh_xèo"
+        (theo thứ tự dạng bỏ dấu; tìm khoảng trên các dạng bỏ dấu đã sắp xếp, không quét từ điển)
+        """
+        if self.read_only and self.index.has_folded_terms:
+            yield from self.index.folded_terms_with_prefix(prefix)
+            return
+        folded_terms = self._folded_map()
+        if self.sorted_folded is None:
+            self.sorted_folded = sorted(folded_terms)
+        for i in range(bisect.bisect_left(self.sorted_folded, prefix), len(self.sorted_folded)):
+            folded = self.sorted_folded[i]
+            if not folded.startswith(prefix):
+                return
+            yield from folded_terms[folded]
+
+    def _folded_map(self):
+        if self.folded_terms is None:
+            # Index trong bộ nhớ hoặc index nhị phân cũ: dựng bảng một lần
+            self.folded_terms = {}
+            for term in self.index.keys():
+                self._add_folded_term(term)
+        return self.folded_terms
+    
+    def get_similar_terms(self, term, max_distance=DEFAULT_MAX_DISTANCE, max_candidates=DEFAULT_MAX_CANDIDATES):
+        """
+        Các cặp (khoảng cách sửa, term) gần đúng với term đã xử lý, tìm qua chỉ mục trigram
+        (xem ngram_index.py)
+        """
+        if self.read_only and self.index.has_trigrams:
+            return self.index.similar_terms(term, max_distance, max_candidates)
+        if self.trigram_index is None:
+            # Index trong bộ nhớ hoặc index nhị phân cũ: dựng chỉ mục một lần
+            if self.sorted_terms is None:
+                self.sorted_terms = sorted(self.index.keys())
+            self.trigram_index = TrigramIndex(self.sorted_terms)
+        return self.trigram_index.find_similar(term, max_distance, max_candidates)
+    
     def get_posting_list(self, term):
         """
-        Lấy posting list của một term
+        Lấy posting list (PostingList) của một term
         """
         processed_term = self.text_processor.process(term)
         if processed_term:
-            return self.index.get(processed_term[0], [])
-        return []
+            return self.get_term_postings(processed_term[0])
+        return PostingList(self.positions, len(self.fields))
     
     def get_document_frequency(self, term):
         """
         Lấy số tài liệu chứa term
         """
-        return len(self.get_posting_list(term))
+        processed_term = self.text_processor.process(term)
+        if processed_term:
+            return self.get_term_statistics(processed_term[0]).df
+        return 0
     
     def get_idf(self, term):
         """
         Tính IDF (Inverse Document Frequency)
-        IDF = log(N / df)
+        IDF = log(N / df), lấy từ bảng thống kê term
+        """
+        processed_term = self.text_processor.process(term)
+        if processed_term:
+            return self.get_term_statistics(processed_term[0]).idf
+        return 0
+    
+    def ingredient_names(self):
+        """
+        Các key nguyên liệu có trong index, đã sắp xếp
         """
-        df = self.get_document_frequency(term)
-        if df == 0:
-            return 0
-        return math.log(self.doc_count / df)
+        if self.ingredient_store is not None:
+            return self.ingredient_store.names
+        return sorted(self.ingredient_postings)
     
-    def save(self, filepath):
+    def get_ingredient_bitmap(self, key):
         """
-        Lưu index vào file
+        Bitmap các ordinal tài liệu có nguyên liệu key (tên đã chuẩn hóa, xem
+        ingredients.normalize_ingredient); bitmap rỗng nếu không có
         """
+        bitmap = self.ingredient_bitmaps.get(key)
+        if bitmap is None:
+            if self.ingredient_store is not None:
+                bitmap = self.ingredient_store.get(key)
+            else:
+                bitmap = Bitmap.from_sorted(self.ingredient_postings.get(key, ()))
+            self.ingredient_bitmaps[key] = bitmap
+        return bitmap
+    
+    def iter_ingredient_postings(self):
+        """
+        Duyệt (key nguyên liệu, ordinal tăng dần) theo thứ tự key, dùng khi ghi index
+        """
+        if self.ingredient_store is not None:
+            for key in self.ingredient_store.names:
+                yield key, list(self.ingredient_store.get(key))
+            return
+        for key in sorted(self.ingredient_postings):
+            yield key, self.ingredient_postings[key]
+    
+    def get_attribute_bitmap(self, name, low=None, high=None):
+        """
+        Bitmap các ordinal có low <= thuộc tính name <= high (cận None = không chặn);
+        rỗng nếu index không có cột thuộc tính (index cũ)
+        """
+        attribute = self.attribute_index.get(name)
+        if attribute is None:
+            column = self.attribute_columns.get(name)
+            if column is None:
+                return Bitmap()
+            attribute = AttributeColumn(column)
+            self.attribute_index[name] = attribute
+        return attribute.range(low, high)
+    
+    def save(self, filepath, codec=index_storage.DEFAULT_CODEC):
+        """
+        Lưu index: đường dẫn kết thúc bằng .json -> JSON, ngược lại -> thư mục nhị phân (mmap)
+        Args:
+            codec: cách lưu postings của index nhị phân ('varint' hoặc 'raw')
+        """
+        if not filepath.endswith('.json'):
+            index_storage.write_index(self, filepath, codec)
+            print(f"💾 Đã lưu index (nhị phân, codec {codec}) vào: {filepath}")
+            return
+        
         data = {
-            'index': dict(self.index),
-            'doc_lengths': self.doc_lengths,
-            'doc_count': self.doc_count,
-            'avg_doc_length': self.avg_doc_length
+            'index': {term: posting_list.to_dict() for term, posting_list in self.index.items()},
+            'positions': self.positions.tolist(),
+            'doc_ids': self.doc_ids,
+            'doc_lengths': self.doc_lengths.tolist(),
+            'field_lengths': self.field_lengths.tolist(),
+            'ingredients': {key: list(ordinals) for key, ordinals in self.iter_ingredient_postings()},
+            'attributes': {name: list(column) for name, column in self.attribute_columns.items()},
+            **self.get_statistics()
         }
         
+        # Không indent: file chủ yếu là các mảng số
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            json.dump(data, f, ensure_ascii=False)
         
         print(f"💾 Đã lưu index vào: {filepath}")
     
     def load(self, filepath):
         """
-        Tải index từ file
+        Tải index: thư mục nhị phân được mở bằng mmap (nạp lười), file .json được đọc toàn bộ
         """
+        if os.path.isdir(filepath):
+            self._load_binary(filepath)
+            print(f"📂 Đã mở index (mmap) từ: {filepath}")
+            print(f"   - Số tài liệu: {self.doc_count}")
+            print(f"   - Số terms: {len(self.index)}")
+            return
+        
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
-        self.index = defaultdict(list, data['index'])
-        self.doc_lengths = data['doc_lengths']
-        self.doc_count = data['doc_count']
-        self.avg_doc_length = data['avg_doc_length']
+        self.read_only = False
+        
+        self.index = {}
+        self.sorted_terms = None
+        self.trigram_index = None
+        self.positions = array('I')
+        self.doc_ids = []
+        self.doc_ordinals = {}
+        self.doc_lengths = array('I')
+        self.field_lengths = array('I')
+        self.term_columns = {}  # tính lại khi truy cập lần đầu
+        self.term_stats = {}
+        self.folded_terms = None
+        self.sorted_folded = None
+        self.ingredient_postings = {}
+        self.ingredient_store = None
+        self.ingredient_bitmaps = {}
+        self.attribute_columns = {name: array('I') for name in ATTRIBUTES}
+        self.attribute_index = {}
+        
+        if 'fields' in data:
+            self.set_statistics(data)
+            self.positions.extend(data['positions'])
+            self.doc_ids = data['doc_ids']
+            self.doc_ordinals = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+            self.doc_lengths.extend(data['doc_lengths'])
+            self.field_lengths.extend(data['field_lengths'])
+            for term, posting_data in data['index'].items():
+                self.index[term] = PostingList.from_dict(self.positions, len(self.fields), posting_data)
+            # Index cũ chưa có nguyên liệu: bộ lọc nguyên liệu không khớp tài liệu nào
+            for key, ordinals in data.get('ingredients', {}).items():
+                self.ingredient_postings[key] = array('I', ordinals)
+            for name, column in self.attribute_columns.items():
+                column.extend(data.get('attributes', {}).get(name) or [MISSING] * len(self.doc_ids))
+        elif 'doc_ids' in data:
+            raise ValueError(f"Index {filepath} không có thông tin theo trường, hãy build lại index")
+        else:
+            # Định dạng cũ: mỗi posting là dict {'doc_id', 'frequency', 'positions'}
+            self.fields = list(FIELDS)
+            self.field_weights = list(FIELD_WEIGHTS)
+            self.set_tokenizer_info(None)
+            self._load_legacy(data)
+            self.compute_statistics()
         
         print(f"📂 Đã tải index từ: {filepath}")
         print(f"   - Số tài liệu: {self.doc_count}")
         print(f"   - Số terms: {len(self.index)}")
+    
+    def _load_binary(self, index_dir):
+        """
+        Mở index nhị phân bằng mmap, postings chỉ được đọc khi truy cập
+        """
+        meta, term_dictionary, doc_ids, doc_lengths, field_lengths = index_storage.open_index(index_dir)
+        self.set_statistics(meta)
+        self.index = term_dictionary
+        self.sorted_terms = None
+        self.trigram_index = None
+        self.positions = array('I')
+        self.doc_ids = doc_ids
+        self.doc_ordinals = None
+        self.doc_lengths = doc_lengths
+        self.field_lengths = field_lengths
+        self.term_columns = {}
+        self.term_stats = {}
+        self.folded_terms = None
+        self.sorted_folded = None
+        self.ingredient_postings = {}
+        self.ingredient_store = index_storage.open_ingredients(index_dir, meta)
+        self.ingredient_bitmaps = {}
+        self.attribute_columns = index_storage.open_attributes(index_dir, meta)
+        self.attribute_index = {}
+        self.read_only = True
+    
+    def _load_legacy(self, data):
+        """
+        Chuyển index định dạng cũ (mỗi trường một posting dạng dict, key theo URL)
+        sang dạng mảng, gộp về một posting cho mỗi (term, tài liệu)
+        """
+        field_count = len(self.fields)
+        field_of_weight = {weight: f for f, weight in enumerate(self.field_weights)}
+        
+        # Cấp ordinal theo thứ tự tài liệu trong doc_lengths
+        for doc_id in data['doc_lengths']:
+            self.get_ordinal(doc_id)
+        
+        # Lượt 1: trường của posting suy ra từ trọng số (frequency / số positions);
+        # độ dài trường = vị trí lớn nhất + 1 vì mọi token còn lại đều là term trong index
+        grouped = {}  # {term: {ordinal: [(field, positions), ...]}}
+        for term, postings in data['index'].items():
+            by_doc = grouped.setdefault(term, {})
+            for posting in postings:
+                positions = posting['positions']
+                ordinal = self.get_ordinal(posting['doc_id'])
+                field = field_of_weight[posting['frequency'] / len(positions)]
+                by_doc.setdefault(ordinal, []).append((field, positions))
+                slot = ordinal * field_count + field
+                self.field_lengths[slot] = max(self.field_lengths[slot], positions[-1] + 1)
+        
+        # Lượt 2: dựng posting gộp với vị trí liên tục qua các trường
+        field_bases = {}
+        for ordinal in range(len(self.doc_ids)):
+            lengths = self.field_lengths[ordinal * field_count:(ordinal + 1) * field_count]
+            self.doc_lengths[ordinal] = sum(lengths)
+            bases, base = [], 0
+            for length in lengths:
+                bases.append(base)
+                base += length + FIELD_POSITION_GAP
+            field_bases[ordinal] = bases
+        
+        for term, by_doc in grouped.items():
+            posting_list = PostingList(self.positions, field_count)
+            for ordinal in sorted(by_doc):
+                field_freqs = [0] * field_count
+                positions = []
+                for field, field_positions in sorted(by_doc[ordinal]):
+                    field_freqs[field] += len(field_positions)
+                    positions.extend(field_bases[ordinal][field] + p for p in field_positions)
+                weighted_freq = sum(w * tf for w, tf in zip(self.field_weights, field_freqs))
+                posting_list.append(ordinal, weighted_freq, field_freqs, positions)
+            self.index[term] = posting_list
+
+
+def _build_partial_index(task):
+    """
+    Worker của build song song: tách từ và dựng index con cho một khối tài liệu
+    Args:
+        task: (danh sách tài liệu, TokenCache hoặc None, tokenizer)
+    """
+    documents, cache, tokenizer = task
+    partial = InvertedIndex(TextProcessor(cache=cache, tokenizer=tokenizer))
+    partial.add_documents(documents)
+    if cache is not None:
+        cache.close()
+    partial.text_processor = None  # không cần gửi về process chính
+    return partial
+
+
+def resolve_index_path(index_dir):
+    """
+    Chọn index để tải: ưu tiên thư mục nhị phân, nếu chưa có thì dùng file JSON cũ
+    """
+    binary_path = os.path.join(index_dir, 'inverted_index')
+    if os.path.isdir(binary_path):
+        return binary_path
+    return os.path.join(index_dir, 'inverted_index.json')
+
+
+def load_index(index_dir):
+    """
+    Tải index để tìm kiếm: index phân đoạn (index/segments) nếu có,
+    ngược lại là InvertedIndex (nhị phân hoặc JSON)
+    """
+    segments_dir = os.path.join(index_dir, 'segments')
+    if os.path.exists(os.path.join(segments_dir, 'segments.json')):
+        from segments import open_snapshot
+        return open_snapshot(segments_dir)
+    
+    inverted_index = InvertedIndex()
+    inverted_index.load(resolve_index_path(index_dir))
+    return inverted_index
 
 
 def main():
     """
     Hàm chính để xây dựng index
     """
-    import os
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Xây dựng Inverted Index')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='số process tách từ song song (mặc định: 1)')
+    parser.add_argument('--token-cache', default=None,
+                        help='file SQLite cache kết quả tách từ, giúp build lại nhanh (ví dụ: index/token_cache.sqlite)')
+    parser.add_argument('--tokenizer', choices=TOKENIZER_NAMES, default=None,
+                        help='backend tách từ (mặc định: biến môi trường RECIPE_TOKENIZER hoặc underthesea)')
+    parser.add_argument('--lexicon', default=None,
+                        help='file từ điển từ ghép cho backend longest-match (ví dụ: index/lexicon.txt)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='gộp công thức gần trùng (MinHash / LSH), báo cáo ở index/near_duplicates.json')
+    args = parser.parse_args()
     
     print("=" * 60)
     print("MODULE 2: XỬ LÝ VĂN BẢN & XÂY DỰNG CHỈ MỤC")
@@ -233,14 +1001,27 @@ def main():
     print(f"✅ Đã đọc {len(documents)} tài liệu")
     
     # Xây dựng Inverted Index
-    inverted_index = InvertedIndex()
-    inverted_index.build_from_documents(documents)
+    cache = TokenCache(args.token_cache) if args.token_cache else None
+    tokenizer = create_tokenizer(args.tokenizer, args.lexicon)
+    print(f"✂️  Tokenizer: {tokenizer.name}")
+    inverted_index = InvertedIndex(TextProcessor(cache=cache, tokenizer=tokenizer))
+    inverted_index.build_from_documents(documents, workers=args.workers, dedup=args.dedup)
+    if cache is not None:
+        cache.close()
     
-    # Lưu index
-    index_file = os.path.join(base_dir, 'index', 'inverted_index.json')
+    # Lưu index (định dạng nhị phân mmap)
+    index_file = os.path.join(base_dir, 'index', 'inverted_index')
     os.makedirs(os.path.dirname(index_file), exist_ok=True)
     inverted_index.save(index_file)
     
+    if args.dedup:
+        report_file = os.path.join(base_dir, 'index', 'near_duplicates.json')
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(inverted_index.near_duplicates, f, ensure_ascii=False, indent=2)
+        print(f"\n🧬 Báo cáo công thức gần trùng: {report_file}")
+        for cluster in inverted_index.near_duplicates[:5]:
+            print(f"   - {cluster['canonical']}: gộp {len(cluster['duplicates'])} bản")
+    
     # Demo: hiển thị một số term
     print("\n📊 MẪU INDEX (một số term):")
     sample_terms = list(inverted_index.index.keys())[:5]
@@ -249,9 +1030,9 @@ def main():
         print(f"\n   Term: '{term}'")
         print(f"   - Document Frequency: {len(posting_list)}")
         print(f"   - IDF: {inverted_index.get_idf(term):.4f}")
-        if posting_list:
-            first_posting = posting_list[0]
-            print(f"   - Ví dụ: doc_id={first_posting['doc_id'][:50]}..., freq={first_posting['frequency']}")
+        if len(posting_list):
+            doc_id = inverted_index.get_doc_id(posting_list.doc_ordinals[0])
+            print(f"   - Ví dụ: doc_id={doc_id[:50]}..., freq={posting_list.frequencies[0]}")
     
     print("\n✅ MODULE 2 HOÀN THÀNH!")
     print("=" * 60)
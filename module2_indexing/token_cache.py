@@ -0,0 +1,168 @@
+"""
+MODULE 2: CACHE KẾT QUẢ TÁCH TỪ
+Mục tiêu: Không phải chạy lại underthesea cho những văn bản đã tách từ trước đó
+
+Gồm hai lớp:
+    - LRU trong bộ nhớ (dùng được cả khi truy vấn, an toàn khi nhiều thread dùng chung)
+    - Kho SQLite trên đĩa (tùy chọn) giữ kết quả giữa các lần build, giới hạn số mục
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    Cache tách từ: key là hash nội dung (do TextProcessor tạo), value là danh sách token
+    """
+    def __init__(self, path=None, max_entries=500000, memory_entries=10000, batch_size=1000):
+        """
+        Args:
+            path: file SQLite lưu cache trên đĩa (None = chỉ dùng LRU trong bộ nhớ)
+            max_entries: số mục tối đa trên đĩa, vượt quá thì xóa các mục lâu không dùng
+            memory_entries: số mục tối đa của lớp LRU trong bộ nhớ
+            batch_size: số thay đổi được gom lại trước khi ghi xuống đĩa
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.memory_lock = threading.Lock()  # bảo vệ lớp LRU (web dùng chung cache giữa các thread)
+        self._reset()
+
+    def _reset(self):
+        self.memory = OrderedDict()  # {key: tuple(tokens)}
+        self.pending_puts = {}  # {key: tokens_text}
+        self.pending_touches = set()
+        self.connection = None
+        self.connection_pid = None
+        self.disk_entries = 0
+
+    def __getstate__(self):
+        # Chỉ gửi cấu hình sang process khác, kết nối SQLite được mở lại khi cần
+        return {
+            'path': self.path,
+            'max_entries': self.max_entries,
+            'memory_entries': self.memory_entries,
+            'batch_size': self.batch_size
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _connect(self):
+        """
+        Mở kết nối SQLite (mỗi process một kết nối riêng)
+        """
+        if self.connection is not None and self.connection_pid == os.getpid():
+            return self.connection
+        if self.connection_pid is not None and self.connection_pid != os.getpid():
+            # Process con được fork: bỏ trạng thái của process cha
+            self._reset()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=60)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS tokens (key BLOB PRIMARY KEY, tokens TEXT, last_used INTEGER)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS tokens_last_used ON tokens(last_used)')
+        connection.commit()
+        self.disk_entries = connection.execute('SELECT COUNT(*) FROM tokens').fetchone()[0]
+        self.connection = connection
+        self.connection_pid = os.getpid()
+        return connection
+
+    def _remember(self, key, tokens):
+        with self.memory_lock:
+            self.memory[key] = tokens
+            self.memory.move_to_end(key)
+            if len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Lấy danh sách token đã cache
+        Returns:
+            list hoặc None nếu chưa có
+        """
+        with self.memory_lock:
+            tokens = self.memory.get(key)
+            if tokens is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return list(tokens)
+
+        if self.path is not None:
+            tokens_text = self.pending_puts.get(key)
+            if tokens_text is None:
+                row = self._connect().execute(
+                    'SELECT tokens FROM tokens WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    tokens_text = row[0]
+                    self.pending_touches.add(key)
+            if tokens_text is not None:
+                tokens = tuple(tokens_text.split())
+                self._remember(key, tokens)
+                self.hits += 1
+                return list(tokens)
+
+        self.misses += 1
+        return None
+
+    def put(self, key, tokens):
+        """
+        Lưu danh sách token vào cache
+        """
+        self._remember(key, tuple(tokens))
+        if self.path is not None:
+            self.pending_puts[key] = ' '.join(tokens)
+            if len(self.pending_puts) + len(self.pending_touches) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """
+        Ghi các thay đổi đang chờ xuống đĩa và xóa bớt mục cũ nếu vượt giới hạn
+        """
+        if self.path is None or (not self.pending_puts and not self.pending_touches):
+            return
+        connection = self._connect()
+        now = int(time.time())
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO tokens (key, tokens, last_used) VALUES (?, ?, ?)',
+                [(key, text, now) for key, text in self.pending_puts.items()]
+            )
+            connection.executemany(
+                'UPDATE tokens SET last_used = ? WHERE key = ?',
+                [(now, key) for key in self.pending_touches]
+            )
+            self.disk_entries = connection.execute('SELECT COUNT(*) FROM tokens').fetchone()[0]
+            if self.disk_entries > self.max_entries:
+                # Xóa thêm 10% để không phải dọn lại ở mỗi lần flush
+                excess = self.disk_entries - int(self.max_entries * 0.9)
+                connection.execute(
+                    'DELETE FROM tokens WHERE key IN '
+                    '(SELECT key FROM tokens ORDER BY last_used LIMIT ?)', (excess,)
+                )
+                self.disk_entries -= excess
+        self.pending_puts.clear()
+        self.pending_touches.clear()
+
+    def close(self):
+        """
+        Ghi dữ liệu còn lại và đóng kết nối
+        """
+        self.flush()
+        if self.connection is not None and self.connection_pid == os.getpid():
+            self.connection.close()
+        self.connection = None
+        self.connection_pid = None
@@ -0,0 +1,208 @@
+"""
+MODULE 2: CÁC BỘ TÁCH TỪ (TOKENIZER BACKEND)
+Mục tiêu: Cho phép chọn bộ tách từ theo từng môi trường triển khai
+
+Hai backend:
+    - underthesea:   word_tokenize của underthesea (chính xác, chậm)
+    - longest-match: ghép âm tiết theo từ điển từ ghép, khớp dài nhất từ trái sang phải
+                     (thuần Python, nhanh); từ điển có thể lấy từ các term của index hiện có
+
+Backend được chọn bằng tham số hoặc biến môi trường RECIPE_TOKENIZER / RECIPE_LEXICON,
+và được ghi vào metadata của index để lúc truy vấn tách từ giống hệt lúc build.
+"""
+
+import os
+import re
+import sys
+import hashlib
+
+
+DEFAULT_TOKENIZER = 'underthesea'
+TOKENIZER_NAMES = ('underthesea', 'longest-match')
+
+# Biến môi trường chọn backend cho từng môi trường triển khai
+TOKENIZER_ENV = 'RECIPE_TOKENIZER'
+LEXICON_ENV = 'RECIPE_LEXICON'
+
+# Số âm tiết tối đa của một từ ghép được xét khi khớp
+MAX_COMPOUND_SYLLABLES = 6
+
+# Âm tiết: dãy chữ hoặc dãy số ("500g" -> "500", "g" giống underthesea)
+SYLLABLE_PATTERN = re.compile(r'\d+|[^\W\d]+')
+
+
+class UndertheseaTokenizer:
+    """
+    Tách từ bằng underthesea, từ ghép được nối bằng dấu gạch dưới (bánh_xèo)
+    """
+    name = 'underthesea'
+
+    def __init__(self):
+        import underthesea
+        from underthesea import word_tokenize
+        self.word_tokenize = word_tokenize
+        self.version = f'underthesea-{underthesea.__version__}'
+
+    def tokenize(self, text):
+        return self.word_tokenize(text, format="text").split()
+
+    def tokenize_many(self, texts):
+        word_tokenize = self.word_tokenize
+        return [word_tokenize(text, format="text").split() for text in texts]
+
+    def describe(self):
+        """
+        Thông tin lưu vào metadata của index
+        """
+        return {'name': self.name, 'version': self.version}
+
+
+class LongestMatchTokenizer:
+    """
+    Tách từ theo từ điển: tại mỗi âm tiết, ghép thành từ ghép dài nhất có trong từ điển,
+    nếu không có thì giữ nguyên âm tiết. Kết quả cùng dạng với underthesea (bánh_xèo)
+    """
+    name = 'longest-match'
+
+    def __init__(self, lexicon):
+        """
+        Args:
+            lexicon: các từ ghép (chữ thường, âm tiết cách nhau bởi khoảng trắng hoặc '_')
+        """
+        self.lexicon = frozenset(
+            word for word in (' '.join(entry.lower().replace('_', ' ').split()) for entry in lexicon)
+            if ' ' in word
+        )
+        # Âm tiết đầu của các từ ghép: bỏ qua nhanh các vị trí không thể bắt đầu từ ghép
+        self.first_syllables = frozenset(word.split(' ', 1)[0] for word in self.lexicon)
+        self.max_syllables = min(
+            MAX_COMPOUND_SYLLABLES,
+            max((word.count(' ') + 1 for word in self.lexicon), default=1)
+        )
+        digest = hashlib.sha1('\n'.join(sorted(self.lexicon)).encode('utf-8')).hexdigest()[:12]
+        self.version = f'longest-match-{digest}'
+
+    def tokenize(self, text):
+        syllables = SYLLABLE_PATTERN.findall(text)
+        keys = [syllable.lower() for syllable in syllables]
+        tokens = []
+        i = 0
+        count = len(syllables)
+        while i < count:
+            if keys[i] in self.first_syllables:
+                for size in range(min(self.max_syllables, count - i), 1, -1):
+                    if ' '.join(keys[i:i + size]) in self.lexicon:
+                        tokens.append('_'.join(syllables[i:i + size]))
+                        i += size
+                        break
+                else:
+                    tokens.append(syllables[i])
+                    i += 1
+            else:
+                tokens.append(syllables[i])
+                i += 1
+        return tokens
+
+    def tokenize_many(self, texts):
+        tokenize = self.tokenize
+        return [tokenize(text) for text in texts]
+
+    def describe(self):
+        """
+        Thông tin lưu vào metadata của index (kèm từ điển để index tự chứa đủ thông tin)
+        """
+        return {'name': self.name, 'version': self.version, 'lexicon': sorted(self.lexicon)}
+
+
+def build_lexicon(terms):
+    """
+    Lấy từ điển từ ghép từ các term của index (term có dấu '_' là từ ghép)
+    """
+    return sorted({term.replace('_', ' ') for term in terms if '_' in term.strip('_')})
+
+
+def load_lexicon(filepath):
+    """
+    Đọc từ điển từ ghép: mỗi dòng một từ
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def save_lexicon(lexicon, filepath):
+    """
+    Ghi từ điển từ ghép: mỗi dòng một từ
+    """
+    directory = os.path.dirname(os.path.abspath(filepath))
+    os.makedirs(directory, exist_ok=True)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        for word in lexicon:
+            f.write(word + '\n')
+
+
+def create_tokenizer(name=None, lexicon_path=None):
+    """
+    Tạo tokenizer theo tên (mặc định lấy từ biến môi trường RECIPE_TOKENIZER)
+    Args:
+        name: 'underthesea' hoặc 'longest-match'
+        lexicon_path: file từ điển cho longest-match (mặc định RECIPE_LEXICON)
+    """
+    name = name or os.environ.get(TOKENIZER_ENV) or DEFAULT_TOKENIZER
+    if name == 'underthesea':
+        return UndertheseaTokenizer()
+    if name == 'longest-match':
+        lexicon_path = lexicon_path or os.environ.get(LEXICON_ENV)
+        if not lexicon_path:
+            raise ValueError(f"Tokenizer longest-match cần file từ điển (--lexicon hoặc {LEXICON_ENV})")
+        return LongestMatchTokenizer(load_lexicon(lexicon_path))
+    raise ValueError(f"Tokenizer không hỗ trợ: {name}")
+
+
+def tokenizer_from_info(info):
+    """
+    Tạo lại tokenizer từ metadata của index (index cũ không có metadata dùng underthesea)
+    """
+    if not info or info['name'] == 'underthesea':
+        return UndertheseaTokenizer()
+    if info['name'] == 'longest-match':
+        return LongestMatchTokenizer(info['lexicon'])
+    raise ValueError(f"Tokenizer không hỗ trợ: {info['name']}")
+
+
+def matches_info(tokenizer, info):
+    """
+    Tokenizer có tách từ giống backend ghi trong metadata của index không
+    (underthesea chỉ so tên vì không thể nạp phiên bản khác của thư viện)
+    """
+    name = info['name'] if info else DEFAULT_TOKENIZER
+    if tokenizer.name != name:
+        return False
+    return name != 'longest-match' or tokenizer.version == info['version']
+
+
+def main():
+    """
+    Tạo từ điển từ ghép từ các term của index hiện có
+    """
+    import argparse
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from text_processor import InvertedIndex, resolve_index_path
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = os.path.dirname(script_dir)
+
+    parser = argparse.ArgumentParser(description='Tạo từ điển từ ghép cho tokenizer longest-match')
+    parser.add_argument('--index', default=None, help='index nguồn (mặc định index/inverted_index)')
+    parser.add_argument('--out', default=os.path.join(base_dir, 'index', 'lexicon.txt'))
+    args = parser.parse_args()
+
+    inverted_index = InvertedIndex()
+    inverted_index.load(args.index or resolve_index_path(os.path.join(base_dir, 'index')))
+    lexicon = build_lexicon(inverted_index.index.keys())
+    save_lexicon(lexicon, args.out)
+    print(f"✅ Đã ghi {len(lexicon)} từ ghép vào: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,63 +5,139 @@ Mục tiêu: Tìm kiếm và xếp hạng kết quả theo độ liên quan (TF-
 
 import json
 import math
+import re
+import heapq
+import bisect
+import threading
+from array import array
 from collections import defaultdict
+from itertools import islice, accumulate
 import sys
 import os
 
 # Import từ module 2
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'module2_indexing'))
-from text_processor import TextProcessor, InvertedIndex
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from text_processor import TextProcessor, InvertedIndex, load_index
+from token_cache import TokenCache
+from accent_folding import has_accents
+from tokenizer_backends import MAX_COMPOUND_SYLLABLES
+from ngram_index import DEFAULT_MAX_DISTANCE, DEFAULT_MAX_CANDIDATES
+from postings import intersect_positions, min_position_distance, UnionCursor, NO_MORE_DOCS
+from ingredients import normalize_ingredient
+from attributes import ATTRIBUTES, parse_filters, facet_counts
+from bitmap import Bitmap
+from vector_scoring import VectorScorer, VECTOR_METHODS
+
+
+# Truy vấn tiền tố: từ kết thúc bằng dấu * (ví dụ: "bánh*")
+PREFIX_PATTERN = re.compile(r'(\w+)\*')
+
+# Cụm từ chính xác: đặt trong dấu ngoặc kép (ví dụ: "canh chua")
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+
+# Chế độ truy vấn:
+#   'terms'     - túi từ (mặc định); cụm trong ngoặc kép vẫn bắt buộc khớp chính xác
+#   'phrase'    - cả phần query ngoài ngoặc kép cũng là một cụm từ
+#   'proximity' - như 'terms', cộng thêm điểm khi các term của query đứng gần nhau
+SEARCH_MODES = ('terms', 'phrase', 'proximity')
+
+# Điểm gần nhau: mỗi cặp term liền nhau trong query cách nhau d <= PROXIMITY_WINDOW vị trí
+# trong tài liệu được cộng PROXIMITY_WEIGHT * min(idf) / d
+PROXIMITY_WINDOW = 8
+PROXIMITY_WEIGHT = 1.0
+
+# Số term tối đa được mở rộng từ một tiền tố (giữ các term xuất hiện nhiều nhất)
+MAX_PREFIX_EXPANSIONS = 50
+
+# Hệ số điểm của term có dấu tìm được từ query không dấu ("pho" -> "phở"),
+# để tài liệu khớp đúng dạng người dùng gõ xếp trên tài liệu chỉ khớp sau khi gấp dấu
+FOLDED_MATCH_WEIGHT = 0.5
+
+# Term không có trong index (gõ sai) được thay bằng tối đa MAX_FUZZY_EXPANSIONS term gần đúng nhất
+# (ưu tiên df lớn), điểm nhân FUZZY_MATCH_WEIGHT
+MAX_FUZZY_EXPANSIONS = 3
+FUZZY_MATCH_WEIGHT = 0.5
+
+# Phương pháp xếp hạng: Python ('tfidf', 'bm25', 'bm25f') và vector hóa bằng NumPy (xem vector_scoring)
+RANKING_METHODS = ('bm25', 'bm25f', 'tfidf') + tuple(VECTOR_METHODS)
+
+# Cắt tỉa MaxScore chỉ bỏ tài liệu có cận trên nhỏ hơn ngưỡng top K quá khoảng này
+# (tương đối), để sai số làm tròn float không loại nhầm tài liệu bằng điểm
+PRUNING_SLACK = 1e-9
 
 
 class SearchEngine:
     """
     Class tìm kiếm và xếp hạng kết quả
     """
-    def __init__(self, inverted_index, documents):
+    def __init__(self, inverted_index, documents, text_processor=None):
         """
         Args:
             inverted_index: InvertedIndex object
             documents: danh sách tài liệu gốc
+            text_processor: TextProcessor xử lý query (mặc định có cache LRU trong bộ nhớ
+                            và cùng backend tách từ với index)
         """
         self.index = inverted_index
-        self.documents = {doc['url']: doc for doc in documents}
-        self.text_processor = TextProcessor()
+        # Kho công thức theo ordinal của index (xem doc_ids), công thức không có trong index bị bỏ qua
+        self.documents = [None] * len(inverted_index.doc_lengths)
+        for doc in documents:
+            doc_ordinal = inverted_index.find_ordinal(doc['url'])
+            if doc_ordinal is not None and self.documents[doc_ordinal] is None:
+                self.documents[doc_ordinal] = doc
+        if text_processor is None:
+            text_processor = TextProcessor(cache=TokenCache(memory_entries=10000),
+                                           tokenizer=inverted_index.text_processor.tokenizer)
+        self.text_processor = text_processor
+        # Bộ chấm điểm NumPy, tạo khi dùng phương pháp vector hóa lần đầu
+        self.vector_scorer = None
+        self.vector_scorer_lock = threading.Lock()
     
-    def calculate_tf_idf(self, term_freq, doc_id, term):
+    def get_document(self, url):
+        """
+        Công thức theo URL (có hoặc không có tham số theo dõi), None nếu không có
+        """
+        doc_ordinal = self.index.find_ordinal(url)
+        return self.documents[doc_ordinal] if doc_ordinal is not None else None
+
+    def calculate_tf_idf(self, term_freq, doc_ordinal, term, idf=None):
         """
         Tính TF-IDF score
         TF-IDF = TF * IDF
         TF = (term frequency in document)
-        IDF = log(N / df)
+        IDF = log(N / df), truyền sẵn từ bảng thống kê term nếu có
         """
         # TF (normalized)
-        doc_length = self.index.doc_lengths.get(doc_id, 1)
+        doc_length = self.index.doc_lengths[doc_ordinal]
         tf = term_freq / doc_length if doc_length > 0 else 0
         
         # IDF
-        idf = self.index.get_idf(term)
+        if idf is None:
+            idf = self.index.get_idf(term)
         
         # TF-IDF
         return tf * idf
     
-    def calculate_bm25(self, term_freq, doc_id, term, k1=1.5, b=0.75):
+    def calculate_bm25(self, term_freq, doc_ordinal, term, k1=1.5, b=0.75, idf=None):
         """
         Tính BM25 score (thuật toán xếp hạng tốt hơn TF-IDF)
         BM25 = IDF * (f(qi, D) * (k1 + 1)) / (f(qi, D) + k1 * (1 - b + b * |D| / avgdl))
         
         Args:
             term_freq: tần suất term trong tài liệu
-            doc_id: ID tài liệu
+            doc_ordinal: ordinal của tài liệu trong index
             term: từ khóa
             k1: tham số điều chỉnh (thường 1.2-2.0)
             b: tham số điều chỉnh độ dài tài liệu (0-1)
+            idf: IDF lấy sẵn từ bảng thống kê term (None = tra cứu theo term)
         """
         # IDF
-        idf = self.index.get_idf(term)
+        if idf is None:
+            idf = self.index.get_idf(term)
         
         # Document length normalization
-        doc_length = self.index.doc_lengths.get(doc_id, 1)
+        doc_length = self.index.doc_lengths[doc_ordinal]
         avg_doc_length = self.index.avg_doc_length
         
         # BM25 formula
@@ -72,59 +148,615 @@ class SearchEngine:
         
         return bm25_score
     
-    def search(self, query, top_k=10, method='bm25'):
+    def calculate_bm25f(self, field_freqs, doc_ordinal, term, k1=1.2, b=0.75, idf=None):
         """
-        Tìm kiếm và xếp hạng kết quả
+        Tính BM25F score: chuẩn hóa tần suất theo độ dài của từng trường rồi mới bão hòa
+        tf~ = sum_f w_f * tf_f / (1 - b + b * |D_f| / avgdl_f)
+        BM25F = IDF * tf~ * (k1 + 1) / (tf~ + k1)
         
         Args:
-            query: câu truy vấn
-            top_k: số kết quả trả về
-            method: phương pháp xếp hạng ('tfidf' hoặc 'bm25')
+            field_freqs: tần suất term trong từng trường của tài liệu
+            doc_ordinal: ordinal của tài liệu trong index
+            term: từ khóa
+            k1: tham số bão hòa tần suất
+            b: tham số chuẩn hóa độ dài trường (0-1)
+            idf: IDF lấy sẵn từ bảng thống kê term (None = tra cứu theo term)
+        """
+        if idf is None:
+            idf = self.index.get_idf(term)
+        
+        field_count = len(field_freqs)
+        field_lengths = self.index.field_lengths
+        base = doc_ordinal * field_count
+        
+        weighted_tf = 0.0
+        for field, tf in enumerate(field_freqs):
+            if tf == 0:
+                continue
+            avg_length = self.index.avg_field_lengths[field]
+            length_norm = 1 - b + b * (field_lengths[base + field] / avg_length) if avg_length > 0 else 1
+            weighted_tf += self.index.field_weights[field] * tf / length_norm
+        
+        return idf * weighted_tf * (k1 + 1) / (weighted_tf + k1)
+    
+    def expand_prefix(self, prefix, limit=MAX_PREFIX_EXPANSIONS):
+        """
+        Mở rộng tiền tố thành các term trong từ điển đã sắp xếp (không quét toàn bộ từ điển);
+        nếu quá nhiều thì giữ limit term có df lớn nhất
+        """
+        candidates = []
+        for term in self.index.terms_with_prefix(prefix):
+            df = self.index.get_term_statistics(term).df
+            if df > 0:
+                candidates.append((df, term))
+        candidates.sort(key=lambda x: (-x[0], x[1]))
+        return [term for _, term in candidates[:limit]]
+    
+    def expand_folded_prefix(self, prefix, limit=MAX_PREFIX_EXPANSIONS):
+        """
+        Mở rộng tiền tố không dấu qua các dạng bỏ dấu đã sắp xếp của index: "banh" -> "bánh",
+        "bánh_xèo", ... (tìm khoảng, không quét từ điển); nếu quá nhiều thì giữ limit term có df lớn nhất
+        """
+        if has_accents(prefix):
+            return []  # người dùng đã gõ dấu: chỉ khớp đúng dạng
+        candidates = []
+        for term in self.index.terms_with_folded_prefix(prefix):
+            df = self.index.get_term_statistics(term).df
+            if df > 0:
+                candidates.append((df, term))
+        candidates.sort(key=lambda x: (-x[0], x[1]))
+        return [term for _, term in candidates[:limit]]
+    
+    def expand_folded(self, query_terms):
+        """
+        Mở rộng các cụm âm tiết không dấu liên tiếp của query (tối đa MAX_COMPOUND_SYLLABLES
+        âm tiết) thành các term có dấu qua bảng gấp dấu của index: "pho bo" -> "phở_bò", "phở", "bò", ...
+        Mỗi cụm là một lần tra cứu trực tiếp, không quét từ điển
+        """
+        # Từ ghép trong index nối âm tiết bằng '_' (bánh_xèo): tra cụm "banh xeo" theo khóa "banh_xeo"
+        syllables = [syllable for term in query_terms for syllable in term.replace('_', ' ').split()]
+        expanded = []
+        for start in range(len(syllables)):
+            for end in range(start + 1, min(len(syllables), start + MAX_COMPOUND_SYLLABLES) + 1):
+                if has_accents(syllables[end - 1]):
+                    break  # người dùng đã gõ dấu: giữ nguyên
+                for term in self.index.get_folded_terms('_'.join(syllables[start:end])):
+                    if term not in query_terms and term not in expanded:
+                        expanded.append(term)
+        return expanded
+    
+    def phrase_slots(self, phrase, accent_insensitive=True):
+        """
+        Các vị trí của cụm từ, mỗi vị trí là tuple các term được chấp nhận: term gõ và các term có dấu
+        cùng dạng bỏ dấu ("pho" -> ("pho", "phở")). Các âm tiết không dấu liên tiếp được ghép thành
+        từ ghép có dấu (cụm dài nhất trong bảng gấp dấu) chỉ khi bộ tách từ cũng ghép dạng có dấu,
+        để "pho bo" chia vị trí giống hệt "phở bò"; term có dấu giữ nguyên
+        """
+        if not accent_insensitive:
+            return [(term,) for term in phrase]
+        # (âm tiết hoặc term có dấu, có gấp dấu được không)
+        units = []
+        for term in phrase:
+            if has_accents(term):
+                units.append((term, False))
+            else:
+                units.extend((syllable, True) for syllable in term.replace('_', ' ').split())
+        slots = []
+        start = 0
+        while start < len(units):
+            term, foldable = units[start]
+            if not foldable:
+                slots.append((term,))
+                start += 1
+                continue
+            for end in range(min(len(units), start + MAX_COMPOUND_SYLLABLES), start, -1):
+                if not all(foldable for _, foldable in units[start:end]):
+                    continue
+                key = '_'.join(syllable for syllable, _ in units[start:end])
+                slot = tuple(candidate for candidate in self.index.get_folded_terms(key) if candidate != key)
+                if end == start + 1:
+                    slot = (key,) + slot
+                else:
+                    slot = tuple(candidate for candidate in slot
+                                 if self.text_processor.process(candidate.replace('_', ' ')) == [candidate])
+                if slot:
+                    slots.append(slot)
+                    break
+            start = end
+        return slots
+    
+    def expand_fuzzy(self, query_terms, max_distance=DEFAULT_MAX_DISTANCE, max_candidates=DEFAULT_MAX_CANDIDATES):
+        """
+        Tìm term gần đúng (chỉ mục trigram + khoảng cách sửa) cho các term của query không có
+        trong index và không khớp được sau khi gấp dấu
+        """
+        expanded = []
+        for term in query_terms:
+            if self.index.get_term_statistics(term).df > 0 or self.index.get_folded_terms(term):
+                continue
+            similar = self.index.get_similar_terms(term, max_distance, max_candidates)
+            if not similar:
+                continue
+            # Chỉ giữ các term gần nhất, ưu tiên term xuất hiện nhiều
+            best = similar[0][0]
+            candidates = [(self.index.get_term_statistics(t).df, t) for d, t in similar if d == best]
+            candidates.sort(key=lambda x: (-x[0], x[1]))
+            for _, t in candidates[:MAX_FUZZY_EXPANSIONS]:
+                if t not in query_terms and t not in expanded:
+                    expanded.append(t)
+        return expanded
+    
+    def phrase_documents(self, phrase_terms):
+        """
+        Các tài liệu chứa cụm term liên tiếp phrase_terms; mỗi vị trí của cụm là tuple các term
+        được chấp nhận (xem phrase_slots), nhiều term thì duyệt hợp các posting list bằng UnionCursor.
+        Giao các posting list bằng PostingCursor.advance (nhảy qua khối theo skip entries,
+        vị trí hiếm nhất dẫn đầu); với tài liệu chung, trộn danh sách vị trí theo thứ tự df tăng dần
+        và dừng ngay khi không còn vị trí bắt đầu nào khớp
+        
+        Returns:
+            dict: {doc_ordinal: số lần cụm từ xuất hiện}
+        """
+        def slot_df(item):
+            return sum(self.index.get_term_statistics(term).df for term in item[1])
+        
+        terms = sorted(enumerate(phrase_terms), key=slot_df)
+        cursors = []
+        for _, slot in terms:
+            if len(slot) == 1:
+                cursors.append(self.index.get_term_cursor(slot[0]))
+            else:
+                cursors.append(UnionCursor([self.index.get_term_cursor(term) for term in slot]))
+        matches = {}
+        doc_ordinal = cursors[0].doc
+        while doc_ordinal != NO_MORE_DOCS:
+            # Mọi con trỏ phải cùng đứng ở doc_ordinal
+            for cursor in cursors[1:]:
+                found = cursor.advance(doc_ordinal)
+                if found != doc_ordinal:
+                    doc_ordinal = cursors[0].advance(found)
+                    break
+            else:
+                first_offset = terms[0][0]
+                starts = [p - first_offset for p in cursors[0].positions_of(doc_ordinal)
+                          if p >= first_offset]
+                for (offset, _), cursor in zip(terms[1:], cursors[1:]):
+                    starts = intersect_positions(starts, cursor.positions_of(doc_ordinal), offset)
+                    if not starts:
+                        break
+                if starts:
+                    matches[doc_ordinal] = len(starts)
+                doc_ordinal = cursors[0].next()
+        return matches
+    
+    def proximity_scores(self, doc_ordinals, query_terms):
+        """
+        Điểm gần nhau của các tài liệu: với mỗi cặp term liền nhau trong query, khoảng cách
+        nhỏ nhất giữa hai danh sách vị trí (trộn, dừng sớm khi hai term đứng sát nhau)
+        """
+        pairs = [(a, b) for a, b in zip(query_terms, query_terms[1:]) if a != b]
+        if not pairs:
+            return {}
+        postings = {term: self.index.get_term_postings(term) for pair in pairs for term in pair}
+        idfs = {term: self.index.get_term_statistics(term).idf for term in postings}
+        scores = {}
+        for doc_ordinal in doc_ordinals:
+            score = 0.0
+            for a, b in pairs:
+                distance = min_position_distance(postings[a].positions_of(doc_ordinal),
+                                                 postings[b].positions_of(doc_ordinal))
+                if distance is not None and distance <= PROXIMITY_WINDOW:
+                    score += PROXIMITY_WEIGHT * min(idfs[a], idfs[b]) / distance
+            if score > 0:
+                scores[doc_ordinal] = score
+        return scores
+    
+    def parse_query(self, query, accent_insensitive=True, max_edit_distance=DEFAULT_MAX_DISTANCE,
+                    fuzzy_candidates=DEFAULT_MAX_CANDIDATES, mode='terms'):
+        """
+        Phân tích query thành các term có trọng số (tiền tố, cụm từ, gấp dấu, gần đúng đã mở rộng)
         
         Returns:
-            list: danh sách kết quả đã xếp hạng
+            tuple: (weighted_terms, phrases, ordered_terms)
+                weighted_terms - list các cặp (term, trọng số) được tính điểm
+                phrases        - list các cụm phải xuất hiện liên tiếp; mỗi cụm là list các vị trí,
+                                 mỗi vị trí là tuple các term được chấp nhận (xem phrase_slots)
+                ordered_terms  - term của query theo thứ tự gõ (dùng cho điểm gần nhau)
         """
+        # Tách các tiền tố ra khỏi query
+        prefixes = [self.text_processor.normalize(prefix) for prefix in PREFIX_PATTERN.findall(query)]
+        if prefixes:
+            query = PREFIX_PATTERN.sub(' ', query)
+        
+        # Tách các cụm từ chính xác (chế độ 'phrase': cả phần còn lại là một cụm)
+        phrases = [self.text_processor.process(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+        if phrases:
+            query = PHRASE_PATTERN.sub(' ', query)
+        if mode == 'phrase' and query.strip():
+            phrases.append(self.text_processor.process(query))
+            query = ''
+        phrases = [phrase for phrase in phrases if phrase]
+        
         # Xử lý query giống như xử lý document
-        query_terms = self.text_processor.process(query)
+        query_terms = self.text_processor.process(query) if query.strip() else []
         
-        if not query_terms:
-            return []
+        # Term có dấu tương ứng với phần query không dấu
+        folded_terms = self.expand_folded(query_terms) if accent_insensitive else []
+        
+        # Term gõ sai được thay bằng term gần đúng
+        fuzzy_terms = (self.expand_fuzzy(query_terms, max_edit_distance, fuzzy_candidates)
+                       if max_edit_distance > 0 else [])
         
-        # Tính score cho mỗi document
+        # Term của các cụm từ được tính điểm như term thường; phần không dấu của cụm
+        # khớp thêm các term có dấu cùng dạng bỏ dấu (xem phrase_slots)
+        for phrase in phrases:
+            query_terms.extend(term for term in phrase if term not in query_terms)
+        phrases = [self.phrase_slots(phrase, accent_insensitive) for phrase in phrases]
+        for phrase in phrases:
+            folded_terms.extend(term for slot in phrase for term in slot
+                                if term not in query_terms and term not in folded_terms)
+        ordered_terms = list(query_terms)
+        
+        # Mỗi tiền tố được mở rộng thành các term khớp; tiền tố không dấu khớp thêm term có dấu
+        for prefix in prefixes:
+            query_terms.extend(term for term in self.expand_prefix(prefix) if term not in query_terms)
+            if accent_insensitive:
+                folded_terms.extend(term for term in self.expand_folded_prefix(prefix)
+                                    if term not in folded_terms)
+        
+        weighted_terms = [(term, 1.0) for term in query_terms]
+        weighted_terms += [(term, FOLDED_MATCH_WEIGHT) for term in folded_terms if term not in query_terms]
+        weighted_terms += [(term, FUZZY_MATCH_WEIGHT) for term in fuzzy_terms
+                           if term not in query_terms and term not in folded_terms]
+        return weighted_terms, phrases, ordered_terms
+    
+    def filter_documents(self, include=(), exclude=(), ranges=None):
+        """
+        Tập tài liệu thỏa các bộ lọc: AND bitmap các nguyên liệu bắt buộc và các khoảng
+        thuộc tính số, rồi ANDNOT bitmap các nguyên liệu loại trừ (trước khi chấm điểm)
+        
+        Args:
+            include, exclude: key nguyên liệu đã chuẩn hóa (xem ingredients.normalize_ingredient)
+            ranges: {thuộc tính: (nhỏ nhất, lớn nhất)} (xem attributes.parse_filters)
+        
+        Returns:
+            Bitmap các ordinal được phép, None nếu không có bộ lọc
+        """
+        if not include and not exclude and not ranges:
+            return None
+        bitmaps = [self.index.get_ingredient_bitmap(key) for key in include]
+        bitmaps += [self.index.get_attribute_bitmap(name, low, high) for name, (low, high) in (ranges or {}).items()]
+        # AND từ bitmap nhỏ nhất để các bước sau chỉ còn ít phần tử
+        bitmaps.sort(key=len)
+        allowed = bitmaps[0] if bitmaps else Bitmap.full(len(self.index.doc_lengths))
+        for bitmap in bitmaps[1:]:
+            allowed = allowed & bitmap
+        for key in exclude:
+            if not allowed:
+                break
+            allowed = allowed - self.index.get_ingredient_bitmap(key)
+        return allowed
+        
+    def score_query(self, weighted_terms, phrases, ordered_terms, method='bm25', mode='terms', allowed=None):
+        """
+        Tính điểm các tài liệu cho một query đã phân tích (xem parse_query)
+        
+        Args:
+            allowed: Bitmap các ordinal được phép (filter_documents), None = mọi tài liệu
+        
+        Returns:
+            dict: {doc_ordinal: score}
+        """
+        # Tính score cho mỗi document (key theo ordinal)
         doc_scores = defaultdict(float)
+        # Bitset phẳng để kiểm tra bộ lọc ngay trong vòng lặp postings
+        mask = allowed.to_mask(len(self.index.doc_lengths)) if allowed is not None else None
         
-        for term in query_terms:
-            posting_list = self.index.get_posting_list(term)
+        for term, weight in weighted_terms:
+            # Term của query đã được xử lý: tra cứu trực tiếp, IDF lấy một lần cho mỗi term
+            idf = self.index.get_term_statistics(term).idf
+            posting_list = self.index.get_term_postings(term)
+            field_count = posting_list.field_count
             
-            for posting in posting_list:
-                doc_id = posting['doc_id']
-                term_freq = posting['frequency']
-                
-                # Tính score theo phương pháp được chọn
-                if method == 'tfidf':
-                    score = self.calculate_tf_idf(term_freq, doc_id, term)
-                else:  # bm25
-                    score = self.calculate_bm25(term_freq, doc_id, term)
-                
-                doc_scores[doc_id] += score
+            # Mỗi tài liệu chỉ có một posting cho mỗi term; postings nén được giải nén từng khối
+            for doc_ordinals, frequencies, field_freqs in posting_list.iter_blocks():
+                for j, doc_ordinal in enumerate(doc_ordinals):
+                    if mask is not None and not mask[doc_ordinal >> 3] >> (doc_ordinal & 7) & 1:
+                        continue
+                    # Tính score theo phương pháp được chọn
+                    if method == 'tfidf':
+                        score = self.calculate_tf_idf(frequencies[j], doc_ordinal, term, idf=idf)
+                    elif method == 'bm25f':
+                        score = self.calculate_bm25f(
+                            field_freqs[j * field_count:(j + 1) * field_count], doc_ordinal, term, idf=idf)
+                    else:  # bm25
+                        score = self.calculate_bm25(frequencies[j], doc_ordinal, term, idf=idf)
+                    
+                    doc_scores[doc_ordinal] += weight * score
+        
+        # Chỉ giữ tài liệu chứa đủ các cụm từ
+        for phrase in phrases:
+            matches = self.phrase_documents(phrase)
+            doc_scores = {d: score for d, score in doc_scores.items() if d in matches}
+        
+        # Cộng điểm gần nhau
+        if mode == 'proximity':
+            for doc_ordinal, score in self.proximity_scores(doc_scores, ordered_terms).items():
+                doc_scores[doc_ordinal] += score
+        
+        return doc_scores
+    
+    def top_k_maxscore(self, weighted_terms, top_k, mask=None, required=()):
+        """
+        Top K theo BM25 với heap K phần tử và cắt tỉa MaxScore thay vì chấm điểm mọi posting:
+        các term xếp theo cận trên điểm (trọng số * max_score của con trỏ) tăng dần; các term đầu có
+        tổng cận trên chưa tới ngưỡng (điểm thấp nhất trong heap) là term không thiết yếu - tài liệu
+        chỉ chứa chúng không thể vào top K. Tài liệu được duyệt theo cửa sổ ordinal (tới cuối khối
+        sớm nhất của các term thiết yếu):
+            - cận trên theo khối (block-max) của cả cửa sổ chưa tới ngưỡng: bỏ qua nguyên cửa sổ
+            - posting của các term thiết yếu trong cửa sổ được chấm điểm liền một mạch trên khối
+              đã giải nén; term không thiết yếu chỉ advance tới các tài liệu còn có thể vào top K,
+              cận trên lớn trước, và dừng ngay khi điểm đã tính cộng cận trên phần còn lại không tới ngưỡng
+        
+        Điểm cộng theo thứ tự term của query và tài liệu bằng điểm xếp theo thứ tự gặp lần đầu
+        như score_query, nên kết quả giống hệt score_query + sorted
+        
+        Args:
+            weighted_terms: list các cặp (term, trọng số) (xem parse_query)
+            top_k: số kết quả
+            mask: bitset các ordinal được phép (Bitmap.to_mask), None = mọi tài liệu
+            required: các tập ordinal tài liệu phải thuộc (ví dụ tài liệu chứa cụm từ)
+        
+        Returns:
+            list: các cặp (ordinal, score) giảm dần theo score
+        """
+        if top_k <= 0:
+            return []
+        # (cận trên, vị trí term trong query, term, trọng số, idf, con trỏ), cận trên tăng dần
+        terms = []
+        for position, (term, weight) in enumerate(weighted_terms):
+            cursor = self.index.get_term_cursor(term)
+            if cursor.doc != NO_MORE_DOCS:
+                terms.append((weight * cursor.max_score(), position, term, weight, cursor.idf, cursor))
+        terms.sort(key=lambda t: (t[0], t[1]))
+        cumulative = list(accumulate(t[0] for t in terms))  # tổng cận trên của terms[:i + 1]
+        
+        heap = []       # (score, -vị trí term đầu tiên, -ordinal): phần tử đầu là kết quả kém nhất
+        limit = -1.0    # điểm tối thiểu để có thể vào top K (heap chưa đầy: mọi tài liệu)
+        essential = 0   # terms[:essential] là term không thiết yếu
+        while True:
+            live = [t for t in terms[essential:] if t[5].doc != NO_MORE_DOCS]
+            if not live:
+                break
+            window_end = min(t[5].block_end() for t in live)
+            boundary = essential
+            rest = cumulative[boundary - 1] if boundary else 0.0
+            if rest + sum(t[3] * t[5].block_max_score() for t in live) < limit:
+                for t in live:
+                    t[5].advance(window_end + 1)
+                continue
+        
+            # Điểm các term thiết yếu trong cửa sổ: {ordinal: [(vị trí term, điểm)]} theo thứ tự term của query
+            window = defaultdict(list)
+            for _, position, term, weight, idf, cursor in sorted(live, key=lambda t: t[1]):
+                doc_ordinals, frequencies, start = cursor.doc_ordinals, cursor.frequencies, cursor.i
+                for j in range(start, bisect.bisect_right(doc_ordinals, window_end, start)):
+                    window[doc_ordinals[j]].append(
+                        (position, weight * self.calculate_bm25(frequencies[j], doc_ordinals[j], term, idf=idf)))
+                cursor.advance(window_end + 1)
+        
+            for doc_ordinal in sorted(window):
+                if mask is not None and not mask[doc_ordinal >> 3] >> (doc_ordinal & 7) & 1:
+                    continue
+                scores = window[doc_ordinal]
+                partial = 0.0
+                for _, score in scores:
+                    partial += score
+                if partial + rest < limit or not all(doc_ordinal in matches for matches in required):
+                    continue
+                # Term không thiết yếu: cận trên lớn trước, dừng khi không thể vượt ngưỡng
+                for i in range(boundary - 1, -1, -1):
+                    if partial + cumulative[i] < limit:
+                        break
+                    _, position, term, weight, idf, cursor = terms[i]
+                    if cursor.advance(doc_ordinal) == doc_ordinal:
+                        score = weight * self.calculate_bm25(cursor.frequency, doc_ordinal, term, idf=idf)
+                        scores.append((position, score))
+                        partial += score
+                else:
+                    scores.sort()
+                    total = 0.0
+                    for _, score in scores:
+                        total += score
+                    entry = (total, -scores[0][0], -doc_ordinal)
+                    if len(heap) < top_k:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+                    if len(heap) == top_k:
+                        # Chừa sai số làm tròn để không bỏ nhầm tài liệu bằng điểm
+                        limit = heap[0][0] - PRUNING_SLACK * (1.0 + heap[0][0])
+        
+            while essential < len(terms) and cumulative[essential] < limit:
+                essential += 1
+        
+        return [(-negative_ordinal, score) for score, _, negative_ordinal in sorted(heap, reverse=True)]
+    
+    def match_bitmap(self, weighted_terms, required=(), allowed=None):
+        """
+        Tập kết quả của query (tài liệu chứa ít nhất một term, thuộc mọi tập required và allowed),
+        cùng tập khóa với score_query nhưng không tính điểm: OR bitmap ordinal các posting list
+        
+        Returns:
+            Bitmap các ordinal khớp
+        """
+        bitmaps = []
+        for term, _ in weighted_terms:
+            doc_ordinals = array('I')
+            for block_ordinals in self.index.get_term_postings(term).iter_doc_ordinals():
+                doc_ordinals.extend(block_ordinals)
+            bitmaps.append(Bitmap.from_sorted(doc_ordinals))
+        matches = Bitmap.union(bitmaps)
+        for doc_ordinals in required:
+            matches = matches & Bitmap.from_sorted(sorted(doc_ordinals))
+        if allowed is not None:
+            matches = matches & allowed
+        return matches
+    
+    def rank_vectorized(self, weighted_terms, phrases, ordered_terms, method='bm25', mode='terms', top_k=10,
+                        allowed=None, facets=()):
+        """
+        Như rank_documents nhưng chấm điểm cả posting list bằng NumPy (xem vector_scoring);
+        method là phương pháp Python tương ứng ('bm25' hoặc 'tfidf'), kết quả giống hệt
+        """
+        scorer = self.vector_scorer
+        if scorer is None:
+            with self.vector_scorer_lock:
+                if self.vector_scorer is None:
+                    self.vector_scorer = VectorScorer(self.index)
+                scorer = self.vector_scorer
+        required = [self.phrase_documents(phrase) for phrase in phrases]
+        scores, matched, first_terms = scorer.score(weighted_terms, method, allowed, required)
+        matches = scorer.matched_ordinals(matched)
+        
+        # Cộng điểm gần nhau
+        if mode == 'proximity':
+            for doc_ordinal, score in self.proximity_scores(matches, ordered_terms).items():
+                scores[doc_ordinal] += score
+        
+        top_results = scorer.top_k(scores, matched, first_terms, top_k)
+        facet_table = {}
+        if facets:
+            facet_table = facet_counts(self.index, Bitmap.from_sorted(matches), facets)
+        return top_results, len(matches), facet_table
+    
+    def rank_documents(self, weighted_terms, phrases, ordered_terms, method='bm25', mode='terms', top_k=10,
+                       allowed=None, facets=(), count=True):
+        """
+        Top K của một query đã phân tích, kèm tổng số tài liệu khớp và bảng facet
+        
+        BM25 không có điểm gần nhau dùng top_k_maxscore (cắt tỉa MaxScore, kết quả giống hệt
+        chấm điểm toàn bộ); các phương pháp còn lại chấm điểm mọi posting (score_query) rồi sắp xếp
+        
+        Args:
+            allowed: Bitmap các ordinal được phép (filter_documents), None = mọi tài liệu;
+                     không có term nào thì tập kết quả chính là allowed (score 0)
+            facets: các thuộc tính cần đếm facet trên toàn bộ tập kết quả
+            count: cần tổng số tài liệu khớp; False (và không có facet) thì bỏ qua bước duyệt
+                   toàn bộ posting list để đếm, tổng trả về là None
+        
+        Returns:
+            tuple: (các cặp (ordinal, score) giảm dần theo score, tổng số tài liệu khớp,
+                    {thuộc tính: {nhãn nhóm: số tài liệu}})
+        """
+        if not weighted_terms:
+            # Chỉ lọc (nguyên liệu / thuộc tính), theo thứ tự trong index
+            matches = allowed if allowed is not None else Bitmap()
+            top_results = [(doc_ordinal, 0.0) for doc_ordinal in islice(matches, top_k)]
+            return top_results, len(matches), facet_counts(self.index, matches, facets)
+        
+        if method in VECTOR_METHODS:
+            return self.rank_vectorized(weighted_terms, phrases, ordered_terms, VECTOR_METHODS[method], mode,
+                                        top_k, allowed, facets)
+        
+        if method == 'bm25' and mode != 'proximity':
+            required = [self.phrase_documents(phrase) for phrase in phrases]
+            mask = allowed.to_mask(len(self.index.doc_lengths)) if allowed is not None else None
+            top_results = self.top_k_maxscore(weighted_terms, top_k, mask, required)
+            if not count and not facets:
+                return top_results, None, {}
+            # Tập kết quả đầy đủ (tổng, facet) lấy từ bitmap, không tính điểm
+            matches = self.match_bitmap(weighted_terms, required, allowed)
+            return top_results, len(matches), facet_counts(self.index, matches, facets)
         
         # Sắp xếp theo score giảm dần
+        doc_scores = self.score_query(weighted_terms, phrases, ordered_terms, method, mode, allowed)
         ranked_results = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
         
         # Lấy top K kết quả
         top_results = ranked_results[:top_k]
         
-        # Tạo kết quả chi tiết
+        # Facet trên toàn bộ tập kết quả: một bitmap rồi AND với bitmap từng nhóm
+        facet_table = {}
+        if facets:
+            facet_table = facet_counts(self.index, Bitmap.from_sorted(sorted(doc_scores)), facets)
+        return top_results, len(doc_scores), facet_table
+    
+    def search(self, query, top_k=10, method='bm25', accent_insensitive=True,
+               max_edit_distance=DEFAULT_MAX_DISTANCE, fuzzy_candidates=DEFAULT_MAX_CANDIDATES,
+               mode='terms', include_ingredients=(), exclude_ingredients=(), filters=None):
+        """
+        Tìm kiếm và xếp hạng kết quả
+        
+        Args:
+            query: câu truy vấn (từ kết thúc bằng * là truy vấn tiền tố, ví dụ "bánh*";
+                   cụm trong ngoặc kép phải xuất hiện liên tiếp, ví dụ "canh chua")
+            top_k: số kết quả trả về
+            method: phương pháp xếp hạng ('tfidf', 'bm25', 'bm25f' hoặc bản NumPy 'tfidf_numpy',
+                    'bm25_numpy', xem RANKING_METHODS)
+            accent_insensitive: tìm cả term có dấu cho phần query gõ không dấu
+                                (điểm nhân FOLDED_MATCH_WEIGHT)
+            max_edit_distance: khoảng cách sửa tối đa khi tìm gần đúng term gõ sai (0 = tắt)
+            fuzzy_candidates: số ứng viên tối đa được kiểm tra cho mỗi term gõ sai
+            mode: chế độ truy vấn ('terms', 'phrase' hoặc 'proximity', xem SEARCH_MODES)
+            include_ingredients: tên nguyên liệu bắt buộc có (ví dụ ["tôm", "hành"])
+            exclude_ingredients: tên nguyên liệu không được có (ví dụ ["đậu phộng"])
+            filters: điều kiện lọc khoảng trên thuộc tính số, ví dụ ["cook_time<=30", "servings>=4"]
+                     (xem attributes.parse_filters)
+        
+        Returns:
+            list: danh sách kết quả đã xếp hạng; query rỗng kèm nguyên liệu bắt buộc hoặc
+                  điều kiện lọc khoảng trả về các tài liệu thỏa bộ lọc (score 0) theo thứ tự trong index
+        """
+        return self.search_faceted(query, top_k, method, accent_insensitive, max_edit_distance, fuzzy_candidates,
+                                   mode, include_ingredients, exclude_ingredients, filters, facets=(),
+                                   count=False)['results']
+    
+    def search_faceted(self, query, top_k=10, method='bm25', accent_insensitive=True,
+                       max_edit_distance=DEFAULT_MAX_DISTANCE, fuzzy_candidates=DEFAULT_MAX_CANDIDATES,
+                       mode='terms', include_ingredients=(), exclude_ingredients=(), filters=None,
+                       facets=ATTRIBUTES, count=True):
+        """
+        Như search, kèm tổng số tài liệu khớp và số tài liệu trong từng nhóm facet
+        (xem attributes.FACET_BUCKETS) trên toàn bộ tập kết quả, không chỉ top K
+        
+        Args:
+            facets: các thuộc tính cần đếm facet
+            count: cần tổng số tài liệu khớp (False: 'total' là None khi không đếm facet)
+        
+        Returns:
+            dict: {'results': danh sách kết quả, 'total': số tài liệu khớp,
+                   'facets': {thuộc tính: {nhãn nhóm: số tài liệu}}}
+        """
+        weighted_terms, phrases, ordered_terms = self.parse_query(
+            query, accent_insensitive, max_edit_distance, fuzzy_candidates, mode)
+        include = [key for key in map(normalize_ingredient, include_ingredients) if key]
+        exclude = [key for key in map(normalize_ingredient, exclude_ingredients) if key]
+        ranges = parse_filters(filters)
+        if not weighted_terms and not include and not ranges:
+            return {'results': [], 'total': 0, 'facets': {}}
+        
+        if hasattr(self.index, 'search_shards'):
+            # Index chia shard (ShardSet): mỗi shard tìm trong process riêng, gộp top K và facet
+            top_results, total, facet_table = self.index.search_shards(
+                weighted_terms, phrases, ordered_terms, method, mode, top_k, include, exclude, ranges, facets, count)
+        else:
+            top_results, total, facet_table = self.rank_documents(
+                weighted_terms, phrases, ordered_terms, method, mode, top_k,
+                self.filter_documents(include, exclude, ranges), facets, count)
+        
+        # Tạo kết quả chi tiết: ordinal -> công thức và URL chuẩn
         results = []
-        for doc_id, score in top_results:
-            doc = self.documents.get(doc_id)
+        for doc_ordinal, score in top_results:
+            doc = self.documents[doc_ordinal]
             if doc:
+                doc_id = self.index.get_doc_id(doc_ordinal)
                 result = {
                     'doc_id': doc_id,
                     'score': score,
                     'title': doc.get('title', ''),
                     'description': doc.get('description', ''),
-                    'url': doc.get('url', ''),
+                    'url': doc_id,
                     'ingredients': doc.get('ingredients', []),
                     'instructions': doc.get('instructions', []),
                     'prep_time': doc.get('prep_time', ''),
@@ -133,7 +765,7 @@ class SearchEngine:
                 }
                 results.append(result)
         
-        return results
+        return {'results': results, 'total': total, 'facets': facet_table}
     
     def highlight_keywords(self, text, query):
         """
@@ -195,14 +827,12 @@ def demo_search():
     base_dir = os.path.dirname(script_dir)
     
     # Load index và documents
-    index_file = os.path.join(base_dir, 'index', 'inverted_index.json')
     data_file = os.path.join(base_dir, 'data', 'recipes.json')
     
     print("\n📂 Đang tải dữ liệu...")
     
-    # Load inverted index
-    inverted_index = InvertedIndex()
-    inverted_index.load(index_file)
+    # Load inverted index (index phân đoạn nếu có)
+    inverted_index = load_index(os.path.join(base_dir, 'index'))
     
     # Load documents
     with open(data_file, 'r', encoding='utf-8') as f:
@@ -0,0 +1,295 @@
+"""
+MODULE 3: TÌM KIẾM SONG SONG TRÊN INDEX CHIA SHARD (SCATTER-GATHER)
+Mục tiêu: Giảm độ trễ truy vấn (nhất là độ trễ đuôi p95/p99) trên tập công thức lớn
+bằng cách tìm đồng thời trên N shard, mỗi shard trong một worker process riêng
+
+Luồng một truy vấn:
+    1. Process chính phân tích query (tiền tố, gấp dấu, gần đúng) trên từ điển gộp của
+       mọi shard và tính thống kê toàn cục của các term: df = tổng df các shard, N và avgdl
+       trên toàn bộ tài liệu. Nhờ vậy IDF và chuẩn hóa độ dài giống hệt index không chia.
+    2. Scatter: gửi query đã phân tích kèm thống kê toàn cục tới mọi worker, gắn mã request
+       để nhiều truy vấn (nhiều thread của web) cùng chờ trên một worker mà không lẫn kết quả.
+    3. Mỗi worker chấm điểm trên shard của mình (cùng code với SearchEngine) và trả về top K.
+    4. Gather: trộn các top K cục bộ bằng heap thành top K toàn cục.
+
+Worker chết giữa chừng: các truy vấn đang chờ nó báo lỗi rõ ràng, truy vấn sau tạo lại worker.
+
+Index chia shard được build bằng module2_indexing/shards.py.
+"""
+
+import os
+import sys
+import heapq
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future
+
+# Import từ module 2
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'module2_indexing'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from shards import shard_paths, open_shard
+from segments import SegmentSnapshot
+from postings import PostingCursor
+from search_engine import SearchEngine
+from attributes import merge_facets
+
+
+class ShardView:
+    """
+    Giao diện đọc của một shard (như InvertedIndex) nhưng dùng thống kê toàn cục:
+    N, avgdl, độ dài trung bình từng trường và TermStats của các term trong query
+    """
+    def __init__(self, shard, global_stats, term_stats):
+        """
+        Args:
+            shard: InvertedIndex của shard
+            global_stats: (doc_count, avg_doc_length, avg_field_lengths) toàn cục
+            term_stats: {term: TermStats} toàn cục của các term trong query
+        """
+        self.shard = shard
+        self.text_processor = shard.text_processor
+        self.doc_lengths = shard.doc_lengths
+        self.field_lengths = shard.field_lengths
+        self.field_weights = shard.field_weights
+        self.doc_count, self.avg_doc_length, self.avg_field_lengths = global_stats
+        self.term_stats = term_stats
+
+    def get_term_statistics(self, term):
+        return self.term_stats[term]
+
+    def get_idf(self, term):
+        processed_term = self.text_processor.process(term)
+        if processed_term:
+            return self.term_stats[processed_term[0]].idf
+        return 0
+
+    def get_term_postings(self, term):
+        return self.shard.get_term_postings(term)
+
+    def get_term_cursor(self, term):
+        return PostingCursor(self.shard.get_term_postings(term), self.doc_lengths,
+                             self.term_stats[term].idf, self.avg_doc_length)
+
+    def get_ingredient_bitmap(self, key):
+        return self.shard.get_ingredient_bitmap(key)
+
+    def get_attribute_bitmap(self, name, low=None, high=None):
+        return self.shard.get_attribute_bitmap(name, low, high)
+
+
+def search_shard(shard, global_stats, request):
+    """
+    Chấm điểm một query đã phân tích trên một shard
+    Args:
+        shard: InvertedIndex của shard
+        global_stats: (doc_count, avg_doc_length, avg_field_lengths) toàn cục
+        request: (weighted_terms, phrases, ordered_terms, method, mode, top_k, term_stats,
+                  include, exclude, ranges, facets, count) - include / exclude là key nguyên liệu
+                  đã chuẩn hóa, ranges là khoảng thuộc tính số, facets là các thuộc tính cần đếm,
+                  count = cần số tài liệu khớp
+    Returns:
+        tuple: (top K cục bộ - các cặp (ordinal trong shard, score) giảm dần theo score,
+                số tài liệu khớp trên shard (None nếu không đếm), bảng facet của shard)
+    """
+    (weighted_terms, phrases, ordered_terms, method, mode, top_k, term_stats,
+     include, exclude, ranges, facets, count) = request
+    view = ShardView(shard, global_stats, term_stats)
+    engine = SearchEngine(view, [], text_processor=shard.text_processor)
+    # Bộ lọc tính trên ordinal của shard
+    allowed = engine.filter_documents(include, exclude, ranges)
+    return engine.rank_documents(weighted_terms, phrases, ordered_terms, method, mode, top_k, allowed, facets, count)
+
+
+def _shard_worker(shard_dir, global_stats, connection):
+    """
+    Vòng lặp của worker process: mở shard (mmap) một lần, nhận query, trả top K cục bộ
+    kèm mã request
+    """
+    shard = open_shard(shard_dir)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        request_id, request = message
+        try:
+            connection.send((request_id, True, search_shard(shard, global_stats, request)))
+        except Exception as e:
+            connection.send((request_id, False, f"{type(e).__name__}: {e}"))
+    connection.close()
+
+
+class ShardWorker:
+    """
+    Worker process của một shard. Nhiều thread gửi query cùng lúc: mỗi query gắn mã request,
+    một thread đọc nhận kết quả và trả về đúng Future của query đó, nên worker luôn có
+    việc trong hàng đợi còn process chính phân tích / gộp truy vấn khác
+    """
+    def __init__(self, shard_dir, global_stats):
+        self.shard_dir = shard_dir
+        self.global_stats = global_stats
+        self.lock = threading.Lock()  # bảo vệ pending và gửi qua pipe
+        self.closed = False
+        self._start()
+
+    def _start(self):
+        parent_end, child_end = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_shard_worker,
+                                               args=(self.shard_dir, self.global_stats, child_end), daemon=True)
+        self.process.start()
+        child_end.close()
+        self.connection = parent_end
+        self.pending = {}  # {mã request: Future} của worker hiện tại
+        self.alive = True
+        self.reader = threading.Thread(target=self._read, args=(parent_end, self.pending),
+                                       name='shard-reader', daemon=True)
+        self.reader.start()
+
+    def _read(self, connection, pending):
+        """
+        Nhận kết quả từ worker đến khi pipe đóng; khi đó mọi query còn chờ báo lỗi
+        """
+        while True:
+            try:
+                request_id, ok, reply = connection.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                future = pending.pop(request_id, None)
+            if future is not None:
+                future.set_result((ok, reply))
+        with self.lock:
+            if self.pending is pending:
+                self.alive = False
+            failed = list(pending.values())
+            pending.clear()
+        if failed and not self.closed:
+            print(f"❌ Worker của shard {self.shard_dir} đã dừng, {len(failed)} truy vấn bị hủy")
+        for future in failed:
+            future.set_exception(RuntimeError(f"Worker của shard {self.shard_dir} đã dừng giữa chừng"))
+
+    def submit(self, request_id, request):
+        """
+        Gửi một query tới worker (tạo lại worker nếu nó đã chết)
+        Returns:
+            Future: kết quả (ok, reply) của worker
+        """
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError(f"Shard {self.shard_dir} đã đóng")
+            if not self.alive:
+                self.connection.close()
+                self._start()
+                print(f"🔁 Đã khởi động lại worker của shard {self.shard_dir}")
+            try:
+                self.connection.send((request_id, request))
+            except (BrokenPipeError, OSError) as e:
+                # Thread đọc sẽ nhận EOF và báo lỗi các query khác đang chờ
+                self.alive = False
+                raise RuntimeError(f"Không gửi được truy vấn tới shard {self.shard_dir}: {e}") from e
+            self.pending[request_id] = future
+        return future
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        # Worker đóng pipe khi dừng: thread đọc nhận EOF và kết thúc
+        self.reader.join(timeout=5)
+        self.connection.close()
+
+
+class ShardSet:
+    """
+    Tập shard dùng trực tiếp làm index của SearchEngine: các thao tác đọc (tra từ điển,
+    thống kê term, mở rộng tiền tố / gấp dấu / gần đúng) đi qua ảnh gộp các shard trong
+    process chính, còn bước chấm điểm được phân tán tới worker của từng shard (search_shards)
+    """
+    def __init__(self, index_dir, parallel=True):
+        """
+        Args:
+            index_dir: thư mục index chia shard (chứa shards.json)
+            parallel: True = mỗi shard một worker process, False = tìm lần lượt trong process
+                      hiện tại (để so sánh độ trễ hoặc khi không tạo được process)
+        """
+        self.index_dir = index_dir
+        self.paths = shard_paths(index_dir)
+        self.shards = [open_shard(path) for path in self.paths]
+        # Ảnh gộp: từ điển và thống kê toàn cục (không có tài liệu bị xóa)
+        self.merged = SegmentSnapshot(self.shards, [()] * len(self.shards))
+        self.global_stats = (self.merged.doc_count, self.merged.avg_doc_length,
+                             list(self.merged.avg_field_lengths))
+        self.parallel = parallel
+        self.request_ids = itertools.count()
+        self.workers = [ShardWorker(path, self.global_stats) for path in self.paths] if parallel else []
+        print(f"📂 Đã mở index chia shard từ: {index_dir}")
+        print(f"   - Số shard: {len(self.shards)} ({'song song' if parallel else 'tuần tự'})")
+        print(f"   - Số tài liệu: {self.merged.doc_count}")
+
+    def __getattr__(self, name):
+        # Giao diện đọc còn lại (text_processor, doc_lengths, get_term_postings, ...) lấy từ ảnh gộp
+        if name == 'merged':
+            raise AttributeError(name)
+        return getattr(self.merged, name)
+
+    def search_shards(self, weighted_terms, phrases, ordered_terms, method='bm25', mode='terms', top_k=10,
+                      include=(), exclude=(), ranges=None, facets=(), count=True):
+        """
+        Scatter-gather một query đã phân tích (xem SearchEngine.parse_query); bộ lọc
+        (include / exclude: key nguyên liệu đã chuẩn hóa, ranges: khoảng thuộc tính số)
+        được tính trên từng shard, facet của các shard được cộng lại
+        Returns:
+            tuple: (top K toàn cục - các cặp (ordinal toàn cục, score) giảm dần theo score,
+                    tổng số tài liệu khớp (None nếu count=False và không đếm facet), bảng facet)
+        """
+        # Thống kê toàn cục của mọi term mà worker cần (kể cả term của cụm từ)
+        terms = {term for term, _ in weighted_terms}
+        terms.update(term for phrase in phrases for slot in phrase for term in slot)
+        term_stats = {term: self.merged.get_term_statistics(term) for term in terms}
+        request = (weighted_terms, phrases, ordered_terms, method, mode, top_k, term_stats,
+                   tuple(include), tuple(exclude), dict(ranges or {}), tuple(facets), count)
+
+        if not self.parallel:
+            partials = [search_shard(shard, self.global_stats, request) for shard in self.shards]
+        else:
+            # Không khóa: các truy vấn đồng thời cùng nằm trong hàng đợi của worker
+            request_id = next(self.request_ids)
+            futures = [worker.submit(request_id, request) for worker in self.workers]
+            partials = []
+            for future in futures:
+                ok, reply = future.result()
+                if not ok:
+                    raise RuntimeError(f"Lỗi khi tìm trên shard: {reply}")
+                partials.append(reply)
+
+        # Ordinal trong shard -> ordinal toàn cục của ảnh gộp (base của shard + ordinal)
+        top_results = heapq.nlargest(top_k, ((base + ordinal, score)
+                                             for base, (partial, _, _) in zip(self.merged.bases, partials)
+                                             for ordinal, score in partial),
+                                     key=lambda x: x[1])
+        counts = [shard_total for _, shard_total, _ in partials]
+        total = sum(counts) if None not in counts else None
+        return top_results, total, merge_facets(facets for _, _, facets in partials)
+
+    def close(self):
+        """
+        Dừng các worker process
+        """
+        self.parallel = False
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
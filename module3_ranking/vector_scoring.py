@@ -0,0 +1,170 @@
+"""
+MODULE 3: CHẤM ĐIỂM VECTOR HÓA BẰNG NUMPY (TÙY CHỌN)
+Mục tiêu: Tính BM25 / TF-IDF cho cả posting list trong một biểu thức NumPy thay vì
+gọi calculate_bm25 / calculate_tf_idf cho từng posting trong vòng lặp Python
+
+Mỗi truy vấn:
+    1. Posting list của từng term được nạp thành hai mảng (ordinal uint32, tần suất float64)
+       và giữ trong cache LRU (MAX_CACHED_TERMS term)
+    2. Điểm của cả mảng tính một lần trên mảng chuẩn hóa độ dài đã tính sẵn theo ordinal:
+           BM25:   idf * (tf * (k1 + 1) / (tf + k1 * (1 - b + b * |D| / avgdl)))
+           TF-IDF: (tf / |D|) * idf
+    3. Cộng dồn điểm các term bằng np.bincount (theo thứ tự term, giống score_query)
+    4. Top K bằng np.argpartition, rồi sắp xếp riêng K phần tử
+
+Các phép tính theo đúng thứ tự của SearchEngine nên điểm và thứ tự kết quả giống hệt
+phương pháp Python tương ứng. Chọn bằng tham số method ('bm25_numpy', 'tfidf_numpy').
+
+numpy là phụ thuộc tùy chọn (requirements.txt): không cài thì các phương pháp này báo lỗi,
+các phương pháp Python vẫn dùng được.
+"""
+
+import threading
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:  # numpy không bắt buộc
+    np = None
+
+
+# Phương pháp xếp hạng vector hóa -> phương pháp Python cho cùng điểm
+VECTOR_METHODS = {'bm25_numpy': 'bm25', 'tfidf_numpy': 'tfidf'}
+
+# Số posting list (dạng mảng NumPy) giữ lại giữa các truy vấn
+MAX_CACHED_TERMS = 256
+
+# Tham số BM25 (giống mặc định của SearchEngine.calculate_bm25)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class VectorScorer:
+    """
+    Chấm điểm một query đã phân tích trên toàn bộ index bằng mảng NumPy
+    """
+    def __init__(self, index, k1=BM25_K1, b=BM25_B, max_cached_terms=MAX_CACHED_TERMS):
+        """
+        Args:
+            index: index có doc_lengths, avg_doc_length, get_term_postings, get_term_statistics
+                   (InvertedIndex, SegmentSnapshot, ShardView, ...)
+            k1, b: tham số BM25
+            max_cached_terms: số posting list giữ trong cache
+        """
+        if np is None:
+            raise ValueError("Phương pháp xếp hạng NumPy cần cài numpy (pip install numpy)")
+        self.index = index
+        self.k1 = k1
+        self.max_cached_terms = max_cached_terms
+        self.postings = OrderedDict()  # {term: (ordinals, frequencies)} LRU
+        self.lock = threading.Lock()  # cache dùng chung giữa các thread của web
+
+        self.doc_count = len(index.doc_lengths)
+        self.doc_lengths = np.array(index.doc_lengths, dtype=np.float64)
+        # Phần chuẩn hóa độ dài trong mẫu số BM25, tính một lần cho mọi tài liệu
+        avg_doc_length = index.avg_doc_length
+        if avg_doc_length > 0:
+            self.bm25_norms = k1 * (1 - b + b * (self.doc_lengths / avg_doc_length))
+        else:
+            self.bm25_norms = np.full(self.doc_count, np.inf)
+
+    def get_postings(self, term):
+        """
+        Posting list của term dạng (ordinal uint32, tần suất float64)
+        """
+        with self.lock:
+            arrays = self.postings.get(term)
+            if arrays is not None:
+                self.postings.move_to_end(term)
+                return arrays
+        # Nạp ngoài lock; hai thread cùng nạp một term thì bản sau ghi đè, kết quả như nhau
+        ordinal_blocks, frequency_blocks = [], []
+        for doc_ordinals, frequencies, _ in self.index.get_term_postings(term).iter_blocks():
+            ordinal_blocks.append(np.asarray(doc_ordinals, dtype=np.uint32))
+            frequency_blocks.append(np.asarray(frequencies, dtype=np.float32))
+        if ordinal_blocks:
+            arrays = (np.concatenate(ordinal_blocks), np.concatenate(frequency_blocks).astype(np.float64))
+        else:
+            arrays = (np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.float64))
+        with self.lock:
+            self.postings[term] = arrays
+            self.postings.move_to_end(term)
+            if len(self.postings) > self.max_cached_terms:
+                self.postings.popitem(last=False)
+        return arrays
+
+    def term_scores(self, ordinals, frequencies, idf, method):
+        """
+        Điểm của cả posting list (cùng công thức và thứ tự phép tính với SearchEngine)
+        """
+        if method == 'tfidf':
+            lengths = self.doc_lengths[ordinals]
+            tf = np.divide(frequencies, lengths, out=np.zeros_like(frequencies), where=lengths > 0)
+            return tf * idf
+        # bm25
+        return idf * (frequencies * (self.k1 + 1) / (frequencies + self.bm25_norms[ordinals]))
+
+    def score(self, weighted_terms, method='bm25', allowed=None, required=()):
+        """
+        Điểm mọi tài liệu khớp query
+        Args:
+            weighted_terms: list các cặp (term, trọng số) (xem SearchEngine.parse_query)
+            method: 'bm25' hoặc 'tfidf'
+            allowed: Bitmap các ordinal được phép, None = mọi tài liệu
+            required: các tập ordinal tài liệu phải thuộc (ví dụ tài liệu chứa cụm từ)
+        Returns:
+            tuple: (mảng điểm theo ordinal, mảng bool tài liệu khớp,
+                    mảng vị trí term đầu tiên chứa tài liệu - để xếp tài liệu bằng điểm như score_query)
+        """
+        all_ordinals, all_scores = [], []
+        first_terms = np.full(self.doc_count, len(weighted_terms), dtype=np.int64)
+        for position, (term, weight) in enumerate(weighted_terms):
+            ordinals, frequencies = self.get_postings(term)
+            idf = self.index.get_term_statistics(term).idf
+            all_ordinals.append(ordinals)
+            all_scores.append(weight * self.term_scores(ordinals, frequencies, idf, method))
+            first_terms[ordinals] = np.minimum(first_terms[ordinals], position)
+
+        # Mỗi tài liệu có tối đa một posting cho mỗi term: cộng theo thứ tự term như score_query
+        ordinals = np.concatenate(all_ordinals) if all_ordinals else np.zeros(0, dtype=np.uint32)
+        weights = np.concatenate(all_scores) if all_scores else np.zeros(0)
+        scores = np.bincount(ordinals, weights=weights, minlength=self.doc_count)
+        matched = np.bincount(ordinals, minlength=self.doc_count) > 0
+
+        if allowed is not None:
+            mask = np.frombuffer(bytes(allowed.to_mask(self.doc_count)), dtype=np.uint8)
+            matched &= np.unpackbits(mask, bitorder='little')[:self.doc_count].astype(bool)
+        for doc_ordinals in required:
+            keep = np.zeros(self.doc_count, dtype=bool)
+            keep[np.fromiter(doc_ordinals, dtype=np.int64, count=len(doc_ordinals))] = True
+            matched &= keep
+        return scores, matched, first_terms
+
+    @staticmethod
+    def matched_ordinals(matched):
+        """
+        Các ordinal khớp (mảng bool của score) dạng array('I') tăng dần (để dựng Bitmap, đếm facet)
+        """
+        ordinals = array('I')
+        ordinals.frombytes(np.flatnonzero(matched).astype(np.uint32).tobytes())
+        return ordinals
+
+    @staticmethod
+    def top_k(scores, matched, first_terms, top_k):
+        """
+        Top K trong các tài liệu khớp: argpartition lấy các tài liệu có điểm >= điểm thứ K,
+        rồi chỉ sắp xếp chúng theo điểm giảm dần, bằng điểm thì theo vị trí term đầu tiên và ordinal
+        Returns:
+            list: các cặp (ordinal, score)
+        """
+        candidates = np.flatnonzero(matched)
+        if top_k <= 0 or len(candidates) == 0:
+            return []
+        candidate_scores = scores[candidates]
+        if top_k < len(candidates):
+            kth_score = candidate_scores[np.argpartition(candidate_scores, -top_k)[-top_k:]].min()
+            keep = candidate_scores >= kth_score
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+        order = np.lexsort((candidates, first_terms[candidates], -candidate_scores))[:top_k]
+        return [(int(candidates[i]), float(candidate_scores[i])) for i in order]
@@ -5,47 +5,181 @@ Mục tiêu: Xây dựng web interface với Flask
 
 from flask import Flask, render_template, request, jsonify
 import json
+import hmac
 import os
 import sys
 import re
+import threading
+from contextlib import contextmanager
 
 # Import từ các module khác
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from module2_indexing.text_processor import InvertedIndex, TextProcessor
-from module3_ranking.search_engine import SearchEngine
+from module2_indexing.text_processor import load_index
+from module2_indexing.snapshots import current_snapshot, snapshot_path
+from module3_ranking.search_engine import SearchEngine, SEARCH_MODES, RANKING_METHODS
+from module3_ranking.sharded_search import ShardSet
 
 app = Flask(__name__)
 
-# Global variables
-search_engine = None
-documents = []
+# Đường dẫn tới data và index
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_ROOT = os.path.join(BASE_DIR, 'index')
+DATA_FILE = os.path.join(BASE_DIR, 'data', 'recipes.json')
 
+# Chu kỳ (giây) kiểm tra con trỏ CURRENT để tự reload (0 = tắt, chỉ reload qua /admin/reload)
+RELOAD_INTERVAL = float(os.environ.get('RECIPE_RELOAD_INTERVAL', '0'))
 
-def load_data():
+# Token cho các endpoint /admin (header X-Admin-Token); nếu không đặt, các endpoint /admin bị tắt
+ADMIN_TOKEN = os.environ.get('RECIPE_ADMIN_TOKEN')
+
+
+class EngineVersion:
     """
-    Load index và documents khi khởi động
+    Một phiên bản SearchEngine đang phục vụ cùng số request đang dùng nó
+    """
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.readers = 0
+        self.retired = False
+
+
+class EngineRegistry:
     """
-    global search_engine, documents
+    Giữ SearchEngine hiện tại và thay nóng theo kiểu read-copy-update:
+    - mỗi request lấy phiên bản hiện tại khi bắt đầu và dùng nó đến khi xong (reader)
+    - reload dựng SearchEngine mới ở luồng nền rồi đổi con trỏ một lần (swap)
+    - phiên bản cũ chỉ được đóng (dừng worker của ShardSet) khi request cuối cùng dùng nó kết thúc
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = None
+        self.reloading = False
+        self.last_error = None
+        self.watcher_stop = threading.Event()
     
-    # Đường dẫn tới data và index
-    base_dir = os.path.dirname(os.path.dirname(__file__))
-    index_file = os.path.join(base_dir, 'index', 'inverted_index.json')
-    data_file = os.path.join(base_dir, 'data', 'recipes.json')
+    @contextmanager
+    def reader(self):
+        with self.lock:
+            version = self.current
+            version.readers += 1
+        try:
+            yield version.engine
+        finally:
+            with self.lock:
+                version.readers -= 1
+                retire = version.retired and version.readers == 0
+            if retire:
+                self._close(version)
     
-    print("📂 Đang tải dữ liệu...")
+    def swap(self, version):
+        with self.lock:
+            old = self.current
+            self.current = version
+            retire = old is not None and old.readers == 0
+            if old is not None:
+                old.retired = True
+        if retire:
+            self._close(old)
     
-    # Load inverted index
-    inverted_index = InvertedIndex()
-    inverted_index.load(index_file)
+    @staticmethod
+    def _close(version):
+        index = version.engine.index
+        if hasattr(index, 'close'):
+            index.close()
+        print(f"♻️  Đã giải phóng phiên bản index cũ: {version.name}")
     
-    # Load documents
-    with open(data_file, 'r', encoding='utf-8') as f:
-        documents = json.load(f)
+    def reload(self, wait=False):
+        """
+        Dựng SearchEngine từ phiên bản CURRENT ở luồng nền rồi thay vào
+        Returns:
+            bool: False nếu đang có một lần reload khác chạy
+        """
+        with self.lock:
+            if self.reloading:
+                return False
+            self.reloading = True
+        
+        def run():
+            try:
+                self.swap(load_engine())
+                self.last_error = None
+                print(f"🔄 Đã chuyển sang phiên bản index: {self.current.name}")
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"❌ Reload index lỗi, giữ phiên bản {self.current.name}: {self.last_error}")
+            finally:
+                with self.lock:
+                    self.reloading = False
+        
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+    
+    def start_watcher(self, interval):
+        """
+        Luồng nền kiểm tra con trỏ CURRENT mỗi interval giây, reload khi phiên bản đổi
+        """
+        def run():
+            while not self.watcher_stop.wait(interval):
+                name = current_snapshot(INDEX_ROOT)
+                if name is not None and name != self.current.name:
+                    self.reload(wait=True)
+        
+        threading.Thread(target=run, daemon=True).start()
+
+
+engines = EngineRegistry()
+
+
+def open_search_index(index_dir):
+    """
+    Mở index trong một thư mục: index chia shard (tìm song song) nếu có,
+    sau đó index phân đoạn, cuối cùng là InvertedIndex
+    """
+    shards_dir = os.path.join(index_dir, 'shards')
+    if os.path.exists(os.path.join(shards_dir, 'shards.json')):
+        return ShardSet(shards_dir)
+    return load_index(index_dir)
+
+
+def load_engine():
+    """
+    Dựng SearchEngine từ phiên bản CURRENT (hoặc thư mục index/ nếu chưa dùng phiên bản)
+    """
+    name = current_snapshot(INDEX_ROOT)
+    index_dir = snapshot_path(INDEX_ROOT, name) if name else INDEX_ROOT
     
-    # Tạo search engine
-    search_engine = SearchEngine(inverted_index, documents)
+    # Dữ liệu đi kèm phiên bản nếu có, ngược lại dùng data/recipes.json
+    data_file = os.path.join(index_dir, 'recipes.json')
+    if not os.path.exists(data_file):
+        data_file = DATA_FILE
     
-    print("✅ Đã tải dữ liệu thành công!")
+    inverted_index = open_search_index(index_dir)
+    with open(data_file, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    return EngineVersion(name or 'index', SearchEngine(inverted_index, documents))
+
+
+def load_data():
+    """
+    Load index và documents khi khởi động
+    """
+    print("📂 Đang tải dữ liệu...")
+    engines.swap(load_engine())
+    if RELOAD_INTERVAL > 0:
+        engines.start_watcher(RELOAD_INTERVAL)
+    print(f"✅ Đã tải dữ liệu thành công! (phiên bản: {engines.current.name})")
+
+
+def _admin_allowed():
+    # Không tin địa chỉ nguồn: sau reverse proxy mọi request đều đến từ 127.0.0.1
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get('X-Admin-Token', '')
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
 
 
 @app.route('/')
@@ -68,8 +202,11 @@ def search():
     if not query:
         return render_template('index.html')
     
-    # Tìm kiếm
-    all_results = search_engine.search(query, top_k=100, method='bm25')
+    # Tìm kiếm (cả request dùng một phiên bản index)
+    with engines.reader() as search_engine:
+        all_results = search_engine.search(query, top_k=100, method='bm25')
+        # Tách từ query một lần cho mọi kết quả (dùng TextProcessor có cache của search engine)
+        query_terms = search_engine.text_processor.process(query)
     
     # Phân trang
     total_results = len(all_results)
@@ -80,8 +217,9 @@ def search():
     
     # Highlight từ khóa trong kết quả (sử dụng logic cải tiến)
     for result in results:
-        result['highlighted_title'] = highlight_text_improved(result['title'], query)
-        result['highlighted_description'] = truncate_and_highlight(result['description'], query, max_length=200)
+        result['highlighted_title'] = highlight_text_improved(result['title'], query_terms)
+        result['highlighted_description'] = truncate_and_highlight(result['description'], query, query_terms,
+                                                                   max_length=200)
     
     return render_template('results.html', 
                           query=query, 
@@ -97,11 +235,8 @@ def recipe_detail(recipe_url):
     Hiển thị chi tiết công thức
     """
     # Tìm recipe theo URL
-    recipe = None
-    for doc in documents:
-        if doc['url'] == recipe_url:
-            recipe = doc
-            break
+    with engines.reader() as search_engine:
+        recipe = search_engine.get_document(recipe_url)
     
     if recipe:
         return render_template('recipe.html', recipe=recipe)
@@ -113,34 +248,87 @@ def recipe_detail(recipe_url):
 def api_search():
     """
     API endpoint cho tìm kiếm (JSON response)
+    Tham số method: 'bm25' (mặc định), 'bm25f', 'tfidf' hoặc bản NumPy 'bm25_numpy', 'tfidf_numpy'
+    Tham số mode: 'terms' (mặc định), 'phrase' (cả query là một cụm từ) hoặc 'proximity'
+    (cộng điểm khi các từ đứng gần nhau); cụm trong ngoặc kép luôn phải khớp chính xác
+    Tham số include / exclude: nguyên liệu bắt buộc có / không được có, cách nhau bởi dấu phẩy
+    (ví dụ include=tôm,hành&exclude=đậu phộng); có include thì q có thể bỏ trống
+    Tham số filter (lặp lại được): điều kiện khoảng trên thuộc tính số prep_time / cook_time (phút)
+    hoặc servings (người), ví dụ filter=cook_time<=30&filter=servings>=4; có filter thì q có thể bỏ trống
+    Kết quả kèm total_matches (số tài liệu khớp) và facets (số tài liệu theo từng nhóm thuộc tính)
     """
     query = request.args.get('q', '')
     top_k = int(request.args.get('top_k', 10))
+    method = request.args.get('method', 'bm25')
+    mode = request.args.get('mode', 'terms')
+    include = [name for name in request.args.get('include', '').split(',') if name.strip()]
+    exclude = [name for name in request.args.get('exclude', '').split(',') if name.strip()]
+    filters = [spec for spec in request.args.getlist('filter') if spec.strip()]
     
-    if not query:
+    if not query and not include and not filters:
         return jsonify({'error': 'Query is required'}), 400
+    if method not in RANKING_METHODS:
+        return jsonify({'error': f'Unknown method: {method}'}), 400
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f'Unknown mode: {mode}'}), 400
     
-    results = search_engine.search(query, top_k=top_k, method='bm25')
+    try:
+        with engines.reader() as search_engine:
+            response = search_engine.search_faceted(query, top_k=top_k, method=method, mode=mode,
+                                                    include_ingredients=include, exclude_ingredients=exclude,
+                                                    filters=filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'query': query,
-        'total_results': len(results),
-        'results': results
+        'mode': mode,
+        'include': include,
+        'exclude': exclude,
+        'filters': filters,
+        'total_results': len(response['results']),
+        'total_matches': response['total'],
+        'facets': response['facets'],
+        'results': response['results']
     })
 
 
-def highlight_text_improved(text, query):
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    Reload index từ phiên bản CURRENT ở luồng nền; request đang chạy vẫn dùng phiên bản cũ
+    """
+    if not _admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    started = engines.reload()
+    return jsonify({'reloading': True, 'started': started, 'current': engines.current.name}), 202
+
+
+@app.route('/admin/index')
+def admin_index():
+    """
+    Phiên bản index đang phục vụ và trạng thái reload
+    """
+    if not _admin_allowed():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({
+        'current': engines.current.name,
+        'pointer': current_snapshot(INDEX_ROOT),
+        'reloading': engines.reloading,
+        'last_error': engines.last_error
+    })
+
+
+def highlight_text_improved(text, query_terms):
     """
     Highlight từ khóa trong text với logic thông minh hơn
     Sử dụng Vietnamese NLP tokenization để highlight chính xác
+    Args:
+        query_terms: term của query đã xử lý giống như search engine (tách từ một lần mỗi request)
     """
     if not text:
         return text
     
-    # Process query giống như search engine
-    processor = TextProcessor()
-    query_terms = processor.process(query)
-    
     if not query_terms:
         return text
     
@@ -157,7 +345,7 @@ def highlight_text_improved(text, query):
     return highlighted
 
 
-def truncate_and_highlight(text, query, max_length=200):
+def truncate_and_highlight(text, query, query_terms, max_length=200):
     """
     Cắt text và highlight từ khóa
     Ưu tiên hiển thị phần có từ khóa
@@ -165,10 +353,6 @@ def truncate_and_highlight(text, query, max_length=200):
     if not text:
         return text
     
-    # Process query
-    processor = TextProcessor()
-    query_terms = processor.process(query)
-    
     if not query_terms:
         # Không có query terms, chỉ cắt text
         if len(text) > max_length:
@@ -202,7 +386,7 @@ def truncate_and_highlight(text, query, max_length=200):
             truncated = text
     
     # Highlight sau khi cắt
-    return highlight_text_improved(truncated, query)
+    return highlight_text_improved(truncated, query_terms)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,793 @@
+"""
+MODULE 5: ĐO HIỆU NĂNG (BENCHMARK)
+Mục tiêu: Đo tốc độ xây dựng index và truy vấn của hệ thống
+
+Cách dùng:
+    python module5_evaluation/benchmark.py build --max-workers 4
+    python module5_evaluation/benchmark.py build --synthetic 20000
+    python module5_evaluation/benchmark.py postings --synthetic 20000
+    python module5_evaluation/benchmark.py tokenizer --lexicon index/lexicon.txt
+    python module5_evaluation/benchmark.py fuzzy --vocab 10000 1000000
+    python module5_evaluation/benchmark.py shards --synthetic 200000 --shards 2 4 8
+    python module5_evaluation/benchmark.py textproc --lexicon index/lexicon.txt
+    python module5_evaluation/benchmark.py ingredients --docs 100000 1000000
+    python module5_evaluation/benchmark.py attributes --docs 100000 1000000
+    python module5_evaluation/benchmark.py dedup --synthetic 200000
+    python module5_evaluation/benchmark.py pruning --synthetic 200000
+    python module5_evaluation/benchmark.py vectorized --synthetic 200000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from array import array
+from types import SimpleNamespace
+
+# Import từ các module khác
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from module2_indexing.text_processor import InvertedIndex, TextProcessor, extract_fields, resolve_index_path
+from module2_indexing.tokenizer_backends import (UndertheseaTokenizer, LongestMatchTokenizer, build_lexicon,
+                                         load_lexicon, SYLLABLE_PATTERN)
+from module2_indexing.ngram_index import TrigramIndex, bounded_edit_distance, DEFAULT_MAX_CANDIDATES
+from module2_indexing.shards import build_shards
+from module2_indexing.ingredients import ingredient_keys
+from module2_indexing.near_duplicates import NearDuplicateDetector
+from module2_indexing.bitmap import Bitmap
+from module2_indexing.attributes import (ATTRIBUTES, MISSING, FACET_BUCKETS, UNKNOWN_BUCKET, AttributeColumn,
+                                         parse_attributes, facet_counts)
+from module3_ranking.search_engine import SearchEngine
+from module3_ranking.sharded_search import ShardSet
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Công thức mẫu dùng khi chưa crawl dữ liệu
+SAMPLE_RECIPES = [
+    {
+        'title': 'Phở bò tái chín',
+        'description': 'Món phở bò truyền thống với nước dùng ninh từ xương bò thơm ngon',
+        'ingredients': ['1 kg xương bò', '300g thịt bò thăn', '500g bánh phở', '1 củ gừng',
+                        '2 củ hành tây', 'Quế, hồi, thảo quả', 'Hành lá, rau thơm'],
+        'instructions': ['Ninh xương bò trong 6 tiếng để lấy nước dùng',
+                         'Nướng gừng và hành tây rồi cho vào nồi nước dùng',
+                         'Thái mỏng thịt bò, trụng bánh phở và chan nước dùng']
+    },
+    {
+        'title': 'Canh chua cá lóc',
+        'description': 'Canh chua miền Tây với cá lóc, me chua và rau thơm',
+        'ingredients': ['1 con cá lóc', '100g me chua', '2 quả cà chua', '1 cây bạc hà',
+                        '200g giá đỗ', 'Rau ngổ, ngò gai', '2 muỗng canh nước mắm'],
+        'instructions': ['Làm sạch cá lóc và cắt khúc', 'Dầm me lấy nước chua',
+                         'Nấu sôi nước với me, cho cá vào nấu chín',
+                         'Thêm cà chua, bạc hà, giá và nêm nước mắm']
+    },
+    {
+        'title': 'Thịt kho tàu',
+        'description': 'Thịt ba chỉ kho nước dừa với trứng vịt, món ăn ngày Tết',
+        'ingredients': ['1 kg thịt ba chỉ', '10 quả trứng vịt', '1 trái dừa xiêm',
+                        '3 muỗng canh nước mắm', '2 muỗng canh đường', 'Hành tím, tỏi'],
+        'instructions': ['Thịt cắt miếng vuông, ướp với nước mắm, đường, hành tỏi',
+                         'Luộc trứng vịt và bóc vỏ',
+                         'Kho thịt với nước dừa trong 2 tiếng, cho trứng vào kho cùng']
+    },
+    {
+        'title': 'Gỏi cuốn tôm thịt',
+        'description': 'Gỏi cuốn tươi mát với tôm, thịt heo và bún, chấm tương đậu phộng',
+        'ingredients': ['200g tôm', '200g thịt heo', '200g bún tươi', 'Bánh tráng',
+                        'Rau sống, hẹ', 'Tương đen, đậu phộng rang'],
+        'instructions': ['Luộc tôm và thịt heo, thái mỏng', 'Nhúng bánh tráng qua nước',
+                         'Cuốn rau, bún, thịt và tôm', 'Pha nước chấm tương đậu phộng']
+    },
+]
+
+
+def load_corpus(data_file, synthetic=0, seed=42):
+    """
+    Tải tập công thức để đo hiệu năng
+    Args:
+        data_file: file recipes.json (nếu có)
+        synthetic: nếu > 0, sinh thêm đến đủ số công thức này bằng cách trộn các trường
+        seed: seed ngẫu nhiên để kết quả lặp lại được
+    """
+    if os.path.exists(data_file):
+        with open(data_file, 'r', encoding='utf-8') as f:
+            documents = json.load(f)
+    else:
+        documents = []
+
+    if synthetic <= 0:
+        return documents if documents else [dict(doc, url=f'sample-{i}') for i, doc in enumerate(SAMPLE_RECIPES)]
+
+    base = documents or SAMPLE_RECIPES
+    ingredient_lines = [line for doc in base for line in doc.get('ingredients', [])]
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(synthetic):
+        # Trộn các trường của nhiều công thức gốc để tạo công thức mới
+        corpus.append({
+            'url': f'https://synthetic.local/cong-thuc/{i}',
+            'title': rng.choice(base).get('title', ''),
+            'description': rng.choice(base).get('description', ''),
+            'ingredients': rng.sample(ingredient_lines, min(8, len(ingredient_lines))),
+            'instructions': list(rng.choice(base).get('instructions', []))
+        })
+    return corpus
+
+
+def indexes_equal(a, b):
+    """
+    So sánh hai InvertedIndex (cùng doc, cùng term, cùng posting theo thứ tự)
+    """
+    if list(a.doc_ids) != list(b.doc_ids):
+        return False
+    if list(a.doc_lengths) != list(b.doc_lengths) or list(a.field_lengths) != list(b.field_lengths):
+        return False
+    if list(a.index.keys()) != list(b.index.keys()):
+        return False
+    for term, list_a in a.index.items():
+        list_b = b.index[term]
+        for i in range(len(list_a)):
+            if list(list_a.get_positions(i)) != list(list_b.get_positions(i)):
+                return False
+        if (list(list_a.doc_ordinals) != list(list_b.doc_ordinals)
+                or list(list_a.frequencies) != list(list_b.frequencies)
+                or list(list_a.field_freqs) != list(list_b.field_freqs)):
+            return False
+    return True
+
+
+def benchmark_build(documents, max_workers):
+    """
+    Đo tốc độ build index (docs/giây) với số process từ 1 đến max_workers
+    """
+    print(f"\n🔨 BUILD INDEX: {len(documents)} tài liệu, 1 -> {max_workers} process")
+    print(f"   {'workers':>7} | {'giây':>8} | {'docs/giây':>10} | {'tăng tốc':>8} | giống tuần tự")
+
+    serial_index = None
+    serial_time = None
+    for workers in range(1, max_workers + 1):
+        inverted_index = InvertedIndex()
+        start = time.perf_counter()
+        inverted_index.build_from_documents(documents, workers=workers)
+        elapsed = time.perf_counter() - start
+
+        if serial_index is None:
+            serial_index, serial_time = inverted_index, elapsed
+            identical = '-'
+        else:
+            identical = 'có' if indexes_equal(serial_index, inverted_index) else 'KHÔNG'
+
+        print(f"   {workers:>7} | {elapsed:>8.2f} | {len(documents) / elapsed:>10.1f} | "
+              f"{serial_time / elapsed:>7.2f}x | {identical}")
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def _traverse(inverted_index, with_positions):
+    """
+    Duyệt toàn bộ postings (như SearchEngine.search), trả về số posting đã duyệt
+    """
+    total = 0
+    for term in inverted_index.index.keys():
+        posting_list = inverted_index.index[term]
+        for doc_ordinals, frequencies, field_freqs in posting_list.iter_blocks():
+            # Đọc giá trị thật sự (mảng thô trên mmap chỉ được đọc khi truy cập)
+            sum(doc_ordinals)
+            sum(frequencies)
+            total += len(doc_ordinals)
+        if with_positions:
+            for i in range(len(posting_list)):
+                posting_list.get_positions(i)
+    return total
+
+
+def benchmark_postings(documents, rounds=3):
+    """
+    So sánh kích thước index và tốc độ giải nén postings giữa các codec (JSON, raw, varint)
+    """
+    print(f"\n🗜️  POSTINGS: {len(documents)} tài liệu")
+    inverted_index = InvertedIndex()
+    inverted_index.build_from_documents(documents)
+
+    work_dir = tempfile.mkdtemp(prefix='bench_postings_')
+    try:
+        json_path = os.path.join(work_dir, 'inverted_index.json')
+        inverted_index.save(json_path)
+        print(f"\n   {'định dạng':>9} | {'postings (KB)':>13} | {'tổng (KB)':>10} | "
+              f"{'posting/giây':>13} | {'kèm positions':>13}")
+        print(f"   {'json':>9} | {'-':>13} | {os.path.getsize(json_path) / 1024:>10.1f} | "
+              f"{'-':>13} | {'-':>13}")
+
+        for codec in ('raw', 'varint'):
+            out_dir = os.path.join(work_dir, codec)
+            inverted_index.save(out_dir, codec=codec)
+
+            rates = []
+            for with_positions in (False, True):
+                best = None
+                for _ in range(rounds):
+                    # Mở lại mỗi vòng để không dùng lại khối đã giải nén
+                    loaded = InvertedIndex()
+                    loaded.load(out_dir)
+                    start = time.perf_counter()
+                    total = _traverse(loaded, with_positions)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                rates.append(total / best if best > 0 else float('inf'))
+
+            print(f"   {codec:>9} | {os.path.getsize(os.path.join(out_dir, 'postings.bin')) / 1024:>13.1f} | "
+                  f"{_dir_size(out_dir) / 1024:>10.1f} | {rates[0]:>13,.0f} | {rates[1]:>13,.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _spans(tokens):
+    """
+    Tập các đoạn ký tự (bắt đầu, kết thúc) của một cách tách từ, tính trên văn bản
+    đã bỏ khoảng trắng nên không phụ thuộc cách mỗi backend tách âm tiết
+    """
+    spans = set()
+    start = 0
+    for token in tokens:
+        length = len(token.replace('_', ''))
+        spans.add((start, start + length))
+        start += length
+    return spans
+
+
+def _tokenize_all(tokenizer, texts):
+    start = time.perf_counter()
+    results = [tokenizer.tokenize(text) for text in texts]
+    return results, time.perf_counter() - start
+
+
+def benchmark_tokenizer(documents, lexicon_path=None, index_dir=None):
+    """
+    So sánh tốc độ và mức độ trùng khớp của tokenizer longest-match với underthesea
+    """
+    processor = TextProcessor(tokenizer=LongestMatchTokenizer([]))
+    texts = [processor.normalize(text) for doc in documents for text in extract_fields(doc)]
+    texts = [text for text in texts if text]
+    syllable_count = sum(len(SYLLABLE_PATTERN.findall(text)) for text in texts)
+    print(f"\n✂️  TOKENIZER: {len(texts)} đoạn văn bản, {syllable_count} âm tiết")
+
+    reference, reference_time = _tokenize_all(UndertheseaTokenizer(), texts)
+
+    # Từ điển: file có sẵn, hoặc term của index hiện có, hoặc từ ghép underthesea tìm thấy trên chính tập dữ liệu
+    if lexicon_path:
+        lexicon, source = load_lexicon(lexicon_path), lexicon_path
+    elif index_dir:
+        inverted_index = InvertedIndex(processor)
+        inverted_index.load(resolve_index_path(index_dir))
+        lexicon, source = build_lexicon(inverted_index.index.keys()), f'term của index {index_dir}'
+    else:
+        lexicon = build_lexicon(token.lower() for tokens in reference for token in tokens)
+        source = 'từ ghép underthesea trên cùng tập dữ liệu (trong mẫu)'
+    tokenizer = LongestMatchTokenizer(lexicon)
+    print(f"   - Từ điển: {len(tokenizer.lexicon)} từ ghép ({source})")
+
+    candidate, candidate_time = _tokenize_all(tokenizer, texts)
+
+    # Mức trùng khớp: so sánh các đoạn âm tiết của từng từ
+    exact = 0
+    matched = reference_total = candidate_total = 0
+    for ref_tokens, cand_tokens in zip(reference, candidate):
+        ref_spans, cand_spans = _spans(ref_tokens), _spans(cand_tokens)
+        matched += len(ref_spans & cand_spans)
+        reference_total += len(ref_spans)
+        candidate_total += len(cand_spans)
+        exact += ref_tokens == cand_tokens
+    precision = matched / candidate_total if candidate_total else 0
+    recall = matched / reference_total if reference_total else 0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
+
+    print(f"\n   {'backend':>13} | {'giây':>8} | {'âm tiết/giây':>13} | {'tăng tốc':>8}")
+    for name, elapsed in (('underthesea', reference_time), ('longest-match', candidate_time)):
+        print(f"   {name:>13} | {elapsed:>8.2f} | {syllable_count / elapsed:>13,.0f} | "
+              f"{reference_time / elapsed:>7.1f}x")
+    print(f"\n   Trùng khớp với underthesea:")
+    print(f"   - Precision/Recall/F1 theo từ: {precision:.4f} / {recall:.4f} / {f1:.4f}")
+    print(f"   - Đoạn văn tách giống hệt: {exact / len(texts):.2%}")
+
+
+def _synthetic_vocabulary(documents, size, seed=42):
+    """
+    Từ điển giả lập: ghép ngẫu nhiên 1-3 âm tiết lấy từ tập dữ liệu (giống term tiếng Việt)
+    """
+    processor = TextProcessor(tokenizer=LongestMatchTokenizer([]))
+    syllables = sorted({syllable for doc in documents for text in extract_fields(doc)
+                        for syllable in SYLLABLE_PATTERN.findall(processor.normalize(text))})
+    rng = random.Random(seed)
+    vocabulary = set(syllables[:size])
+    while len(vocabulary) < size:
+        vocabulary.add(' '.join(rng.choice(syllables) for _ in range(rng.randint(1, 3))))
+    return sorted(vocabulary)
+
+
+def _typo(term, rng):
+    """
+    Tạo lỗi gõ: chèn, xóa hoặc thay một ký tự
+    """
+    i = rng.randrange(len(term))
+    char = rng.choice('aăâeêioôơuưyđbcdghklmnpqrstvx')
+    operation = rng.randrange(3)
+    if operation == 0:
+        return term[:i] + char + term[i:]
+    if operation == 1 and len(term) > 1:
+        return term[:i] + term[i + 1:]
+    return term[:i] + char + term[i + 1:]
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def benchmark_fuzzy(documents, sizes=(10000, 1000000), query_count=200, max_candidates=DEFAULT_MAX_CANDIDATES):
+    """
+    Độ trễ tìm term gần đúng qua chỉ mục trigram so với duyệt toàn bộ từ điển
+    """
+    print(f"\n🔤 FUZZY: {query_count} term gõ sai, ngân sách {max_candidates} ứng viên")
+    print(f"\n   {'từ điển':>9} | {'build (s)':>9} | {'k':>2} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | "
+          f"{'p99 (ms)':>8} | {'duyệt hết (ms)':>14} | {'tìm lại':>7}")
+    for size in sizes:
+        vocabulary = _synthetic_vocabulary(documents, size)
+        start = time.perf_counter()
+        trigram_index = TrigramIndex(vocabulary)
+        build_time = time.perf_counter() - start
+
+        rng = random.Random(size)
+        targets = [rng.choice(vocabulary) for _ in range(query_count)]
+        queries = [_typo(term, rng) for term in targets]
+        for max_distance in (1, 2):
+            latencies = []
+            found = 0
+            for target, query in zip(targets, queries):
+                start = time.perf_counter()
+                similar = trigram_index.find_similar(query, max_distance, max_candidates)
+                latencies.append((time.perf_counter() - start) * 1000)
+                found += any(term == target for _, term in similar)
+
+            # Duyệt toàn bộ từ điển (khoảng cách sửa có chặn) trên vài query để so sánh
+            scan_queries = queries[:5]
+            start = time.perf_counter()
+            for query in scan_queries:
+                [term for term in vocabulary if bounded_edit_distance(query, term, max_distance) <= max_distance]
+            scan_ms = (time.perf_counter() - start) * 1000 / len(scan_queries)
+
+            print(f"   {size:>9,} | {build_time:>9.1f} | {max_distance:>2} | {_percentile(latencies, 50):>8.2f} | "
+                  f"{_percentile(latencies, 95):>8.2f} | {_percentile(latencies, 99):>8.2f} | "
+                  f"{scan_ms:>14.1f} | {found / query_count:>7.1%}")
+
+
+def benchmark_textproc(documents, lexicon_path=None, rounds=3):
+    """
+    Thông lượng xử lý văn bản: process từng chuỗi so với process_many theo lô (không cache)
+    """
+    texts = [text for doc in documents for text in extract_fields(doc)]
+    print(f"\n🧹 TEXT PROCESSING: {len(texts)} đoạn văn bản ({len(set(texts))} khác nhau), "
+          f"tốt nhất trong {rounds} lần")
+
+    lexicon = load_lexicon(lexicon_path) if lexicon_path else []
+    backends = [('longest-match', LongestMatchTokenizer(lexicon)), ('underthesea', UndertheseaTokenizer())]
+    print(f"\n   {'backend':>13} | {'từng chuỗi (s)':>14} | {'process_many (s)':>16} | "
+          f"{'văn bản/giây':>12} | {'tăng tốc':>8}")
+    for name, tokenizer in backends:
+        processor = TextProcessor(tokenizer=tokenizer)
+        single_time = batch_time = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            single = [processor.process(text) for text in texts]
+            single_time = min(single_time, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            batch = processor.process_many(texts)
+            batch_time = min(batch_time, time.perf_counter() - start)
+        if batch != single:
+            print(f"   ⚠️  {name}: process_many khác process từng chuỗi!")
+        print(f"   {name:>13} | {single_time:>14.3f} | {batch_time:>16.3f} | "
+              f"{len(texts) / batch_time:>12,.0f} | {single_time / batch_time:>7.1f}x")
+
+
+def benchmark_ingredients(documents, doc_counts=(100000, 1000000), query_count=200, seed=42):
+    """
+    Độ trễ bộ lọc nguyên liệu (AND / ANDNOT bitmap + bitset phẳng cho vòng lặp chấm điểm)
+    so với phép giao / trừ trên set Python, với tập ordinal giả lập có cùng tỉ lệ tài liệu
+    của từng nguyên liệu như dữ liệu thật
+    """
+    counts = {}
+    for doc in documents:
+        for key in ingredient_keys(doc.get('ingredients', [])):
+            counts[key] = counts.get(key, 0) + 1
+    keys = sorted(counts, key=counts.get, reverse=True)[:30]
+    print(f"\n🥕 INGREDIENTS: {len(keys)} nguyên liệu phổ biến nhất, {query_count} bộ lọc (1-2 bắt buộc, 0-2 loại trừ)")
+    print(f"\n   {'tài liệu':>10} | {'bitmap':>9} | {'array I':>9} | {'bitmap p50':>10} | {'bitmap p99':>10} | "
+          f"{'set p50':>8} | {'set p99':>8} | {'khớp':>4}")
+    for doc_count in doc_counts:
+        rng = random.Random(seed + doc_count)
+        postings = {key: sorted(rng.sample(range(doc_count), doc_count * counts[key] // len(documents)))
+                    for key in keys}
+        bitmaps = {key: Bitmap.from_sorted(ordinals) for key, ordinals in postings.items()}
+        sets = {key: set(ordinals) for key, ordinals in postings.items()}
+        bitmap_bytes = sum(len(bitmap.to_bytes()) for bitmap in bitmaps.values())
+        array_bytes = sum(4 * len(ordinals) for ordinals in postings.values())
+
+        filters = [(rng.sample(keys, rng.randint(1, 2)), rng.sample(keys, rng.randint(0, 2)))
+                   for _ in range(query_count)]
+        bitmap_ms, set_ms, same = [], [], True
+        for include, exclude in filters:
+            start = time.perf_counter()
+            ordered = sorted((bitmaps[key] for key in include), key=len)
+            allowed = ordered[0]
+            for bitmap in ordered[1:]:
+                allowed = allowed & bitmap
+            for key in exclude:
+                allowed = allowed - bitmaps[key]
+            allowed.to_mask(doc_count)
+            bitmap_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            allowed_set = set.intersection(*(sets[key] for key in include))
+            for key in exclude:
+                allowed_set -= sets[key]
+            set_ms.append((time.perf_counter() - start) * 1000)
+            same = same and len(allowed) == len(allowed_set)
+
+        print(f"   {doc_count:>10,} | {bitmap_bytes / 1024 / 1024:>7.1f}MB | {array_bytes / 1024 / 1024:>7.1f}MB | "
+              f"{_percentile(bitmap_ms, 50):>10.2f} | {_percentile(bitmap_ms, 99):>10.2f} | "
+              f"{_percentile(set_ms, 50):>8.2f} | {_percentile(set_ms, 99):>8.2f} | {'có' if same else 'KHÔNG':>4}")
+
+
+def _bucket_label(name, value):
+    if value == MISSING:
+        return UNKNOWN_BUCKET
+    for low, high, label in FACET_BUCKETS[name]:
+        if (low is None or value >= low) and (high is None or value <= high):
+            return label
+    return UNKNOWN_BUCKET
+
+
+def benchmark_attributes(documents, doc_counts=(100000, 1000000), query_count=50, match_ratio=0.2, seed=42):
+    """
+    Độ trễ lọc khoảng (cook_time <= 30, servings >= 4) và đếm facet trên toàn bộ tập kết quả
+    bằng bitmap theo giá trị so với duyệt từng tài liệu khớp, với cột thuộc tính giả lập
+    có cùng phân bố giá trị như dữ liệu thật
+    """
+    values = list(zip(*(parse_attributes(doc) for doc in documents)))
+    print(f"\n⏱️  ATTRIBUTES: {query_count} query, tập kết quả ~{match_ratio:.0%} tài liệu, "
+          f"lọc cook_time <= 30 và servings >= 4, facet {', '.join(ATTRIBUTES)}")
+    print(f"\n   {'tài liệu':>10} | {'dựng cột (s)':>12} | {'tạo bitmap':>10} | {'bitmap p50':>10} | "
+          f"{'bitmap p99':>10} | {'duyệt p50':>9} | {'duyệt p99':>9} | {'khớp':>4}")
+    for doc_count in doc_counts:
+        rng = random.Random(seed + doc_count)
+        columns = {name: array('I', (rng.choice(values[i]) for _ in range(doc_count)))
+                   for i, name in enumerate(ATTRIBUTES)}
+        start = time.perf_counter()
+        attribute_index = {name: AttributeColumn(column) for name, column in columns.items()}
+        build_time = time.perf_counter() - start
+        index = SimpleNamespace(
+            get_attribute_bitmap=lambda name, low=None, high=None: attribute_index[name].range(low, high))
+        for column in attribute_index.values():
+            column.range(None, None)  # làm nóng cache khoảng
+
+        convert_ms, bitmap_ms, scan_ms, same = [], [], [], True
+        for _ in range(query_count):
+            ordinals = sorted(rng.sample(range(doc_count), int(doc_count * match_ratio)))
+
+            # Tập kết quả đã chấm điểm -> bitmap (query chỉ có bộ lọc thì tập kết quả đã là bitmap)
+            start = time.perf_counter()
+            matches = Bitmap.from_sorted(ordinals)
+            convert_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            matches = matches & index.get_attribute_bitmap('cook_time', None, 30)
+            matches = matches & index.get_attribute_bitmap('servings', 4, None)
+            facets = facet_counts(index, matches, ATTRIBUTES)
+            bitmap_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            cook_time, servings = columns['cook_time'], columns['servings']
+            kept = [ordinal for ordinal in ordinals
+                    if cook_time[ordinal] <= 30 and servings[ordinal] != MISSING and servings[ordinal] >= 4]
+            scanned = {}
+            for name, column in columns.items():
+                counts = scanned[name] = dict.fromkeys(facets[name], 0)
+                for ordinal in kept:
+                    counts[_bucket_label(name, column[ordinal])] += 1
+            scan_ms.append((time.perf_counter() - start) * 1000)
+            same = same and scanned == facets
+
+        print(f"   {doc_count:>10,} | {build_time:>12.2f} | {_percentile(convert_ms, 50):>10.2f} | "
+              f"{_percentile(bitmap_ms, 50):>10.2f} | "
+              f"{_percentile(bitmap_ms, 99):>10.2f} | {_percentile(scan_ms, 50):>9.2f} | "
+              f"{_percentile(scan_ms, 99):>9.2f} | {'có' if same else 'KHÔNG':>4}")
+
+
+def benchmark_dedup(documents, copy_ratio=0.1, seed=42):
+    """
+    Tốc độ gộp công thức gần trùng (MinHash / LSH) và số cặp phải so chữ ký so với so từng cặp,
+    trên dữ liệu có chèn bản sao sửa nhẹ (URL khác tham số theo dõi, thêm một dòng nguyên liệu)
+    """
+    rng = random.Random(seed)
+    corpus = list(documents)
+    planted = {}  # {url bản sao: url bản gốc}
+    for i in range(int(len(documents) * copy_ratio)):
+        source = rng.choice(documents)
+        copy = dict(source, url=f"{source['url']}?itm_source=bench{i}",
+                    ingredients=list(source.get('ingredients', [])) + ['ít rau thơm'])
+        planted[copy['url']] = source['url']
+        corpus.append(copy)
+    rng.shuffle(corpus)
+
+    print(f"\n🧬 DEDUP: {len(documents)} công thức + {len(planted)} bản sao sửa nhẹ")
+    start = time.perf_counter()
+    detector = NearDuplicateDetector()
+    for doc in corpus:
+        detector.add(doc['url'], doc)
+    elapsed = time.perf_counter() - start
+
+    canonical_of = {member['doc_id']: cluster['canonical']
+                    for cluster in detector.report() for member in cluster['duplicates']}
+    found = sum(1 for url, source in planted.items()
+                if canonical_of.get(url, url) == canonical_of.get(source, source))
+    all_pairs = len(corpus) * (len(corpus) - 1) // 2
+    print(f"\n   {'tài liệu':>10} | {'thời gian (s)':>13} | {'tài liệu/s':>10} | {'cặp đã so':>10} | "
+          f"{'so từng cặp':>15} | {'đã gộp':>7} | {'bắt được bản sao':>16}")
+    print(f"   {len(corpus):>10,} | {elapsed:>13.2f} | {len(corpus) / elapsed:>10,.0f} | {detector.checked:>10,} | "
+          f"{all_pairs:>15,} | {len(canonical_of):>7,} | {found:>9,}/{len(planted):<6,}")
+
+
+def _latency_row(label, engine, queries, top_k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        engine.search(query, top_k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"   {label:>16} | {_percentile(latencies, 50):>8.2f} | {_percentile(latencies, 95):>8.2f} | "
+          f"{_percentile(latencies, 99):>8.2f} | {max(latencies):>8.2f}")
+
+
+def benchmark_shards(documents, shard_counts=(2, 4), query_count=200, top_k=10, seed=42):
+    """
+    Độ trễ truy vấn (p50/p95/p99) của index chia shard tìm song song so với một index duy nhất
+    """
+    rng = random.Random(seed)
+    titles = [doc.get('title', '') for doc in documents if doc.get('title')]
+    # Query 1-3 từ lấy từ tên món, giống truy vấn thật
+    queries = []
+    for _ in range(query_count):
+        words = rng.choice(titles).split()
+        length = rng.randint(1, min(3, len(words)))
+        start = rng.randint(0, len(words) - length)
+        queries.append(' '.join(words[start:start + length]))
+
+    print(f"\n🧩 SHARDS: {len(documents)} công thức, {query_count} query, top {top_k}, "
+          f"{os.cpu_count()} CPU")
+    tmp_dir = tempfile.mkdtemp(prefix='bench_shards_')
+    try:
+        text_processor = TextProcessor()
+        single = InvertedIndex(text_processor)
+        single.build_from_documents(documents)
+        single_dir = os.path.join(tmp_dir, 'single')
+        single.save(single_dir)
+        single = InvertedIndex()
+        single.load(single_dir)
+        for shard_count in shard_counts:
+            build_shards(documents, os.path.join(tmp_dir, f'shards_{shard_count}'), shard_count, text_processor)
+
+        print(f"\n   {'index':>16} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | {'p99 (ms)':>8} | {'max (ms)':>8}")
+        engine = SearchEngine(single, documents)
+        engine.search(queries[0], top_k=top_k)  # làm nóng cache tách từ
+        _latency_row('1 index', engine, queries, top_k)
+        for shard_count in shard_counts:
+            with ShardSet(os.path.join(tmp_dir, f'shards_{shard_count}')) as shard_set:
+                engine = SearchEngine(shard_set, documents)
+                engine.search(queries[0], top_k=top_k)
+                _latency_row(f'{shard_count} shard', engine, queries, top_k)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _common_term_index(documents, index_dir):
+    """
+    Index nhị phân (mmap) của tập công thức, SearchEngine trên index đó và 40 term nguyên liệu
+    phổ biến nhất (posting list dài nhất) để tạo query nặng
+    """
+    text_processor = TextProcessor()
+    inverted_index = InvertedIndex(text_processor)
+    inverted_index.build_from_documents(documents)
+    inverted_index.save(index_dir)
+    inverted_index = InvertedIndex()
+    inverted_index.load(index_dir)
+    engine = SearchEngine(inverted_index, [], text_processor)
+
+    lines = [line for doc in documents[:2000] for line in doc.get('ingredients', [])]
+    vocabulary = {term for terms in text_processor.process_many(lines) for term in terms}
+    common = sorted(vocabulary, key=lambda term: inverted_index.get_term_statistics(term).df, reverse=True)[:40]
+    print(f"   Term phổ biến: {', '.join(common[:10])}, ...")
+    return inverted_index, engine, common
+
+
+def benchmark_pruning(documents, query_count=100, top_k=10, term_counts=(2, 3, 4, 5), seed=42):
+    """
+    Độ trễ top K theo BM25: chấm điểm mọi posting rồi sắp xếp (score_query) so với duyệt theo
+    tài liệu có cắt tỉa MaxScore / block-max (top_k_maxscore), trên query nhiều term lấy từ
+    các term nguyên liệu phổ biến nhất (posting list dài nhất); kiểm tra kết quả giống hệt
+    """
+    print(f"\n✂️  PRUNING: {len(documents)} công thức, {query_count} query mỗi độ dài, top {top_k}")
+    tmp_dir = tempfile.mkdtemp(prefix='bench_pruning_')
+    try:
+        inverted_index, engine, common = _common_term_index(documents, tmp_dir)
+        rng = random.Random(seed)
+        print(f"\n   {'term':>4} | {'postings':>9} | {'toàn bộ p50':>11} | {'toàn bộ p95':>11} | "
+              f"{'MaxScore p50':>12} | {'MaxScore p95':>12} | {'+ đếm p50':>9} | {'nhanh hơn':>9} | {'giống':>5}")
+        for term_count in term_counts:
+            queries = [[(term, 1.0) for term in rng.sample(common, term_count)] for _ in range(query_count)]
+            postings = sum(inverted_index.get_term_statistics(term).df for query in queries for term, _ in query)
+            full_ms, pruned_ms, counted_ms, same = [], [], [], True
+            for weighted_terms in queries:
+                start = time.perf_counter()
+                doc_scores = engine.score_query(weighted_terms, [], [])
+                expected = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+                full_ms.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                top_results, _, _ = engine.rank_documents(weighted_terms, [], [], top_k=top_k, count=False)
+                pruned_ms.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                counted, total, _ = engine.rank_documents(weighted_terms, [], [], top_k=top_k)
+                counted_ms.append((time.perf_counter() - start) * 1000)
+                same = same and top_results == expected == counted and total == len(doc_scores)
+
+            speedup = _percentile(full_ms, 50) / max(_percentile(pruned_ms, 50), 1e-9)
+            print(f"   {term_count:>4} | {postings // query_count:>9,} | {_percentile(full_ms, 50):>11.2f} | "
+                  f"{_percentile(full_ms, 95):>11.2f} | {_percentile(pruned_ms, 50):>12.2f} | "
+                  f"{_percentile(pruned_ms, 95):>12.2f} | {_percentile(counted_ms, 50):>9.2f} | "
+                  f"{speedup:>8.1f}x | {'có' if same else 'KHÔNG':>5}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def benchmark_vectorized(documents, query_count=100, top_k=10, term_counts=(1, 3, 5), seed=42):
+    """
+    Độ trễ chấm điểm BM25 / TF-IDF bằng vòng lặp Python so với bản vector hóa NumPy
+    (method 'bm25_numpy' / 'tfidf_numpy'), trên query lấy từ các term nguyên liệu phổ biến nhất;
+    kiểm tra top K, tổng số tài liệu khớp và facet giống hệt
+    """
+    print(f"\n🔢 VECTORIZED: {len(documents)} công thức, {query_count} query mỗi độ dài, top {top_k}")
+    tmp_dir = tempfile.mkdtemp(prefix='bench_vectorized_')
+    try:
+        inverted_index, engine, common = _common_term_index(documents, tmp_dir)
+        try:
+            engine.rank_documents([(common[0], 1.0)], [], [], 'bm25_numpy', top_k=top_k)
+        except ValueError as e:
+            print(f"   ⚠️  {e}")
+            return
+
+        rng = random.Random(seed)
+        print(f"\n   {'term':>4} | {'phương pháp':>11} | {'Python p50':>10} | {'Python p95':>10} | "
+              f"{'NumPy p50':>9} | {'NumPy p95':>9} | {'nhanh hơn':>9} | {'giống':>5}")
+        for term_count in term_counts:
+            queries = [[(term, 1.0) for term in rng.sample(common, term_count)] for _ in range(query_count)]
+            for method in ('bm25', 'tfidf'):
+                python_ms, numpy_ms, same = [], [], True
+                for weighted_terms in queries:
+                    start = time.perf_counter()
+                    expected = engine.rank_documents(weighted_terms, [], [], method, top_k=top_k, facets=ATTRIBUTES)
+                    python_ms.append((time.perf_counter() - start) * 1000)
+
+                    start = time.perf_counter()
+                    result = engine.rank_documents(weighted_terms, [], [], method + '_numpy', top_k=top_k,
+                                                   facets=ATTRIBUTES)
+                    numpy_ms.append((time.perf_counter() - start) * 1000)
+                    same = same and result == expected
+
+                speedup = _percentile(python_ms, 50) / max(_percentile(numpy_ms, 50), 1e-9)
+                print(f"   {term_count:>4} | {method:>11} | {_percentile(python_ms, 50):>10.2f} | "
+                      f"{_percentile(python_ms, 95):>10.2f} | {_percentile(numpy_ms, 50):>9.2f} | "
+                      f"{_percentile(numpy_ms, 95):>9.2f} | {speedup:>8.1f}x | {'có' if same else 'KHÔNG':>5}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main():
+    """
+    Chạy benchmark theo lệnh con
+    """
+    parser = argparse.ArgumentParser(description='Đo hiệu năng hệ thống tìm kiếm công thức')
+    parser.add_argument('--data', default=os.path.join(BASE_DIR, 'data', 'recipes.json'),
+                        help='file dữ liệu công thức')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='sinh tập dữ liệu giả lập với số công thức này')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='tốc độ build index song song')
+    build_parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+
+    postings_parser = subparsers.add_parser('postings', help='kích thước và tốc độ giải nén postings')
+    postings_parser.add_argument('--rounds', type=int, default=3)
+
+    tokenizer_parser = subparsers.add_parser('tokenizer', help='tokenizer longest-match so với underthesea')
+    tokenizer_parser.add_argument('--lexicon', default=None, help='file từ điển từ ghép')
+    tokenizer_parser.add_argument('--index', default=None,
+                                  help='lấy từ điển từ term của index này (ví dụ: index)')
+
+    fuzzy_parser = subparsers.add_parser('fuzzy', help='độ trễ tìm term gần đúng (chỉ mục trigram)')
+    fuzzy_parser.add_argument('--vocab', type=int, nargs='+', default=[10000, 1000000],
+                              help='kích thước các từ điển giả lập')
+    fuzzy_parser.add_argument('--queries', type=int, default=200)
+    fuzzy_parser.add_argument('--max-candidates', type=int, default=DEFAULT_MAX_CANDIDATES)
+
+    textproc_parser = subparsers.add_parser('textproc', help='process từng chuỗi so với process_many')
+    textproc_parser.add_argument('--lexicon', default=None, help='file từ điển từ ghép cho longest-match')
+    textproc_parser.add_argument('--rounds', type=int, default=3)
+
+    shards_parser = subparsers.add_parser('shards', help='độ trễ tìm song song trên index chia shard')
+    shards_parser.add_argument('--shards', type=int, nargs='+', default=[2, 4], help='các số shard cần đo')
+    shards_parser.add_argument('--queries', type=int, default=200)
+    shards_parser.add_argument('--top-k', type=int, default=10)
+
+    ingredients_parser = subparsers.add_parser('ingredients', help='độ trễ bộ lọc nguyên liệu (bitmap)')
+    ingredients_parser.add_argument('--docs', type=int, nargs='+', default=[100000, 1000000],
+                                    help='số tài liệu giả lập')
+    ingredients_parser.add_argument('--queries', type=int, default=200)
+
+    attributes_parser = subparsers.add_parser('attributes', help='độ trễ lọc khoảng và đếm facet thuộc tính số')
+    attributes_parser.add_argument('--docs', type=int, nargs='+', default=[100000, 1000000],
+                                   help='số tài liệu giả lập')
+    attributes_parser.add_argument('--queries', type=int, default=50)
+
+    dedup_parser = subparsers.add_parser('dedup', help='tốc độ gộp công thức gần trùng (MinHash / LSH)')
+    dedup_parser.add_argument('--copy-ratio', type=float, default=0.1,
+                              help='tỉ lệ bản sao sửa nhẹ chèn thêm vào dữ liệu')
+
+    pruning_parser = subparsers.add_parser('pruning', help='top K BM25 có cắt tỉa MaxScore so với chấm điểm toàn bộ')
+    pruning_parser.add_argument('--queries', type=int, default=100)
+    pruning_parser.add_argument('--top-k', type=int, default=10)
+
+    vectorized_parser = subparsers.add_parser('vectorized', help='chấm điểm Python so với vector hóa NumPy')
+    vectorized_parser.add_argument('--queries', type=int, default=100)
+    vectorized_parser.add_argument('--top-k', type=int, default=10)
+
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("MODULE 5: ĐO HIỆU NĂNG")
+    print("=" * 80)
+
+    documents = load_corpus(args.data, args.synthetic)
+
+    if args.command == 'build':
+        benchmark_build(documents, args.max_workers)
+    elif args.command == 'postings':
+        benchmark_postings(documents, args.rounds)
+    elif args.command == 'tokenizer':
+        benchmark_tokenizer(documents, args.lexicon, args.index)
+    elif args.command == 'fuzzy':
+        benchmark_fuzzy(documents, args.vocab, args.queries, args.max_candidates)
+    elif args.command == 'textproc':
+        benchmark_textproc(documents, args.lexicon, args.rounds)
+    elif args.command == 'shards':
+        benchmark_shards(documents, args.shards, args.queries, args.top_k)
+    elif args.command == 'ingredients':
+        benchmark_ingredients(documents, args.docs, args.queries)
+    elif args.command == 'attributes':
+        benchmark_attributes(documents, args.docs, args.queries)
+    elif args.command == 'dedup':
+        benchmark_dedup(documents, args.copy_ratio)
+    elif args.command == 'pruning':
+        benchmark_pruning(documents, args.queries, args.top_k)
+    elif args.command == 'vectorized':
+        benchmark_vectorized(documents, args.queries, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
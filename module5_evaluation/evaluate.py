@@ -10,7 +10,8 @@ from collections import defaultdict
 
 # Import từ các module khác
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from module2_indexing.text_processor import InvertedIndex
+from module2_indexing.text_processor import load_index
+from module2_indexing.doc_ids import canonical_url
 from module3_ranking.search_engine import SearchEngine
 
 
@@ -138,7 +139,8 @@ class Evaluator:
         Đánh giá toàn bộ hệ thống với tập queries
         
         Args:
-            test_queries: dict {query: set(relevant_doc_ids)}
+            test_queries: dict {query: set(relevant_doc_ids)} - URL có hoặc không có tham số theo dõi
+                          (được chuẩn hóa giống doc_id trong index)
         
         Returns:
             dict: kết quả đánh giá tổng hợp
@@ -146,10 +148,14 @@ class Evaluator:
         all_metrics = defaultdict(list)
         query_results = {}
         
+        # Tách từ mọi query một lượt (process_many), các lần search sau lấy từ cache
+        self.search_engine.text_processor.process_many(list(test_queries))
+        
         print("\n📊 ĐÁNH GIÁ CHI TIẾT TỪNG QUERY:")
         print("=" * 80)
         
         for query, relevant_docs in test_queries.items():
+            relevant_docs = {canonical_url(doc_id) for doc_id in relevant_docs}
             print(f"\n🔍 Query: '{query}'")
             print(f"   Relevant docs: {len(relevant_docs)}")
             
@@ -317,14 +323,12 @@ def main():
     
     # Load dữ liệu
     base_dir = os.path.dirname(os.path.dirname(__file__))
-    index_file = os.path.join(base_dir, 'index', 'inverted_index.json')
     data_file = os.path.join(base_dir, 'data', 'recipes.json')
     
     print("\n📂 Đang tải dữ liệu...")
     
-    # Load inverted index
-    inverted_index = InvertedIndex()
-    inverted_index.load(index_file)
+    # Load inverted index (index phân đoạn nếu có)
+    inverted_index = load_index(os.path.join(base_dir, 'index'))
     
     # Load documents
     with open(data_file, 'r', encoding='utf-8') as f:
@@ -0,0 +1,396 @@
+"""
+MODULE 5: KIỂM TRA INDEX VÀ ĐO DUNG LƯỢNG BỘ NHỚ
+Mục tiêu: Biết index tốn bao nhiêu (để chọn phần cứng, quyết định bỏ positions hay stopword)
+
+Báo cáo:
+    - số term, số tài liệu, thời gian tải index
+    - histogram độ dài posting list (df) theo lũy thừa 2
+    - top N term nặng nhất (byte postings)
+    - byte của từng thành phần (từ điển, thống kê term, postings, positions, bảng tài liệu, ...)
+      trên đĩa và trong bộ nhớ
+    - với một query log (mỗi dòng một query): term nào chiếm phần lớn chi phí truy vấn
+      (số posting phải duyệt)
+
+Index được chọn giống web app: phiên bản CURRENT (nếu có), rồi shards/, segments/,
+inverted_index. Index chia shard / phân đoạn được báo cáo theo từng shard / phân đoạn,
+chi phí query log tính trên thống kê toàn cục.
+
+Cách dùng:
+    python module5_evaluation/inspect_index.py
+    python module5_evaluation/inspect_index.py index/inverted_index --top 30
+    python module5_evaluation/inspect_index.py index/segments
+    python module5_evaluation/inspect_index.py index/inverted_index --queries logs/queries.txt
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+# Import từ các module khác
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from module2_indexing.text_processor import InvertedIndex, resolve_index_path
+from module2_indexing.snapshots import INDEX_KINDS, current_snapshot, snapshot_path, index_kind
+from module2_indexing.segments import MANIFEST_NAME, open_snapshot
+from module2_indexing.shards import shard_paths
+from module3_ranking.search_engine import SearchEngine
+from module3_ranking.sharded_search import ShardSet
+
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Nhóm các section của terms.bin theo thành phần
+TERM_SECTION_COMPONENTS = {
+    'term_blocks': 'từ điển',
+    'term_block_offsets': 'từ điển',
+    'term_strings': 'từ điển',
+    'term_string_offsets': 'từ điển',
+    'postings_offsets': 'từ điển',
+    'dfs': 'thống kê term',
+    'idfs': 'thống kê term',
+    'max_scores': 'thống kê term',
+    'max_tfs': 'thống kê term',
+    'min_doc_lengths': 'thống kê term',
+    'position_totals': 'thống kê term',
+}
+DOC_SECTIONS = ('doc_lengths', 'field_lengths', 'doc_string_offsets', 'doc_strings')
+
+COMPONENTS = ('từ điển', 'thống kê term', 'bảng gấp dấu', 'chỉ mục trigram',
+              'postings', 'positions', 'bảng tài liệu', 'bitmap nguyên liệu', 'meta')
+
+
+def _varint_size(value):
+    return max(1, (value.bit_length() + 6) // 7)
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def resolve_inspect_path(path):
+    """
+    Chọn index cần kiểm tra giống web app / load_index: thư mục gốc thì theo phiên bản CURRENT
+    (nếu có), rồi shards/, segments/, inverted_index (nhị phân hoặc JSON)
+    Returns:
+        tuple: (loại 'shards' | 'segments' | 'inverted_index', đường dẫn)
+    """
+    if os.path.isfile(path):
+        return 'inverted_index', path
+    if not os.path.isdir(path):
+        raise ValueError(f"Không tìm thấy index: {path}")
+    for kind, marker in INDEX_KINDS:
+        if os.path.exists(os.path.join(path, marker)):
+            return kind, path
+    name = current_snapshot(path)
+    if name is not None:
+        path = snapshot_path(path, name)
+    kind = index_kind(path)
+    if kind is None:
+        raise ValueError(f"Không nhận ra index trong: {path} (cần shards.json, segments.json, "
+                         f"meta.json hoặc inverted_index.json)")
+    if kind == 'inverted_index':
+        return kind, resolve_index_path(path)
+    return kind, os.path.join(path, kind)
+
+
+def index_parts(kind, index_path):
+    """
+    Các index nhị phân thành phần cần báo cáo
+    Returns:
+        list: các tuple (nhãn, đường dẫn)
+    """
+    if kind == 'shards':
+        return [(f"shard {os.path.basename(path)}", path) for path in shard_paths(index_path)]
+    if kind == 'segments':
+        with open(os.path.join(index_path, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return [(f"phân đoạn {entry['name']} ({len(entry['deleted'])} tài liệu đã xóa)",
+                 os.path.join(index_path, entry['name'])) for entry in manifest['segments']]
+    return [(None, index_path)]
+
+
+def load_index_timed(index_path):
+    """
+    Tải index, đo thời gian và bộ nhớ heap Python cấp phát khi tải
+    Returns:
+        tuple: (InvertedIndex, giây, byte heap)
+    """
+    inverted_index = InvertedIndex()  # khởi tạo tokenizer không tính vào thời gian tải
+    start = time.perf_counter()
+    inverted_index.load(index_path)
+    load_time = time.perf_counter() - start
+
+    if inverted_index.read_only:
+        # Index mmap tải rất nhanh: tải lại dưới tracemalloc để đo heap (mmap không tính vào heap)
+        reloaded = InvertedIndex()
+        tracemalloc.start()
+        reloaded.load(index_path)
+        heap_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        heap_bytes = None  # tính theo từng thành phần (memory_footprint)
+    return inverted_index, load_time, heap_bytes
+
+
+def _section_sizes(sections, file_size, names):
+    """
+    Kích thước các section nằm liên tiếp trong một file (theo offset tăng dần)
+    """
+    offsets = sorted((sections[name], name) for name in names if name in sections)
+    sizes = {}
+    for k, (offset, name) in enumerate(offsets):
+        end = offsets[k + 1][0] if k + 1 < len(offsets) else file_size
+        sizes[name] = end - offset
+    return sizes
+
+
+def disk_footprint(index_path, position_bytes):
+    """
+    Byte trên đĩa của từng thành phần
+    Args:
+        index_path: thư mục index nhị phân hoặc file JSON
+        position_bytes: byte positions trong postings.bin (tính khi quét postings)
+    """
+    if not os.path.isdir(index_path):
+        return {'JSON (toàn bộ)': os.path.getsize(index_path)}
+
+    with open(os.path.join(index_path, 'meta.json'), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    sections = meta['sections']
+    terms_size = os.path.getsize(os.path.join(index_path, 'terms.bin'))
+    docs_size = os.path.getsize(os.path.join(index_path, 'docs.bin'))
+    postings_size = os.path.getsize(os.path.join(index_path, 'postings.bin'))
+
+    term_sections = [name for name in sections if name not in DOC_SECTIONS and not name.startswith('attr_')]
+    sizes = Counter()
+    for name, size in _section_sizes(sections, terms_size, term_sections).items():
+        if name.startswith('folded_'):
+            sizes['bảng gấp dấu'] += size
+        elif name.startswith('trigram_'):
+            sizes['chỉ mục trigram'] += size
+        else:
+            sizes[TERM_SECTION_COMPONENTS.get(name, 'từ điển')] += size
+    sizes['postings'] = postings_size - position_bytes
+    sizes['positions'] = position_bytes
+    sizes['bảng tài liệu'] = docs_size
+    ingredients_path = os.path.join(index_path, 'ingredients.bin')
+    if os.path.exists(ingredients_path):
+        sizes['bitmap nguyên liệu'] = os.path.getsize(ingredients_path)
+    sizes['meta'] = os.path.getsize(os.path.join(index_path, 'meta.json'))
+    return sizes
+
+
+def memory_footprint(inverted_index, disk_sizes):
+    """
+    Byte trong bộ nhớ của từng thành phần.
+    Index mmap: các thành phần nằm trong page cache của hệ điều hành (dùng chung giữa các
+    process, chỉ nạp khi truy cập) nên bằng kích thước trên đĩa.
+    Index trong bộ nhớ (JSON): đo trên các object Python
+    """
+    if inverted_index.read_only:
+        return dict(disk_sizes)
+
+    sizes = Counter()
+    sizes['từ điển'] = sys.getsizeof(inverted_index.index)
+    for term, posting_list in inverted_index.index.items():
+        sizes['từ điển'] += sys.getsizeof(term) + sys.getsizeof(posting_list)
+        for values in (posting_list.doc_ordinals, posting_list.frequencies, posting_list.pos_offsets,
+                       posting_list.pos_counts, posting_list.field_freqs):
+            sizes['postings'] += sys.getsizeof(values)
+    sizes['positions'] = sys.getsizeof(inverted_index.positions)
+    sizes['thống kê term'] = sys.getsizeof(inverted_index.term_columns) + sys.getsizeof(inverted_index.term_stats)
+    sizes['bảng tài liệu'] = (sys.getsizeof(inverted_index.doc_ids) + sys.getsizeof(inverted_index.doc_ordinals)
+                              + sum(sys.getsizeof(doc_id) for doc_id in inverted_index.doc_ids)
+                              + sys.getsizeof(inverted_index.doc_lengths)
+                              + sys.getsizeof(inverted_index.field_lengths))
+    sizes['bitmap nguyên liệu'] = sys.getsizeof(inverted_index.ingredient_postings) + sum(
+        sys.getsizeof(key) + sys.getsizeof(ordinals)
+        for key, ordinals in inverted_index.ingredient_postings.items())
+    return sizes
+
+
+def scan_postings(inverted_index):
+    """
+    Một lượt qua mọi term: df, số position và byte postings / positions của từng term
+    Returns:
+        list: các tuple (term, df, số position, byte postings, byte positions)
+    """
+    field_count = len(inverted_index.fields)
+    rows = []
+    for term, posting_list in inverted_index.index.items():
+        df = len(posting_list)
+        if hasattr(posting_list, 'decode'):
+            # Codec varint: positions là delta varint (kèm số position của từng posting)
+            decoded = posting_list.decode()
+            position_count = sum(decoded.pos_counts)
+            position_bytes = 0
+            for i in range(df):
+                position_bytes += _varint_size(decoded.pos_counts[i])
+                previous = 0
+                for position in decoded.get_positions(i):
+                    position_bytes += _varint_size(position - previous)
+                    previous = position
+            total_bytes = len(posting_list.data)
+        else:
+            # Codec raw / trong bộ nhớ: mảng 4 byte
+            position_count = sum(posting_list.pos_counts)
+            position_bytes = 4 * position_count + 8 * df  # positions + pos_offsets + pos_counts
+            total_bytes = (16 + 4 * field_count) * df + 4 * position_count
+        rows.append((term, df, position_count, total_bytes, position_bytes))
+    return rows
+
+
+def df_histogram(rows):
+    """
+    Histogram df theo lũy thừa 2: [1], [2, 3], [4, 7], ...
+    Returns:
+        list: các tuple (df nhỏ nhất, df lớn nhất, số term, số posting)
+    """
+    buckets = Counter()
+    postings = Counter()
+    for _, df, _, _, _ in rows:
+        bucket = max(df, 1).bit_length() - 1
+        buckets[bucket] += 1
+        postings[bucket] += df
+    return [(1 << b, (1 << (b + 1)) - 1, buckets[b], postings[b]) for b in sorted(buckets)]
+
+
+def query_costs(inverted_index, query_file):
+    """
+    Chi phí của query log theo term: số posting phải duyệt khi chấm điểm (df của mỗi term
+    được tính điểm, kể cả term mở rộng từ tiền tố / gấp dấu / gần đúng)
+    Returns:
+        tuple: (Counter {term: số posting đã duyệt}, Counter {term: số query dùng term}, số query)
+    """
+    engine = SearchEngine(inverted_index, [])
+    postings = Counter()
+    queries = Counter()
+    query_count = 0
+    with open(query_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            query = line.strip()
+            if not query:
+                continue
+            query_count += 1
+            weighted_terms, phrases, _ = engine.parse_query(query)
+            terms = {term for term, _ in weighted_terms}
+            terms.update(term for phrase in phrases for slot in phrase for term in slot)
+            for term in terms:
+                postings[term] += inverted_index.get_term_statistics(term).df
+                queries[term] += 1
+    return postings, queries, query_count
+
+
+def report_index(index_path, top):
+    """
+    In báo cáo của một index nhị phân hoặc file JSON
+    Returns:
+        InvertedIndex đã tải
+    """
+    inverted_index, load_time, heap_bytes = load_index_timed(index_path)
+    kind = 'mmap' if inverted_index.read_only else 'trong bộ nhớ'
+    print(f"\n⏱️  Thời gian tải: {load_time * 1000:.1f} ms ({kind})")
+    if heap_bytes is not None:
+        print(f"   - Heap Python khi tải: {_format_bytes(heap_bytes)}")
+
+    print("\n🔍 Đang quét postings...")
+    start = time.perf_counter()
+    rows = scan_postings(inverted_index)
+    total_postings = sum(row[1] for row in rows)
+    total_positions = sum(row[2] for row in rows)
+    print(f"   - Quét xong trong {time.perf_counter() - start:.1f} giây")
+
+    print("\n📊 TỔNG QUAN")
+    print(f"   - Số tài liệu: {inverted_index.doc_count}")
+    print(f"   - Số term: {len(rows)}")
+    print(f"   - Số posting: {total_postings} ({total_postings / max(len(rows), 1):.1f} / term)")
+    print(f"   - Số position: {total_positions}")
+    print(f"   - Độ dài tài liệu trung bình: {inverted_index.avg_doc_length:.2f} từ")
+
+    print("\n📈 HISTOGRAM ĐỘ DÀI POSTING LIST (df)")
+    print(f"   {'df':>15} | {'số term':>9} | {'% term':>7} | {'% posting':>9}")
+    for low, high, term_count, posting_count in df_histogram(rows):
+        label = f"{low}" if low == high else f"{low}-{high}"
+        print(f"   {label:>15} | {term_count:>9} | {term_count / len(rows):>7.1%} | "
+              f"{posting_count / max(total_postings, 1):>9.1%}")
+
+    print(f"\n🏋️  TOP {top} TERM NẶNG NHẤT (byte postings)")
+    print(f"   {'term':<24} | {'df':>8} | {'số position':>11} | {'byte postings':>13} | {'byte positions':>14}")
+    for term, df, position_count, total_bytes, position_bytes in sorted(rows, key=lambda r: -r[3])[:top]:
+        print(f"   {term:<24} | {df:>8} | {position_count:>11} | {_format_bytes(total_bytes):>13} | "
+              f"{_format_bytes(position_bytes):>14}")
+
+    position_bytes = sum(row[4] for row in rows)
+    disk_sizes = disk_footprint(index_path, position_bytes)
+    memory_sizes = memory_footprint(inverted_index, disk_sizes)
+    print("\n💾 DUNG LƯỢNG THEO THÀNH PHẦN")
+    print(f"   {'thành phần':<18} | {'trên đĩa':>10} | {'bộ nhớ':>10}")
+    for component in list(COMPONENTS) + [c for c in disk_sizes if c not in COMPONENTS]:
+        if component not in disk_sizes and component not in memory_sizes:
+            continue
+        disk = _format_bytes(disk_sizes[component]) if component in disk_sizes else '-'
+        memory = _format_bytes(memory_sizes[component]) if component in memory_sizes else '-'
+        print(f"   {component:<18} | {disk:>10} | {memory:>10}")
+    print(f"   {'tổng':<18} | {_format_bytes(sum(disk_sizes.values())):>10} | "
+          f"{_format_bytes(sum(memory_sizes.values())):>10}")
+    if inverted_index.read_only:
+        print("   (index mmap: bộ nhớ là page cache dùng chung giữa các process, nạp khi truy cập)")
+    return inverted_index
+
+
+def main():
+    """
+    In báo cáo về index
+    """
+    parser = argparse.ArgumentParser(description='Kiểm tra index: số term, histogram df, dung lượng từng thành phần')
+    parser.add_argument('index_path', nargs='?', default=os.path.join(BASE_DIR, 'index'),
+                        help='thư mục gốc index (theo phiên bản CURRENT), thư mục index nhị phân / '
+                             'segments / shards hoặc file JSON')
+    parser.add_argument('--top', type=int, default=20, help='số term nặng nhất cần liệt kê')
+    parser.add_argument('--queries', default=None, help='query log (mỗi dòng một query)')
+    args = parser.parse_args()
+
+    try:
+        kind, index_path = resolve_inspect_path(args.index_path)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print("=" * 80)
+    print("MODULE 5: KIỂM TRA INDEX")
+    print("=" * 80)
+    print(f"\n📂 Index: {index_path} ({kind})")
+
+    parts = index_parts(kind, index_path)
+    for label, part_path in parts:
+        if label is not None:
+            print("\n" + "-" * 80)
+            print(f"🧩 {label}: {part_path}")
+            print("-" * 80)
+        inverted_index = report_index(part_path, args.top)
+
+    if args.queries:
+        # Chi phí tính trên thống kê toàn cục (df gộp các shard / chỉ tài liệu còn sống)
+        if kind == 'segments':
+            inverted_index = open_snapshot(index_path)
+        elif kind == 'shards':
+            inverted_index = ShardSet(index_path, parallel=False)
+        postings, queries, query_count = query_costs(inverted_index, args.queries)
+        total_cost = sum(postings.values())
+        print(f"\n🔎 CHI PHÍ QUERY LOG: {query_count} query, {total_cost} posting phải duyệt")
+        print(f"   {'term':<24} | {'df':>8} | {'số query':>8} | {'posting':>10} | {'% chi phí':>9}")
+        for term, cost in postings.most_common(args.top):
+            print(f"   {term:<24} | {inverted_index.get_term_statistics(term).df:>8} | {queries[term]:>8} | "
+                  f"{cost:>10} | {cost / max(total_cost, 1):>9.1%}")
+
+    print("\n✅ HOÀN THÀNH!")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
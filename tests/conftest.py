@@ -0,0 +1,89 @@
+"""
+Dữ liệu dùng chung cho các test: tập công thức tổng hợp (cố định theo seed) và
+TextProcessor tách từ theo từ điển (nhanh, không phụ thuộc mô hình underthesea)
+"""
+import os
+import random
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for module_dir in ('module2_indexing', 'module3_ranking'):
+    path = os.path.join(ROOT, module_dir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from text_processor import InvertedIndex, TextProcessor
+from tokenizer_backends import LongestMatchTokenizer
+
+DISHES = ['phở bò', 'canh chua cá', 'thịt kho tàu', 'bún chả', 'gà nướng', 'bánh xèo',
+          'cơm chiên dương châu', 'sườn xào chua ngọt', 'cháo thịt heo', 'lẩu gà ớt hiểm',
+          'bánh bông lan', 'nấm kho tiêu', 'đậu hũ om', 'sữa chua trân châu', 'cà phê sữa']
+INGREDIENTS = ['500g thịt heo', '2 muỗng canh nước mắm', '1 củ hành tím', '3 tép tỏi', '200g tôm tươi',
+               '100g đậu phộng rang', 'muối', 'đường', 'hành lá', 'ớt', '1 kg xương bò', 'bánh phở',
+               'rau thơm', '2 quả trứng gà', 'nấm rơm', 'cà chua', 'me chua']
+STEPS = ['Rửa sạch thịt và để ráo', 'Phi thơm hành tỏi với dầu ăn', 'Cho thịt vào xào săn lại',
+         'Nêm nếm gia vị vừa ăn', 'Đun sôi nước dùng trong 30 phút', 'Cho rau thơm vào và tắt bếp',
+         'Trình bày ra đĩa và thưởng thức']
+LEXICON = ['phở bò', 'canh chua', 'thịt kho', 'bún chả', 'bánh xèo', 'bánh bông lan', 'bánh phở',
+           'nước mắm', 'hành tím', 'hành lá', 'đậu phộng', 'rau thơm', 'nấm rơm', 'cà chua',
+           'thịt heo', 'nước dùng', 'gia vị', 'dầu ăn', 'cà phê', 'đậu hũ', 'trân châu']
+
+QUERIES = ['phở bò', 'canh chua', 'thịt kho', 'bún', 'gà nướng', 'bánh xèo tôm', 'nước mắm đường',
+           'thịt heo hành tỏi tiêu đường', 'pho bo', 'banh xeo', 'bánh* trứng', 'gà "nước mắm"',
+           '"thịt heo" hành', 'cà chua me', 'sữa', 'gaaf']
+
+
+def make_recipes(count, seed=1, start=0):
+    """
+    Sinh count công thức tổng hợp (url mon-<start>..), giống nhau với cùng seed
+    """
+    rng = random.Random(seed)
+    recipes = []
+    for i in range(start, start + count):
+        dish = rng.choice(DISHES)
+        recipes.append({
+            'url': f'https://www.cooky.vn/cong-thuc/mon-{i}',
+            'title': dish.capitalize() + (' ngon' if i % 2 else ''),
+            'description': f'Cách làm {dish} đơn giản tại nhà, món {dish} thơm ngon',
+            'ingredients': rng.sample(INGREDIENTS, 6),
+            'instructions': rng.sample(STEPS, 4),
+            'prep_time': rng.choice(['Chuẩn bị: 15 phút', '10 phút', '', '1 giờ']),
+            'cook_time': rng.choice(['Thực hiện: 30 phút', '45 phút', '1 giờ 30 phút', '']),
+            'servings': rng.choice(['4 người', '2 người', 'Khẩu phần: 6', ''])
+        })
+    return recipes
+
+
+@pytest.fixture(scope='session')
+def text_processor():
+    return TextProcessor(tokenizer=LongestMatchTokenizer(LEXICON))
+
+
+@pytest.fixture(scope='session')
+def recipes():
+    return make_recipes(1200)
+
+
+@pytest.fixture(scope='session')
+def memory_index(text_processor, recipes):
+    index = InvertedIndex(text_processor)
+    index.build_from_documents(recipes)
+    return index
+
+
+@pytest.fixture(scope='session')
+def binary_index(tmp_path_factory, text_processor, memory_index):
+    path = str(tmp_path_factory.mktemp('index') / 'varint')
+    memory_index.save(path)
+    index = InvertedIndex(text_processor)
+    index.load(path)
+    return index
+
+
+def result_pairs(results):
+    """
+    (doc_id, điểm) của kết quả search, để so sánh giữa các cách lưu / chấm điểm
+    """
+    return [(result['doc_id'], result['score']) for result in results]
@@ -0,0 +1,50 @@
+"""
+Tìm kiếm không dấu: term, từ ghép và tiền tố gõ không dấu khớp các term có dấu của index
+"""
+import pytest
+
+from search_engine import SearchEngine, FOLDED_MATCH_WEIGHT
+
+
+@pytest.fixture(params=['memory', 'binary'])
+def engine(request, recipes, text_processor):
+    index = request.getfixturevalue(f'{request.param}_index')
+    return SearchEngine(index, recipes, text_processor)
+
+
+def doc_ids(engine, query, **kwargs):
+    return {result['doc_id'] for result in engine.search_faceted(query, 1000, **kwargs)['results']}
+
+
+def test_unaccented_compound_matches_accented(engine):
+    weighted_terms, _, _ = engine.parse_query('banh xeo')
+    assert ('bánh_xèo', FOLDED_MATCH_WEIGHT) in weighted_terms
+    assert doc_ids(engine, 'banh xeo') >= doc_ids(engine, 'bánh xèo')
+
+
+def test_unaccented_prefix_matches_accented_prefix(engine):
+    weighted_terms, _, _ = engine.parse_query('banh*')
+    assert ('bánh_xèo', FOLDED_MATCH_WEIGHT) in weighted_terms
+    assert doc_ids(engine, 'banh*') == doc_ids(engine, 'bánh*')
+    assert doc_ids(engine, 'banh*')
+
+
+def test_accented_prefix_is_not_folded(engine):
+    weighted_terms, _, _ = engine.parse_query('bánh*')
+    assert all(weight == 1.0 for _, weight in weighted_terms)
+
+
+@pytest.mark.parametrize('unaccented, accented', [
+    ('"pho bo"', '"phở bò"'),
+    ('"banh xeo"', '"bánh xèo"'),
+    ('"thit heo" hanh', '"thịt heo" hành'),
+    ('"nuoc mam" duong', '"nước mắm" đường'),
+])
+def test_unaccented_phrase_matches_accented_phrase(engine, unaccented, accented):
+    assert doc_ids(engine, unaccented) == doc_ids(engine, accented)
+    assert doc_ids(engine, accented)
+
+
+def test_unaccented_phrase_mode_matches_accented(engine):
+    assert doc_ids(engine, 'pho bo', mode='phrase') == doc_ids(engine, 'phở bò', mode='phrase')
+    assert doc_ids(engine, 'hanh tim', mode='phrase') == doc_ids(engine, 'hành tím', mode='phrase')
@@ -0,0 +1,45 @@
+"""
+Index trong bộ nhớ, nhị phân (codec 'raw' / 'varint') và JSON cho cùng kết quả tìm kiếm
+"""
+import pytest
+
+from text_processor import InvertedIndex
+from search_engine import SearchEngine
+
+from conftest import QUERIES, result_pairs
+
+
+@pytest.fixture(scope='module')
+def saved_indexes(tmp_path_factory, text_processor, memory_index):
+    out_dir = tmp_path_factory.mktemp('formats')
+    indexes = {}
+    for name, path, codec in (('raw', 'raw', 'raw'), ('varint', 'varint', 'varint'), ('json', 'index.json', 'varint')):
+        path = str(out_dir / path)
+        memory_index.save(path, codec)
+        index = InvertedIndex(text_processor)
+        index.load(path)
+        indexes[name] = index
+    return indexes
+
+
+@pytest.mark.parametrize('name', ['raw', 'varint', 'json'])
+@pytest.mark.parametrize('method', ['bm25', 'bm25f', 'tfidf'])
+def test_saved_index_matches_memory(saved_indexes, memory_index, recipes, text_processor, name, method):
+    expected = SearchEngine(memory_index, recipes, text_processor)
+    engine = SearchEngine(saved_indexes[name], recipes, text_processor)
+    for query in QUERIES:
+        for mode in ('terms', 'phrase', 'proximity'):
+            a = expected.search_faceted(query, 20, method, mode=mode)
+            b = engine.search_faceted(query, 20, method, mode=mode)
+            assert result_pairs(b['results']) == result_pairs(a['results']), (query, mode)
+            assert b['total'] == a['total'] and b['facets'] == a['facets'], (query, mode)
+
+
+@pytest.mark.parametrize('name', ['raw', 'varint', 'json'])
+def test_saved_index_statistics_match_memory(saved_indexes, memory_index, name):
+    index = saved_indexes[name]
+    assert index.doc_count == memory_index.doc_count
+    assert index.avg_doc_length == pytest.approx(memory_index.avg_doc_length)
+    for term in ('phở_bò', 'thịt_heo', 'muối', 'gà'):
+        assert index.get_term_statistics(term) == memory_index.get_term_statistics(term)
+        assert list(index.get_posting_list(term).doc_ordinals) == list(memory_index.get_posting_list(term).doc_ordinals)
@@ -0,0 +1,34 @@
+"""
+Top-k bằng heap + cắt tỉa MaxScore cho đúng kết quả của chấm điểm toàn bộ rồi sắp xếp
+"""
+import pytest
+
+from search_engine import SearchEngine
+
+from conftest import QUERIES
+
+
+@pytest.fixture(params=['memory', 'binary'])
+def engine(request, recipes, text_processor):
+    index = request.getfixturevalue(f'{request.param}_index')
+    return SearchEngine(index, recipes, text_processor)
+
+
+@pytest.mark.parametrize('top_k', [1, 3, 10, 50, 100000])
+def test_rank_documents_matches_exhaustive(engine, top_k):
+    filters = [None, engine.filter_documents(['hành'], ['tỏi'], None),
+               engine.filter_documents((), (), {'servings': (None, 4)})]
+    for query in QUERIES:
+        weighted_terms, phrases, ordered_terms = engine.parse_query(query)
+        if not weighted_terms:
+            continue
+        for allowed in filters:
+            scores = engine.score_query(weighted_terms, phrases, ordered_terms, 'bm25', 'terms', allowed)
+            expected = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            top, total, _ = engine.rank_documents(weighted_terms, phrases, ordered_terms, 'bm25', 'terms',
+                                                  top_k, allowed, ('servings',))
+            assert top == expected, (query, top_k)
+            assert total == len(scores), (query, top_k)
+            top, total, _ = engine.rank_documents(weighted_terms, phrases, ordered_terms, 'bm25', 'terms',
+                                                  top_k, allowed, (), count=False)
+            assert top == expected and total is None, (query, top_k)
@@ -0,0 +1,36 @@
+"""
+PostingList / PostingCursor: skip entry được tính một lần và cập nhật khi thêm posting
+"""
+from array import array
+
+from postings import PostingList, PostingCursor, BLOCK_SIZE, NO_MORE_DOCS
+
+
+def make_posting_list(count):
+    posting_list = PostingList(array('I'), 1)
+    for ordinal in range(count):
+        posting_list.append(2 * ordinal, 1.0 + ordinal % 3, [1 + ordinal % 3], [ordinal])
+    return posting_list
+
+
+def test_skip_entries_are_cached_until_append():
+    doc_lengths = [10] * 1000
+    posting_list = make_posting_list(BLOCK_SIZE + 5)
+    first = posting_list.skip_entries(doc_lengths)
+    assert posting_list.skip_entries(doc_lengths) is first
+    assert first[0] == [2 * (BLOCK_SIZE - 1), 2 * (BLOCK_SIZE + 4)]
+
+    posting_list.append(2 * (BLOCK_SIZE + 5), 7.0, [7], [0])
+    last_docs, max_tfs, _ = posting_list.skip_entries(doc_lengths)
+    assert last_docs[-1] == 2 * (BLOCK_SIZE + 5)
+    assert max_tfs[-1] == 7.0
+
+
+def test_cursor_advance_uses_cached_skip_entries():
+    doc_lengths = [10] * 1000
+    posting_list = make_posting_list(3 * BLOCK_SIZE)
+    for target in (0, 1, 2 * BLOCK_SIZE + 1, 6 * BLOCK_SIZE - 2):
+        cursor = PostingCursor(posting_list, doc_lengths, 1.0, 10.0)
+        assert cursor.advance(target) == target + target % 2
+    cursor = PostingCursor(posting_list, doc_lengths, 1.0, 10.0)
+    assert cursor.advance(6 * BLOCK_SIZE) == NO_MORE_DOCS
@@ -0,0 +1,83 @@
+"""
+Index phân đoạn sau chuỗi thêm / sửa / xóa / gộp cho cùng kết quả với build lại từ đầu
+trên các tài liệu còn sống
+"""
+import pytest
+
+from segments import SegmentedIndex
+from text_processor import InvertedIndex
+from search_engine import SearchEngine
+
+from conftest import QUERIES, make_recipes
+
+
+def search_all(engine, query, method):
+    """
+    {doc_id: điểm} của mọi kết quả (không phụ thuộc thứ tự khi điểm bằng nhau) và tổng số kết quả
+    """
+    results = engine.search_faceted(query, 100000, method)
+    return {result['doc_id']: result['score'] for result in results['results']}, results['total']
+
+
+def assert_matches_rebuild(segmented, live_docs, text_processor):
+    rebuilt = InvertedIndex(text_processor)
+    rebuilt.build_from_documents(live_docs)
+    snapshot = segmented.snapshot()
+    assert snapshot.doc_count == rebuilt.doc_count
+    assert snapshot.avg_doc_length == pytest.approx(rebuilt.avg_doc_length)
+
+    expected = SearchEngine(rebuilt, live_docs, text_processor)
+    engine = SearchEngine(snapshot, live_docs, text_processor)
+    for query in QUERIES:
+        for method in ('bm25', 'bm25f', 'tfidf'):
+            scores, total = search_all(engine, query, method)
+            expected_scores, expected_total = search_all(expected, query, method)
+            assert total == expected_total, (query, method)
+            assert scores.keys() == expected_scores.keys(), (query, method)
+            for doc_id, score in scores.items():
+                assert score == pytest.approx(expected_scores[doc_id]), (query, method, doc_id)
+
+
+def test_add_delete_merge_matches_rebuild(tmp_path, text_processor):
+    recipes = make_recipes(900)
+    segmented = SegmentedIndex(str(tmp_path / 'segments'), text_processor, max_segments=100)
+    live = {}
+    for start in range(0, 600, 200):
+        batch = recipes[start:start + 200]
+        segmented.add_documents(batch)
+        segmented.commit()
+        live.update((doc['url'], doc) for doc in batch)
+    assert len(segmented.segment_names) == 3
+
+    # Xóa, sửa (xóa bản cũ + thêm bản mới) rồi thêm tài liệu mới
+    for doc in recipes[:600:7]:
+        assert segmented.delete_document(doc['url'])
+        del live[doc['url']]
+    assert not segmented.delete_document(recipes[0]['url'])
+    for i, doc in enumerate(recipes[1:600:11]):
+        if doc['url'] in live:
+            updated = dict(doc, title=f'Bánh xèo tôm thịt {i}', ingredients=['200g tôm tươi', 'bột gạo'])
+            segmented.update_document(updated)
+            live[doc['url']] = updated
+    segmented.add_documents(recipes[600:750])
+    live.update((doc['url'], doc) for doc in recipes[600:750])
+    segmented.commit()
+    assert_matches_rebuild(segmented, list(live.values()), text_processor)
+
+    # Gộp một phần rồi gộp toàn bộ: kết quả không đổi
+    segmented.merge(segmented.segment_names[:2])
+    assert_matches_rebuild(segmented, list(live.values()), text_processor)
+
+    segmented.force_merge()
+    assert len(segmented.segment_names) == 1
+    assert_matches_rebuild(segmented, list(live.values()), text_processor)
+
+    # Mở lại từ đĩa sau khi thêm / xóa tiếp
+    segmented.add_documents(recipes[750:])
+    live.update((doc['url'], doc) for doc in recipes[750:])
+    for doc in recipes[600:900:5]:
+        assert segmented.delete_document(doc['url'])
+        del live[doc['url']]
+    segmented.commit()
+    reopened = SegmentedIndex(str(tmp_path / 'segments'), text_processor)
+    assert_matches_rebuild(reopened, list(live.values()), text_processor)
@@ -0,0 +1,52 @@
+"""
+Build streaming (SPIMI) qua nhiều run cho index nhị phân giống hệt từng byte với build đầy đủ
+"""
+import filecmp
+import json
+import os
+
+import pytest
+
+from spimi import SpimiIndexBuilder, build_streaming
+from text_processor import InvertedIndex
+
+
+def assert_same_files(expected_dir, actual_dir):
+    names = sorted(os.listdir(expected_dir))
+    assert sorted(os.listdir(actual_dir)) == names
+    _, mismatch, errors = filecmp.cmpfiles(expected_dir, actual_dir, names, shallow=False)
+    assert not mismatch and not errors, (mismatch, errors)
+
+
+@pytest.fixture(scope='module')
+def full_build_dir(tmp_path_factory, memory_index):
+    path = str(tmp_path_factory.mktemp('full') / 'index')
+    memory_index.save(path)
+    return path
+
+
+def test_spimi_runs_match_full_build(tmp_path, text_processor, recipes, full_build_dir):
+    out_dir = str(tmp_path / 'spimi')
+    builder = SpimiIndexBuilder(out_dir, memory_budget_mb=0.25, text_processor=text_processor)
+    for doc in recipes + recipes[:50]:  # URL trùng bị bỏ qua như build_from_documents
+        builder.add(doc)
+    assert len(builder.run_files) > 1
+    assert builder.finish() == len(recipes)
+    assert_same_files(full_build_dir, out_dir)
+
+
+@pytest.mark.parametrize('jsonl', [False, True])
+def test_build_streaming_from_file(tmp_path, text_processor, recipes, full_build_dir, jsonl):
+    data_file = tmp_path / ('recipes.jsonl' if jsonl else 'recipes.json')
+    with open(data_file, 'w', encoding='utf-8') as f:
+        if jsonl:
+            f.writelines(json.dumps(doc, ensure_ascii=False) + '\n' for doc in recipes)
+        else:
+            json.dump(recipes, f, ensure_ascii=False)
+    out_dir = str(tmp_path / 'spimi')
+    assert build_streaming(str(data_file), out_dir, memory_budget_mb=1, text_processor=text_processor) == len(recipes)
+    assert_same_files(full_build_dir, out_dir)
+
+    index = InvertedIndex(text_processor)
+    index.load(out_dir)
+    assert index.doc_count == len(recipes)
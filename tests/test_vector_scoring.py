@@ -0,0 +1,30 @@
+"""
+Chấm điểm vector hóa bằng NumPy cho cùng kết quả với các phương pháp Python tương ứng
+"""
+import pytest
+
+from search_engine import SearchEngine
+
+from conftest import QUERIES, result_pairs
+
+pytest.importorskip('numpy')
+
+
+@pytest.fixture(params=['memory', 'binary'])
+def engine(request, recipes, text_processor):
+    index = request.getfixturevalue(f'{request.param}_index')
+    return SearchEngine(index, recipes, text_processor)
+
+
+@pytest.mark.parametrize('method', ['bm25', 'tfidf'])
+@pytest.mark.parametrize('mode', ['terms', 'phrase', 'proximity'])
+def test_numpy_matches_python(engine, method, mode):
+    for query in QUERIES:
+        for top_k in (1, 10, 100000):
+            for include, filters in (((), None), (['hành'], ['servings>=3'])):
+                expected = engine.search_faceted(query, top_k, method, mode=mode,
+                                                 include_ingredients=include, filters=filters)
+                actual = engine.search_faceted(query, top_k, method + '_numpy', mode=mode,
+                                               include_ingredients=include, filters=filters)
+                assert result_pairs(actual['results']) == result_pairs(expected['results']), (query, top_k)
+                assert actual['total'] == expected['total'] and actual['facets'] == expected['facets'], query